@@ -0,0 +1,149 @@
+""" Scaling benchmarks for each stage of a calculation
+
+Times and memory-profiles Parameters.v_ext, Hamiltonian.representation, eigendecomposition,
+density construction and a full SCF run, sweeping the number of plane-waves, the k-point grid,
+and the number of atoms. Run from the repository root:
+
+    python -m benchmarks.scaling --output results.json
+    python -m benchmarks.scaling --output new.json --compare results.json
+
+In comparison mode, every (sweep, value, stage) whose time or peak memory exceeds the baseline
+by more than the threshold is reported as a regression, and the exit status is non-zero.
+"""
+
+import sys
+import json
+import time
+import platform
+import argparse
+import tracemalloc
+import numpy as np
+import scipy
+from pcask1d.src.params import Parameters
+from pcask1d.src.density import Density
+from pcask1d.src.hamiltonian import Hamiltonian
+from pcask1d.src.scf import SCF
+
+# Sweeps: name -> (values, quick values). The k-point grids of n points have n/2 irreducible k-points
+SWEEPS = {'num_planewaves': ([101, 201, 401, 801, 1601], [101, 201]),
+          'kpoint_grid': ([2, 4, 8, 16, 32], [2, 8]),
+          'num_atoms': ([1, 2, 4, 8, 16], [1, 2])}
+
+
+def make_params(sweep, value):
+    """ The Parameters of a point of a sweep: a chain of H atoms, one atom unless num_atoms is swept,
+    at the Gamma point unless kpoint_grid is swept """
+
+    inputs = {'method': 'h', 'num_planewaves': 201, 'kpoint_grid': 1, 'scf_max_iterations': 10}
+    num_atoms = 1
+    if sweep == 'num_atoms':
+        num_atoms = value
+    else:
+        inputs[sweep] = value
+
+    inputs['species'] = ['H'] * num_atoms
+    inputs['positions'] = list(np.linspace(-10, 10, num_atoms, endpoint=False) + 10 / num_atoms)
+    return Parameters(**inputs)
+
+
+def measure(function, repeat):
+    """ Best wall time over repeat calls, and peak traced memory (bytes) of a single call """
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    function()
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return min(times), peak_memory
+
+
+def stages(params):
+    """ The stages of a calculation, each a function of no arguments """
+
+    density = Density(params)
+    hamiltonian = Hamiltonian(density)
+    wavefunctions = hamiltonian.eigendecomposition(params, params.num_electrons)
+
+    # The potential is cached by a Parameters, so a fresh one is constructed on each call
+    return {'v_ext': lambda: Parameters(**params.inputs).v_ext,
+            'representation': lambda: Hamiltonian(density).representation(params),
+            'eigendecomposition': lambda: Hamiltonian(density).eigendecomposition(params, params.num_electrons),
+            'density': lambda: Density.from_wavefunctions(params, wavefunctions),
+            'scf': lambda: SCF(params).run()}
+
+
+def run(sweeps, quick=False, repeat=3):
+    """ Run the requested sweeps, returning a list of results """
+
+    results = []
+    for sweep in sweeps:
+        values = SWEEPS[sweep][1] if quick else SWEEPS[sweep][0]
+        for value in values:
+            params = make_params(sweep, value)
+            for stage, function in stages(params).items():
+                # The full SCF is expensive, time it once
+                wall_time, peak_memory = measure(function, 1 if stage == 'scf' else repeat)
+                results.append({'sweep': sweep, 'value': value, 'stage': stage,
+                                'time': wall_time, 'peak_memory': peak_memory})
+                print('{:>15} = {:<8} {:>20}: {:10.4f} s {:12d} B'.format(sweep, value, stage,
+                                                                          wall_time, peak_memory))
+    return results
+
+
+def compare(results, baseline, threshold):
+    """ Regressions of the results with respect to a baseline, as a list of messages """
+
+    reference = {(r['sweep'], r['value'], r['stage']): r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        key = (result['sweep'], result['value'], result['stage'])
+        if key not in reference:
+            continue
+        for metric in ('time', 'peak_memory'):
+            old, new = reference[key][metric], result[metric]
+            if old > 0 and new / old > threshold:
+                regressions.append('{} = {} {} {}: {:.4g} -> {:.4g} ({:.2f}x)'.format(*key, metric, old, new, new / old))
+    return regressions
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(prog='benchmarks.scaling', description='Scaling benchmarks of pcask1d')
+    parser.add_argument('--sweep', action='append', choices=list(SWEEPS), help='sweep to run (default all)')
+    parser.add_argument('--quick', action='store_true', help='small sweeps, e.g. for CI')
+    parser.add_argument('--repeat', type=int, default=3, help='repeats per stage, the best time is kept')
+    parser.add_argument('--output', help='JSON file to which results are written')
+    parser.add_argument('--compare', help='baseline JSON file against which to flag regressions')
+    parser.add_argument('--threshold', type=float, default=1.25, help='ratio to the baseline counted as a regression')
+    args = parser.parse_args(argv)
+
+    results = run(args.sweep or list(SWEEPS), quick=args.quick, repeat=args.repeat)
+    report = {'metadata': {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                           'python': platform.python_version(),
+                           'numpy': np.__version__,
+                           'scipy': scipy.__version__,
+                           'machine': platform.machine()},
+              'results': results}
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print('REGRESSION', regression)
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
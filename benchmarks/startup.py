@@ -0,0 +1,93 @@
+""" Start-up benchmark of the command line interface
+
+Times `pcask1d --version` and `pcask1d noop` in fresh interpreters, less the start-up of a bare interpreter,
+and checks which of the heavy modules (numpy, scipy, matplotlib) are imported by the entry point alone.
+Run from the repository root:
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --budget 0.05 --output startup.json
+
+The exit status is non-zero if a command exceeds the budget, or the entry point imports a heavy module.
+"""
+
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+
+# Start-up overhead (s) of a command above that of a bare interpreter
+BUDGET = 0.1
+
+COMMANDS = {'version': ['-m', 'pcask1d.src.main', '--version'],
+            'noop': ['-m', 'pcask1d.src.main', 'noop']}
+
+HEAVY_MODULES = ('numpy', 'scipy', 'matplotlib')
+
+
+def measure(arguments, repeat):
+    """ Best wall time over repeat runs of a fresh interpreter with the given arguments """
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + arguments, check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def imported_modules():
+    """ The heavy modules imported by the entry point alone, in a fresh interpreter """
+
+    check = ('import sys, json, pcask1d.src.main; '
+             'print(json.dumps([m for m in {} if m in sys.modules]))'.format(list(HEAVY_MODULES)))
+    output = subprocess.run([sys.executable, '-c', check], check=True, capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(prog='benchmarks.startup', description='Start-up benchmark of pcask1d')
+    parser.add_argument('--repeat', type=int, default=10, help='runs per command, the best time is kept')
+    parser.add_argument('--budget', type=float, default=BUDGET,
+                        help='start-up overhead (s) above a bare interpreter allowed per command')
+    parser.add_argument('--output', help='JSON file to which results are written')
+    args = parser.parse_args(argv)
+
+    interpreter = measure(['-c', 'pass'], args.repeat)
+    print('{:>10}: {:10.4f} s'.format('python', interpreter))
+
+    results = []
+    for name, arguments in COMMANDS.items():
+        wall_time = measure(arguments, args.repeat)
+        overhead = wall_time - interpreter
+        results.append({'command': name, 'time': wall_time, 'overhead': overhead})
+        print('{:>10}: {:10.4f} s {:+10.4f} s'.format(name, wall_time, overhead))
+
+    heavy = imported_modules()
+    print('heavy modules imported on start-up: {}'.format(', '.join(heavy) or 'none'))
+
+    report = {'metadata': {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                           'python': platform.python_version(),
+                           'machine': platform.machine(),
+                           'budget': args.budget},
+              'interpreter': interpreter,
+              'results': results,
+              'heavy_modules': heavy}
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    failures = ['{} start-up overhead {:.4f} s exceeds the budget of {:.4f} s'.format(r['command'], r['overhead'],
+                                                                                      args.budget)
+                for r in results if r['overhead'] > args.budget]
+    failures += ['{} is imported on start-up'.format(module) for module in heavy]
+    for failure in failures:
+        print('OVER BUDGET', failure)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
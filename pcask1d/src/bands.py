@@ -0,0 +1,158 @@
+# Distributed under the terms of the MIT License.
+
+"""
+Module that computes the band structure of a converged density along a path of k-points, non-self-consistently.
+The local potential (and its k-independent block of the Hamiltonian) is constructed once. The dense eigensolver
+diagonalises the k-points of the path in stacks, and the iterative eigensolver walks the path in order, such that
+it is seeded at each k-point with the eigenvectors of the previous (neighbouring) k-point.
+"""
+
+import numpy as np
+from .params import Parameters
+from .hamiltonian import Hamiltonian
+from . import instrumentation
+
+
+def k_path(params, vertices=(0, 0.5), num_points=101):
+    r""" A path of k-points through the given vertices, with (near) uniform spacing along the path
+
+    Parameters:
+        * params (Parameters): input model for the system
+        * vertices (list): k-points at which the path turns or ends, in units of the reciprocal lattice vector
+          :math:`b = \frac{\pi}{a}`, such that the first BZ is :math:`[-\frac{1}{2}, \frac{1}{2}]`
+        * num_points (int): total number of k-points along the path
+
+    Output:
+        * k_points (ndarray): the (num_points,) k-points along the path
+    """
+
+    vertices = np.asarray(vertices, dtype=float) * np.pi / params.cell
+    if len(vertices) < 2:
+        return vertices
+    distances = np.concatenate(([0], np.cumsum(abs(np.diff(vertices)))))
+    return np.interp(np.linspace(0, distances[-1], num_points), distances, vertices)
+
+
+class BandStructure:
+    """
+    An instance of this class is initialised with a params, a (converged) density and a path of k-points, and
+    creates an iterable object whose iterations are the k-points of the path. Each iteration diagonalises the
+    Hamiltonian of the fixed density at the next k-point (or, with the dense eigensolver, the next stack of
+    k-points) for the lowest num_bands bands, and (optionally) writes them to a .npy array file as it goes, such
+    that a long path can be read (memory-mapped) before it completes.
+    """
+
+    # Basis size below which the dense eigensolver is used with params.eigensolver == 'auto'. Seeded with the
+    # eigenvectors of the neighbouring k-point, the iterative eigensolver wins at smaller bases than in the SCF.
+    dense_threshold = 250
+
+    def __init__(self, params, density, k_points, num_bands=None, path=None, **kwargs):
+        r"""
+        Parameters:
+            * params (Parameters): input model for the system
+            * density (Density): density from which the Hamiltonian is constructed, e.g. that of a converged SCF
+            * k_points (ndarray): k-points of the path, e.g. from k_path
+            * num_bands (int): number of (lowest) bands computed at each k-point, default params.num_bands
+            * path (str): .npy file to which the (n_k, num_bands) band energies are written, default none
+
+        Keyword arguments:
+            * tol (float): residual tolerance of the iterative eigensolver, default params.eigensolver_tol
+            * precision: 'double' (default) or 'single', see Hamiltonian
+        """
+
+        if params.method == 'hf':
+            # The exchange operator depends on the orbitals at each k-point, not on the density alone
+            raise RuntimeError('Chosen method {} is not implemented for a non-self-consistent band structure'
+                               .format(params.method))
+
+        if params.eigensolver == 'auto':
+            dense = params.num_planewaves < max(self.dense_threshold, 5*(num_bands or params.num_bands))
+            params = Parameters(**dict(params.inputs, eigensolver='dense' if dense else 'lobpcg'))
+
+        self._params = params
+        self._density = density
+        self._k_points = np.atleast_1d(np.asarray(k_points, dtype=float))
+        self._num_bands = num_bands or params.num_bands
+        self._tol = kwargs.get('tol', None)
+        self._precision = kwargs.get('precision', 'double')
+
+        # The k-independent potential, and its block of the Hamiltonian, are constructed once for the path
+        hamiltonian = Hamiltonian(density, precision=self._precision)
+        self._local_potential = hamiltonian.local_potential(params)
+        self._potential_representation = None
+        if hamiltonian.use_dense_solver(params, self._num_bands):
+            self._potential_representation = hamiltonian.potential_representation(params)
+
+        shape = (len(self._k_points), self._num_bands)
+        if path is not None:
+            self._energies = np.lib.format.open_memmap(path, mode='w+', dtype=float, shape=shape)
+        else:
+            self._energies = np.empty(shape)
+
+        self._eigenvectors = None
+        self._stack_energies = None
+        self._index = 0
+
+    def __iter__(self):
+        return self
+
+    @instrumentation.timed('bands.k_point')
+    def __next__(self):
+        """ Diagonalise the Hamiltonian at the next k-point of the path, seeded with the eigenvectors of the previous k-point """
+
+        if self._index == len(self._k_points):
+            raise StopIteration
+
+        k_point = self._k_points[self._index]
+        if self._potential_representation is not None:
+            self._energies[self._index] = self._dense_energies()
+        else:
+            hamiltonian = Hamiltonian(self._density, k_point=k_point, local_potential=self._local_potential,
+                                      precision=self._precision)
+            wavefunctions = hamiltonian.eigendecomposition(self._params, self._num_bands, guess=self._eigenvectors,
+                                                           tol=self._tol)
+            self._eigenvectors = wavefunctions.eigenvectors(0)
+            self._energies[self._index] = wavefunctions.energies[0, 0]
+        if isinstance(self._energies, np.memmap):
+            self._energies.flush()
+
+        self._index += 1
+        return k_point, self._energies[self._index - 1]
+
+    def _dense_energies(self):
+        """ Band energies at the next k-point from the dense eigensolver, which diagonalises the next
+        Hamiltonian.stack_size k-points of the path together (see Hamiltonian.eigendecomposition_stack) """
+
+        offset = self._index % Hamiltonian.stack_size
+        if offset == 0:
+            hamiltonian = Hamiltonian(self._density, local_potential=self._local_potential,
+                                      potential_representation=self._potential_representation,
+                                      precision=self._precision)
+            k_points = self._k_points[self._index:self._index + Hamiltonian.stack_size]
+            self._stack_energies = hamiltonian.eigendecomposition_stack(self._params, k_points,
+                                                                        self._num_bands).energies[:, 0]
+        return self._stack_energies[offset]
+
+    def run(self):
+        """ Compute the bands at every k-point of the path, returning the (n_k, num_bands) band energies """
+        for _ in self:
+            pass
+        return self._energies
+
+    @property
+    def k_points(self):
+        return self._k_points
+
+    @property
+    def energies(self):
+        """ The (n_k, num_bands) band energies, of which the first num_computed rows are computed """
+        return self._energies
+
+    @property
+    def num_bands(self):
+        return self._num_bands
+
+    @property
+    def num_computed(self):
+        """ Number of k-points of the path computed so far """
+        return self._index
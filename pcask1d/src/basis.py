@@ -0,0 +1,207 @@
+# Distributed under the terms of the MIT License.
+
+"""
+Utilities for moving plane-wave coefficients between grids of different sizes.
+All coefficient arrays are stored in numpy's FFT ordering along their last axis.
+The transformations preserve the precision (single or double) of the coefficients.
+"""
+
+import numpy as np
+from scipy.fft import next_fast_len
+from . import fft
+
+# A Python float, which (unlike a numpy float64) does not promote single precision arrays
+_SQRT2 = 2**0.5
+
+
+def pad(coefficients, size):
+    r""" Zero-pad plane-wave coefficients onto a larger grid, i.e. extend the basis
+    with :math:`c_G = 0` for the new frequencies. On a grid of even length, the Nyquist frequency
+    :math:`-n/2` stands for both :math:`\pm n/2`, and is split equally between them, such that the
+    coefficients of a real function remain those of a real function.
+
+    Parameters:
+        * coefficients (ndarray): coefficients in FFT ordering along the last axis
+        * size (int): number of frequencies on the larger grid
+
+    Output:
+        * padded (ndarray): coefficients on the larger grid
+    """
+
+    n = coefficients.shape[-1]
+    half = (n + 1) // 2
+    padded = np.zeros(coefficients.shape[:-1] + (size,), dtype=coefficients.dtype)
+    padded[..., :half] = coefficients[..., :half]
+    padded[..., size - (n - half):] = coefficients[..., half:]
+    if n % 2 == 0 and size > n:
+        padded[..., half] = padded[..., size - half] = 0.5*coefficients[..., half]
+    return padded
+
+
+def truncate(coefficients, size):
+    r""" Discard the high frequency components of coefficients on a large grid,
+    keeping the odd number (size) of frequencies :math:`|n| \leq (size-1)/2`.
+
+    Parameters:
+        * coefficients (ndarray): coefficients in FFT ordering along the last axis
+        * size (int): odd number of frequencies to keep
+
+    Output:
+        * truncated (ndarray): coefficients on the smaller grid
+    """
+
+    n = coefficients.shape[-1]
+    half = (size + 1) // 2
+    return np.concatenate((coefficients[..., :half],
+                           coefficients[..., n - (size - half):]), axis=-1)
+
+
+def frequency_indices(size):
+    """ Integer frequencies n of a grid of a given size, in FFT ordering """
+    return np.rint(np.fft.fftfreq(size) * size).astype(int)
+
+
+def real_basis(coefficients):
+    r""" Transform plane-wave coefficients of real functions, :math:`c_{-G} = c_G^*`, to the real basis
+    :math:`\{ 1, \sqrt{2} \cos(Gx), \sqrt{2} \sin(Gx) \}` (each normalised as the plane-waves), in which
+    the Hamiltonian at the Gamma point is real symmetric. The real coefficients are ordered as
+    [constant, cosines (G > 0), sines (G > 0)].
+
+    Parameters:
+        * coefficients (ndarray): coefficients in FFT ordering along the last axis (odd length)
+
+    Output:
+        * real_coefficients (ndarray): coefficients in the real basis (real if the function is real)
+    """
+
+    n = coefficients.shape[-1]
+    half = (n - 1) // 2
+    positive = coefficients[..., 1:half + 1]
+    negative = coefficients[..., n - 1:n - half - 1:-1]
+    return np.concatenate((coefficients[..., :1],
+                           (positive + negative) / _SQRT2,
+                           1j*(positive - negative) / _SQRT2), axis=-1)
+
+
+def complex_basis(real_coefficients):
+    """ Transform coefficients in the real basis (see real_basis) back to plane-wave coefficients in FFT ordering """
+
+    n = real_coefficients.shape[-1]
+    half = (n - 1) // 2
+    cosines = real_coefficients[..., 1:half + 1]
+    sines = real_coefficients[..., half + 1:]
+    positive = (cosines - 1j*sines) / _SQRT2
+    negative = (cosines + 1j*sines) / _SQRT2
+    return np.concatenate((real_coefficients[..., :1].astype(positive.dtype), positive, negative[..., ::-1]), axis=-1)
+
+
+def half_spectrum(real_coefficients, size):
+    r""" Coefficients :math:`c_G, G \geq 0`, of a real function from its coefficients in the real basis,
+    zero-padded to the half spectrum (size//2 + 1 frequencies) of a real FFT of a given size """
+
+    n = real_coefficients.shape[-1]
+    half = (n - 1) // 2
+    spectrum = np.zeros(real_coefficients.shape[:-1] + (size // 2 + 1,),
+                        dtype=np.result_type(real_coefficients.dtype, np.complex64))
+    spectrum[..., 0] = real_coefficients[..., 0]
+    spectrum[..., 1:half + 1] = (real_coefficients[..., 1:half + 1] - 1j*real_coefficients[..., half + 1:]) / _SQRT2
+    return spectrum
+
+
+def from_half_spectrum(spectrum, size):
+    r""" Coefficients in the real basis (of odd length size) from the half spectrum :math:`c_G, G \geq 0`,
+    of a real function, the inverse of half_spectrum """
+
+    half = (size - 1) // 2
+    positive = spectrum[..., 1:half + 1]
+    return np.concatenate((spectrum[..., :1].real, _SQRT2*positive.real, -_SQRT2*positive.imag), axis=-1)
+
+
+def is_real(coefficients, tol=1e-12):
+    r""" Whether plane-wave coefficients (FFT ordering, odd length) are those of real functions, :math:`c_{-G} = c_G^*` """
+    n = coefficients.shape[-1]
+    half = (n - 1) // 2
+    return np.allclose(coefficients[..., 1:half + 1], coefficients[..., n - 1:n - half - 1:-1].conj(), rtol=0, atol=tol)
+
+
+def _gaussian_gridding(x, size, spread, oversampling):
+    r""" Gaussian :math:`g(y) = e^{-y^2/4\tau}` about each point x, sampled at the 2*spread nearest points of an
+    oversampled grid :math:`2\pi m / M_r`, with :math:`M_r \geq oversampling \cdot size` of a fast FFT length and
+    :math:`\tau` chosen as in Greengard and Lee (SIAM Rev. 46, 443 (2004)), such that the truncation error
+    is ~1e-12 for spread=12
+
+    Output:
+        * indices (ndarray): (len(x), 2*spread) indices of the grid points about each point
+        * gaussians (ndarray): (len(x), 2*spread) values of the Gaussian at those grid points
+        * tau (float): width of the Gaussian
+        * grid_size (int): number of points of the oversampled grid
+    """
+
+    grid_size = next_fast_len(int(np.ceil(oversampling*size)))
+    ratio = grid_size / size
+    tau = np.pi*spread / (size**2 * ratio*(ratio - 0.5))
+    spacing = 2*np.pi / grid_size
+
+    x = np.mod(x, 2*np.pi)
+    indices = np.floor(x / spacing).astype(int)[:, None] + np.arange(1 - spread, spread + 1)
+    gaussians = np.exp(-(x[:, None] - spacing*indices)**2 / (4*tau))
+    return indices % grid_size, gaussians, tau, grid_size
+
+
+def nonuniform_fft(x, size, weights=None, spread=12, oversampling=2):
+    r""" Fourier transform of weighted points :math:`x_j` (period :math:`2\pi`),
+
+    .. math::
+
+        f_n = \sum_j w_j e^{-inx_j},
+
+    for the frequencies n of a grid of a given size, in FFT ordering. The points are spread onto an
+    oversampled grid with a Gaussian, transformed with an FFT and the Gaussian deconvolved (type-1
+    non-uniform FFT), at a cost of O(size log size + spread len(x)), rather than O(size len(x)).
+
+    Parameters:
+        * x (ndarray): positions of the points
+        * size (int): number of frequencies
+        * weights (ndarray): weight of each point, default one
+
+    Output:
+        * transform (ndarray): :math:`f_n` in FFT ordering
+    """
+
+    x = np.asarray(x, dtype=float)
+    if weights is None:
+        weights = np.ones(len(x))
+    indices, gaussians, tau, grid_size = _gaussian_gridding(x, size, spread, oversampling)
+
+    spread_grid = np.bincount(indices.ravel(), weights=(np.asarray(weights)[:, None]*gaussians).ravel(),
+                              minlength=grid_size)
+    n = frequency_indices(size)
+    return np.sqrt(np.pi / tau) * np.exp(n**2 * tau) * fft.fft(spread_grid)[n] / grid_size
+
+
+def nonuniform_ifft(coefficients, x, spread=12, oversampling=2):
+    r""" Fourier series with coefficients in FFT ordering evaluated at points :math:`x_j` (period :math:`2\pi`),
+
+    .. math::
+
+        f(x_j) = \sum_n c_n e^{inx_j},
+
+    by deconvolving a Gaussian from the coefficients, transforming onto an oversampled grid with an
+    inverse FFT and interpolating with the Gaussian (type-2 non-uniform FFT), the adjoint of nonuniform_fft.
+
+    Parameters:
+        * coefficients (ndarray): coefficients :math:`c_n` in FFT ordering
+        * x (ndarray): positions at which the series is evaluated
+
+    Output:
+        * values (ndarray): :math:`f(x_j)`
+    """
+
+    size = len(coefficients)
+    indices, gaussians, tau, grid_size = _gaussian_gridding(np.asarray(x, dtype=float), size, spread, oversampling)
+
+    n = frequency_indices(size)
+    deconvolved = np.zeros(grid_size, dtype=complex)
+    deconvolved[n] = coefficients * np.exp(n**2 * tau)
+    grid = grid_size*fft.ifft(deconvolved)
+    return np.sum(gaussians*grid[indices], axis=1) / np.sqrt(4*np.pi*tau) * (2*np.pi / grid_size)
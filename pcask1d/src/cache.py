@@ -0,0 +1,154 @@
+# Distributed under the terms of the MIT License.
+
+"""
+Content-addressed cache of converged results. A Parameters object leads to a unique output, so
+results are keyed by Parameters.digest. The cache has an in-memory LRU tier, and an optional
+on-disk tier (one file per result) that is evicted, least recently used first, beyond a size limit.
+"""
+
+import os
+import glob
+import numpy as np
+from collections import OrderedDict
+from .scf import SCF
+
+
+class ResultCache:
+    """
+    Two-tier cache of results. A result is a dict of named arrays and scalars, e.g. the
+    converged density coefficients, eigenvalues and energies of an SCF calculation. A result whose
+    'converged' entry is False is neither stored nor returned.
+    """
+
+    def __init__(self, directory=None, memory_size=128, disk_size=2**30):
+        r"""
+        Parameters:
+            * directory (str): directory of the on-disk tier, default no on-disk tier
+            * memory_size (int): maximum number of results held in memory
+            * disk_size (int): maximum total size (bytes) of the on-disk tier
+        """
+
+        self._directory = directory
+        self._memory_size = memory_size
+        self._disk_size = disk_size
+        self._memory = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def __contains__(self, params):
+        return params.digest in self._memory or \
+               (self._directory is not None and os.path.exists(self._path(params.digest)))
+
+    def _path(self, key):
+        return os.path.join(self._directory, key + '.npz')
+
+    def get(self, params):
+        """ The cached (converged) result for params, or None """
+
+        key = params.digest
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self._hits += 1
+            return self._memory[key]
+
+        if self._directory is not None and os.path.exists(self._path(key)):
+            path = self._path(key)
+            with np.load(path) as stored:
+                result = {name: stored[name] if stored[name].ndim else stored[name].item() for name in stored}
+            if result.get('converged', True):
+                # Mark as recently used for the eviction of the on-disk tier
+                os.utime(path)
+                self._remember(key, result)
+                self._hits += 1
+                return result
+
+        self._misses += 1
+        return None
+
+    def put(self, params, result):
+        """ Store the result for params in both tiers. A result marked as not converged is not stored. """
+
+        if not result.get('converged', True):
+            return
+
+        key = params.digest
+        self._remember(key, result)
+
+        if self._directory is not None:
+            path = self._path(key)
+            temporary_path = '{}.tmp{}.npz'.format(path[:-4], os.getpid())
+            np.savez(temporary_path, **result)
+            os.replace(temporary_path, path)
+            self._evict()
+
+    def get_or_compute(self, params, compute):
+        """ The cached result for params, computing (and storing) it with compute(params) if absent """
+
+        result = self.get(params)
+        if result is None:
+            result = compute(params)
+            self.put(params, result)
+        return result
+
+    def _remember(self, key, result):
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._memory_size:
+            self._memory.popitem(last=False)
+
+    def _evict(self):
+        """ Remove the least recently used files until the on-disk tier is within its size limit """
+
+        files = sorted(glob.glob(os.path.join(self._directory, '*.npz')), key=os.path.getmtime)
+        total_size = sum(os.path.getsize(f) for f in files)
+        while files and total_size > self._disk_size:
+            oldest = files.pop(0)
+            total_size -= os.path.getsize(oldest)
+            os.remove(oldest)
+
+    def clear(self):
+        """ Empty both tiers """
+        self._memory.clear()
+        if self._directory is not None:
+            for f in glob.glob(os.path.join(self._directory, '*.npz')):
+                os.remove(f)
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+
+def scf_result(params, density=None):
+    """ Converge an SCF calculation and collect its result for caching
+
+    Parameters:
+        * params (Parameters): input model for the system
+        * density (Density): initial guess for the density
+
+    Output:
+        * result (dict): density coefficients, eigenvalues, total energy and each of its terms (as 'energy.<term>',
+          see Hamiltonian.total_energy), iterations, residual norm and whether the SCF converged
+    """
+
+    scf = SCF(params, density)
+    scf.run()
+    result = {'density': scf.density.coefficients,
+              'eigenvalues': scf.eigenvalues,
+              'energy': scf.energy,
+              'iterations': scf.iteration,
+              'residual_norm': scf.residual_norm,
+              'converged': scf.converged}
+    result.update({'energy.' + term: value for term, value in scf.energy_terms.items()})
+    return result
+
+
+def cached_scf(params, cache, density=None):
+    """ The converged result of an SCF calculation from the cache, computed only if absent """
+    return cache.get_or_compute(params, lambda p: scf_result(p, density))
@@ -0,0 +1,142 @@
+# Distributed under the terms of the MIT License.
+
+"""
+Module that checkpoints the state of a calculation to disk, and reads it back for a restart.
+A checkpoint is a single binary file: a JSON header (Parameters inputs, scalar state, and the layout
+of each array) followed by the raw, aligned arrays. Arrays are read lazily as memory maps, such
+that a restart or post-processing job only touches the arrays it needs.
+"""
+
+import os
+import json
+import numpy as np
+from .params import Parameters
+
+MAGIC = b'PCASK1D\x00'
+ALIGNMENT = 64
+
+
+class SampledPotential:
+    """ A manual_v_ext restored from its values sampled on the double grid, interpolated periodically """
+
+    def __init__(self, grid, values, period):
+        self._grid = np.asarray(grid)
+        self._values = np.asarray(values)
+        self._period = period
+
+    def __call__(self, x):
+        return np.interp(x, self._grid, self._values, period=self._period)
+
+
+def _to_json(value):
+    """ Convert numpy types in the Parameters inputs to their python equivalents """
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError('Cannot write {} to a checkpoint'.format(type(value)))
+
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def save(path, params, arrays, state=None):
+    """ Write a checkpoint. The file is written to a temporary file alongside path and then
+    renamed over path, such that an existing checkpoint is replaced atomically.
+
+    Parameters:
+        * path (str): checkpoint file
+        * params (Parameters): input model for the system
+        * arrays (dict): named ndarrays to store
+        * state (dict): JSON serialisable scalar state
+    """
+
+    inputs = params.inputs
+    arrays = dict(arrays)
+    if inputs.get('manual_v_ext') is not None:
+        # A function cannot be stored, keep its values on the double grid instead (sampled directly, such that
+        # the restored Parameters has the same digest)
+        arrays['manual_v_ext'] = np.asarray(inputs['manual_v_ext'](x=params.big_realspace_grid), dtype=float)
+        inputs['manual_v_ext'] = 'manual_v_ext'
+
+    # Lay out the arrays after the header, each aligned for efficient memory-mapping
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        arrays[name] = array
+        layout[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset = _aligned(offset + array.nbytes)
+
+    header = json.dumps({'params': inputs, 'state': state or {}, 'arrays': layout},
+                        default=_to_json).encode()
+    data_start = _aligned(len(MAGIC) + 8 + len(header))
+
+    temporary_path = '{}.tmp{}'.format(path, os.getpid())
+    with open(temporary_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(np.uint64(len(header)).tobytes())
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name]['offset'])
+            f.write(array.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary_path, path)
+
+
+class Checkpoint:
+    """
+    Lazy reader of a checkpoint file. Only the header is read on construction, and
+    each array is memory-mapped (read-only) when accessed.
+    """
+
+    def __init__(self, path):
+
+        self._path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise RuntimeError('{} is not a pcask1d checkpoint'.format(path))
+            header_length = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+            header = json.loads(f.read(header_length).decode())
+
+        self._data_start = _aligned(len(MAGIC) + 8 + header_length)
+        self._inputs = header['params']
+        self._state = header['state']
+        self._layout = header['arrays']
+        self._params = None
+
+    def __contains__(self, name):
+        return name in self._layout
+
+    def __getitem__(self, name):
+        """ Memory-map an array of the checkpoint """
+        layout = self._layout[name]
+        shape = tuple(layout['shape'])
+        if 0 in shape:
+            return np.zeros(shape, dtype=layout['dtype'])
+        return np.memmap(self._path, dtype=layout['dtype'], mode='r',
+                         offset=self._data_start + layout['offset'], shape=shape)
+
+    @property
+    def arrays(self):
+        """ Names of the stored arrays """
+        return list(self._layout)
+
+    @property
+    def state(self):
+        """ The scalar state stored in the checkpoint """
+        return dict(self._state)
+
+    @property
+    def params(self):
+        """ The Parameters of the checkpointed calculation """
+        if self._params is None:
+            inputs = dict(self._inputs)
+            if inputs.get('manual_v_ext') is not None:
+                grid_params = Parameters(**dict(inputs, manual_v_ext=None))
+                inputs['manual_v_ext'] = SampledPotential(grid_params.big_realspace_grid,
+                                                          np.array(self['manual_v_ext']), 2*grid_params.cell)
+            self._params = Parameters(**inputs)
+        return self._params
@@ -0,0 +1,187 @@
+# Distributed under the terms of the MIT License.
+
+"""
+Module that converges the total energy with respect to the size of the plane-wave basis (num_planewaves).
+The SCF is converged on a small basis, and the converged density and eigenvectors are prolongated onto
+the next larger basis by zero-padding in G-space, from which the SCF continues. The basis is grown until
+the total energy changes by less than a target, such that most SCF iterations are spent on small bases.
+The energy is stationary with respect to the density, so the SCF on each basis is only converged as far as
+the energy target requires, and to params.scf_tol on the final basis.
+"""
+
+import numpy as np
+from .params import Parameters
+from .density import Density
+from .eigensolver import SubspaceCache
+from .scf import SCF
+from .basis import pad
+
+
+def prolongate(density, subspaces, params_from, params_to):
+    """ Transfer a density and cached eigenvectors to a larger plane-wave basis by zero-padding in G-space,
+    which represents the same functions exactly on the larger basis
+
+    Parameters:
+        * density (Density): density on the double grid of params_from
+        * subspaces (SubspaceCache): eigenvectors at each k-point in the basis of params_from
+        * params_from (Parameters): input model with the smaller basis
+        * params_to (Parameters): input model with the larger basis
+
+    Output:
+        * density (Density): density on the double grid of params_to
+        * subspaces (SubspaceCache): eigenvectors at each k-point in the basis of params_to
+    """
+
+    assert params_to.num_planewaves >= params_from.num_planewaves, 'Prolongation is onto a larger basis.'
+
+    # Density coefficients are the Fourier transform of the density, independent of the grid spacing
+    prolongated_density = Density(params_to, coeffs=pad(density.coefficients, 2*params_to.num_planewaves))
+
+    prolongated_subspaces = SubspaceCache()
+    for k_point in params_from.k_points:
+        eigenvectors = subspaces.get(k_point)
+        if eigenvectors is not None:
+            prolongated_subspaces.update(k_point, pad(eigenvectors.T, params_to.num_planewaves).T)
+    return prolongated_density, prolongated_subspaces
+
+
+class BasisContinuation:
+    """
+    An instance of this class is initialised with a params, and creates an iterable object whose
+    iterations converge the SCF on successively larger plane-wave bases, up to params.num_planewaves,
+    each seeded with the prolongated solution on the previous basis.
+
+    The SCF converges linearly, so a seeded SCF saves only a few iterations, and the ladder is faster than a
+    single SCF on the largest basis only when it stops before reaching it. The ladder is therefore skipped for
+    small bases, and its number of bases is bounded.
+    """
+
+    # Largest basis size below which the SCF is converged on the largest basis directly. Below it, an SCF
+    # iteration costs about the same on every basis of the ladder.
+    ladder_threshold = 3001
+
+    def __init__(self, params, energy_tol=1e-5, initial_planewaves=101, growth=1.5, max_rungs=5, **kwargs):
+        r"""
+        Parameters:
+            * params (Parameters): input model for the system, whose num_planewaves is the largest basis
+            * energy_tol (float): converged once the total energy changes by less than energy_tol
+            * initial_planewaves (int): size of the first (odd) basis
+            * growth (float): ratio of the sizes of successive bases
+            * max_rungs (int): maximum number of bases, including the largest. The first basis is enlarged
+              from initial_planewaves as required.
+
+        Keyword arguments:
+            * any keyword arguments of the SCF, e.g. scheduler
+        """
+
+        assert growth > 1, 'The basis must grow between steps.'
+
+        self._params = params
+        self._energy_tol = energy_tol
+        self._growth = growth
+        self._scf_kwargs = kwargs
+
+        if params.num_planewaves < self.ladder_threshold:
+            initial_planewaves = params.num_planewaves
+        initial_planewaves = max(initial_planewaves, params.num_planewaves / growth**(max_rungs - 1))
+        self._next_planewaves = min(self._odd(initial_planewaves), params.num_planewaves)
+        self._num_planewaves = []
+        self._energies = []
+        self._scf_iterations = []
+        self._scf = None
+        self._current = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        """ Converge the SCF on the next basis, returning its total energy """
+
+        if self.converged or self._next_planewaves is None:
+            raise StopIteration
+
+        # The SCF on the largest basis is converged to params.scf_tol at once
+        largest = self._next_planewaves >= self._params.num_planewaves
+        params = Parameters(**dict(self._params.inputs, num_planewaves=self._next_planewaves,
+                                   scf_tol=self._params.scf_tol if largest else self.scf_tol))
+        density, subspaces = None, None
+        if self._scf is not None:
+            density, subspaces = prolongate(self._scf.density, self._scf.subspaces, self._current, params)
+
+        scf = SCF(params, density, subspaces=subspaces, **self._scf_kwargs)
+        scf.run()
+
+        self._scf = scf
+        self._current = params
+        self._num_planewaves.append(params.num_planewaves)
+        self._energies.append(scf.energy)
+        self._scf_iterations.append(scf.iteration)
+
+        # Next basis, capped at the largest basis
+        if params.num_planewaves >= self._params.num_planewaves:
+            self._next_planewaves = None
+        else:
+            self._next_planewaves = min(self._odd(self._growth*params.num_planewaves), self._params.num_planewaves)
+
+        return self._energies[-1]
+
+    def run(self):
+        """ Grow the basis until the total energy is converged (or the largest basis is reached), and
+        converge the SCF on the final basis to params.scf_tol, returning the Parameters of the final basis """
+
+        for _ in self:
+            pass
+        if self._current.num_planewaves >= self._params.num_planewaves:
+            return self._current
+
+        params = Parameters(**dict(self._params.inputs, num_planewaves=self._current.num_planewaves))
+        density = Density(params, coeffs=self._scf.density.coefficients)
+        scf = SCF(params, density, subspaces=self._scf.subspaces, **self._scf_kwargs)
+        scf.run()
+
+        self._scf = scf
+        self._current = params
+        self._energies[-1] = scf.energy
+        self._scf_iterations[-1] += scf.iteration
+        return params
+
+    @property
+    def scf_tol(self):
+        """ Tolerance on the density residual on the intermediate bases. The error in the energy is
+        quadratic in the error in the density, so the residual need only be of order sqrt(energy_tol). """
+        return max(self._params.scf_tol, 0.1*np.sqrt(self._energy_tol))
+
+    @staticmethod
+    def _odd(num_planewaves):
+        """ The smallest odd integer no smaller than num_planewaves """
+        num_planewaves = int(np.ceil(num_planewaves))
+        return num_planewaves + 1 - num_planewaves % 2
+
+    @property
+    def params(self):
+        """ The Parameters of the latest basis """
+        return self._current
+
+    @property
+    def scf(self):
+        """ The converged SCF on the latest basis """
+        return self._scf
+
+    @property
+    def num_planewaves(self):
+        """ Size of each basis """
+        return self._num_planewaves
+
+    @property
+    def energies(self):
+        """ Total energy on each basis """
+        return self._energies
+
+    @property
+    def scf_iterations(self):
+        """ Number of SCF iterations on each basis """
+        return self._scf_iterations
+
+    @property
+    def converged(self):
+        return len(self._energies) > 1 and abs(self._energies[-1] - self._energies[-2]) < self._energy_tol
@@ -6,6 +6,9 @@ and its various features/uses.
 """
 
 import numpy as np
+from .basis import pad, is_real
+from . import instrumentation
+from . import fft
 
 
 class Density:
@@ -13,8 +16,12 @@ class Density:
 
     def __init__(self, params, **kwargs):
 
-        self._coefficients = kwargs.get('coeffs', self.initial_guess(params))
-        assert min(self._coefficients) >= 0, "Negative density region exists, aborting."
+        # Coefficients :math:`\rho(G) = \int \rho(x) e^{-iGx} dx` on the double grid
+        if 'coeffs' in kwargs:
+            self._coefficients = kwargs['coeffs']
+        else:
+            self._coefficients = self.initial_guess(params)
+        assert np.min(self.realspace(params)) >= -1e-8, "Negative density region exists, aborting."
 
     def __add__(self, density):
         return self._coefficients + density.coefficients
@@ -27,17 +34,72 @@ class Density:
     def coefficients(self, coeffs: np.ndarray):
         self._coefficients = coeffs
 
+    @classmethod
+    @instrumentation.timed('density.from_wavefunctions')
+    def from_wavefunctions(cls, params, wavefunctions, weights=None):
+        r""" Construct the density of a set of wavefunctions in a single pass,
+
+        .. math::
+
+            \rho(x) = \sum_{k} w_k \sum_{\sigma i} f_{ik}^\sigma |\phi_{ik}^\sigma(x)|^2.
+
+        The coefficients of every occupied band are zero-padded onto the double grid (on which the
+        density is exactly represented), transformed to real space with one multi-dimensional FFT,
+        and reduced over bands, spins and k-points. Real orbitals (Gamma point only) are transformed
+        from their half spectrum with real FFTs.
+
+        Parameters:
+            * params (Parameters): input model for the system
+            * wavefunctions (WavefunctionSet): the bands from which the density is constructed
+            * weights (ndarray): weight of each k-point, default uniform weights summing to one
+
+        Output:
+            * density (Density): the density of the wavefunctions
+        """
+
+        M = 2*params.num_planewaves
+        dx = params.cell / params.num_planewaves
+        num_k_points = wavefunctions.shape[0]
+        if weights is None:
+            weights = np.ones(num_k_points) / num_k_points
+
+        # Only bands with non-zero occupancy contribute
+        band_weights = np.asarray(weights)[:, None, None] * wavefunctions.occupancies
+        occupied = band_weights != 0
+
+        coefficients = wavefunctions.coefficients[occupied]
+        if params.gamma_only and is_real(coefficients):
+            # Real orbitals (Gamma point): real FFTs from the half spectrum G >= 0
+            orbitals = fft.irfft(coefficients[..., :(params.num_planewaves + 1) // 2], n=M, axis=-1)
+            density = (M**2 / (2*params.cell)) * (band_weights[occupied] @ orbitals**2)
+        else:
+            orbitals = fft.ifft(pad(coefficients, M), axis=-1)
+            density = (M**2 / (2*params.cell)) * (band_weights[occupied] @ abs(orbitals)**2)
+
+        return cls(params, coeffs=dx*fft.fft(density))
+
     @staticmethod
+    @instrumentation.timed('density.initial_guess')
     def initial_guess(params):
-        """ Initial guess for the density as overlapping Gaussians of charge """
-        density = np.zeros(2*params.num_planewaves)
-        for i in range(len(params.species)):
-            charge = params.element_charges[params.species[i]]
-            density += charge*np.exp(-(params.big_realspace_grid - params.positions[i])**2)
+        r""" Initial guess for the density as overlapping (periodic) Gaussians of charge,
+        :math:`Z_s e^{-(x - X_a)^2} / \sqrt{\pi}`, from the Gaussian form factor :math:`Z_s e^{-G^2/4}`
+        and the structure factor of each species """
+        G = params.big_planewave_grid
+        structure_factors = params.structure_factors
+        coefficients = np.exp(-G**2 / 4) * sum(params.element_charges[species] * structure_factors[species]
+                                               for species in structure_factors)
+
+        # Truncating the Gaussians of a small basis may ring below zero. Normalise such that the density
+        # integrates to the number of electrons
+        dx = params.cell / params.num_planewaves
+        density = np.maximum(fft.ifft(coefficients).real / dx, 0)
+        density *= params.num_electrons / (dx*np.sum(density))
+        return dx*fft.fft(density)
 
-        density = np.fft.fft(density)
-        density[0] = params.num_electrons
-        return density
+    def realspace(self, params):
+        r""" The density :math:`\rho(x)` on the double (big_realspace_grid) grid """
+        dx = params.cell / params.num_planewaves
+        return fft.ifft(self._coefficients).real / dx
 
     def norm(self):
         r""" The L1 norm of the density:
@@ -46,4 +108,4 @@ class Density:
 
             \int_{\Sigma} \rho(x) dx = N
         """
-        return self._coefficients[0]
+        return self._coefficients[0].real
@@ -0,0 +1,122 @@
+# Distributed under the terms of the MIT License.
+
+"""
+Iterative eigensolvers for the lowest lying states of a (matrix-free) Hamiltonian.
+Only the action of the Hamiltonian on a block of vectors is required, such that
+the dense N x N representation is never formed.
+"""
+
+import warnings
+import numpy as np
+from scipy.sparse.linalg import LinearOperator, lobpcg
+
+
+def kinetic_preconditioner(kinetic, shift=1.0, dtype=complex):
+    r""" Diagonal (Teter-like) preconditioner :math:`P = (T + s)^{-1}` built from the
+    kinetic energies :math:`\frac{1}{2}|G+k|^2`, which dominate the spectrum at large G.
+
+    Parameters:
+        * kinetic (ndarray): diagonal kinetic energies of the Hamiltonian
+        * shift (float): positive shift s that regularises the small G components
+        * dtype (type): type of the vectors on which P acts, e.g. float in a real basis
+
+    Output:
+        * preconditioner (LinearOperator): action of P on a block of vectors
+    """
+
+    inverse = 1 / (kinetic + shift)
+
+    def apply(block):
+        if block.ndim == 1:
+            return inverse * block
+        return inverse[:, None] * block
+
+    return LinearOperator((len(kinetic), len(kinetic)), matvec=apply, matmat=apply, dtype=dtype)
+
+
+def initial_subspace(kinetic, num_states):
+    """ Starting block of plane-waves with the lowest kinetic energy, plus a small random component
+    to avoid exact degeneracies with the true eigenvectors """
+
+    rng = np.random.default_rng(0)
+    guess = 1e-2 * (rng.standard_normal((len(kinetic), num_states))
+                    + 1j * rng.standard_normal((len(kinetic), num_states)))
+    guess[np.argsort(kinetic)[:num_states], np.arange(num_states)] += 1
+    return guess
+
+
+def lowest_eigenpairs(operator, num_states, guess=None, preconditioner=None, tol=1e-8, maxiter=200):
+    r""" Find the num_states lowest eigenpairs of a Hermitian operator using the block
+    LOBPCG method. Each iteration costs one application of H to a block of num_states vectors.
+
+    Parameters:
+        * operator (LinearOperator): Hermitian operator H
+        * num_states (int): number of eigenpairs required
+        * guess (ndarray): (N, num_states) initial subspace
+        * preconditioner (LinearOperator): approximate inverse of H
+        * tol (float): convergence tolerance on the residual norm :math:`||H\psi - \varepsilon \psi||`
+        * maxiter (int): maximum number of block iterations
+
+    Output:
+        * eigenvalues (ndarray): the num_states lowest eigenvalues, ascending
+        * eigenvectors (ndarray): (N, num_states) corresponding orthonormal eigenvectors
+        * residual_norms (ndarray): residual norm of each eigenpair, above tol if LOBPCG did not converge
+    """
+
+    if guess is None:
+        guess = np.random.default_rng(0).standard_normal((operator.shape[0], num_states)).astype(complex)
+
+    with warnings.catch_warnings():
+        # LOBPCG warns when maxiter is reached, the caller checks the residual norms instead
+        warnings.simplefilter('ignore', UserWarning)
+        eigenvalues, eigenvectors, residual_history = lobpcg(operator, guess, M=preconditioner, tol=tol,
+                                                             maxiter=maxiter, largest=False,
+                                                             retResidualNormsHistory=True)
+
+    # The last entry of the history holds the residual norms of the returned eigenpairs
+    residual_norms = np.atleast_1d(residual_history[-1])
+    order = np.argsort(eigenvalues)
+    return eigenvalues[order], eigenvectors[:, order], residual_norms[order]
+
+
+def warm_start(guess, kinetic, num_states):
+    """ Starting block for the eigensolver from a previous solution, completed with low kinetic
+    energy plane-waves when fewer than num_states vectors were cached """
+
+    if guess is None:
+        return initial_subspace(kinetic, num_states)
+    if guess.shape[1] >= num_states:
+        return guess[:, :num_states]
+    return np.hstack((guess, initial_subspace(kinetic, num_states)[:, guess.shape[1]:]))
+
+
+class SubspaceCache:
+    """
+    Cache of the latest eigenvectors at each k-point, used to seed (warm start) the next
+    eigendecomposition at that k-point, e.g. in the following SCF iteration.
+    """
+
+    def __init__(self, decimals=12):
+        # k-points are rounded to form the keys, such that numerically equal k-points coincide
+        self._decimals = decimals
+        self._subspaces = {}
+
+    def __len__(self):
+        return len(self._subspaces)
+
+    def __contains__(self, k_point):
+        return self._key(k_point) in self._subspaces
+
+    def _key(self, k_point):
+        return round(float(k_point), self._decimals)
+
+    def get(self, k_point):
+        """ The cached (N, num_states) eigenvectors at a k-point, or None """
+        return self._subspaces.get(self._key(k_point))
+
+    def update(self, k_point, eigenvectors):
+        """ Store the eigenvectors at a k-point """
+        self._subspaces[self._key(k_point)] = eigenvectors
+
+    def clear(self):
+        self._subspaces.clear()
@@ -0,0 +1,197 @@
+# Distributed under the terms of the MIT License.
+
+r"""
+Module that implements the (Hartree-Fock) exact exchange operator,
+
+.. math::
+
+    \hat{K} \psi(x) = -\sum_{q} w_q \sum_{j} f_{jq} \phi_{jq}(x) \int \frac{\phi^*_{jq}(x') \psi(x')}{|x-x'| + c} dx',
+
+with the softened Coulomb kernel of the Hartree potential. Each integral is a convolution of a pair
+density, computed with FFTs on the double grid. The exact operator is costly to apply, so it is
+compressed to a low rank (adaptively compressed exchange, ACE) operator that is exact on a given set of
+orbitals, and is applied in the inner (eigensolver and SCF) iterations at the cost of a few dot products.
+"""
+
+import numpy as np
+from .basis import pad, truncate, frequency_indices
+from . import instrumentation
+from . import fft
+
+
+def exchange_kernel(params, q):
+    r""" Coefficients of the softened Coulomb kernel :math:`\frac{e^{-iqd}}{|d| + c}` on the double grid,
+    as a function of the (minimum image) displacement d. The phase accounts for the Bloch phases of a
+    pair density between orbitals whose k-points differ by q. At the displacement d=-a, which is its own
+    image, the phase is averaged over both images such that the exchange operator is Hermitian.
+
+    Parameters:
+        * params (Parameters): input model for the system
+        * q (float): difference between the k-points of the pair of orbitals
+    """
+
+    dx = params.cell / params.num_planewaves
+    displacements = dx * frequency_indices(2*params.num_planewaves)
+    phases = np.exp(-1j*q*displacements)
+    phases[params.num_planewaves] = np.cos(q*params.cell)
+    return dx * fft.fft(phases / (abs(displacements) + params.soft))
+
+
+class ExchangeOperator:
+    """
+    The exact exchange operator of a set of (occupied) orbitals. Applied at a k-point, it acts on
+    the plane-wave coefficients of the Bloch periodic part of the orbitals at that k-point.
+    """
+
+    def __init__(self, params, wavefunctions, weights=None):
+        r"""
+        Parameters:
+            * params (Parameters): input model for the system
+            * wavefunctions (WavefunctionSet): orbitals (and occupancies) from which the operator is constructed
+            * weights (ndarray): weight of each k-point, default uniform weights summing to one
+        """
+
+        num_k_points = wavefunctions.shape[0]
+        if weights is None:
+            weights = np.ones(num_k_points) / num_k_points
+
+        self._wavefunctions = wavefunctions
+        self._band_weights = np.asarray(weights)[:, None, None] * wavefunctions.occupancies
+
+        # Occupied orbitals in real space on the double grid, and their k-points
+        occupied = self._band_weights != 0
+        orbitals = fft.ifft(pad(wavefunctions.coefficients[occupied], 2*params.num_planewaves), axis=-1)
+        orbital_weights = self._band_weights[occupied]
+        orbital_k_points = np.broadcast_to(wavefunctions.k_points[:, None, None], occupied.shape)[occupied]
+
+        # A k-point whose partner -k is absent represents both (symmetry reduced sampling), and the
+        # orbitals at -k are the complex conjugates of those at k
+        k_points = wavefunctions.k_points
+        unpaired = np.array([not np.any(np.isclose(k_points, -k)) for k in orbital_k_points], dtype=bool)
+        orbital_weights = np.where(unpaired, 0.5, 1) * orbital_weights
+        self._orbitals = np.concatenate((orbitals, orbitals[unpaired].conj()))
+        self._orbital_weights = np.concatenate((orbital_weights, orbital_weights[unpaired]))
+        self._orbital_k_points = np.concatenate((orbital_k_points, -orbital_k_points[unpaired]))
+
+        self._kernels = {}
+        self._applied = {}
+
+    def kernel(self, params, q):
+        """ The kernel for a k-point difference q, computed once for each q """
+        key = round(float(q), 12)
+        if key not in self._kernels:
+            self._kernels[key] = exchange_kernel(params, q)
+        return self._kernels[key]
+
+    @instrumentation.timed('exchange.apply')
+    def apply(self, params, coefficients, k_point=0):
+        r""" Action of the exact exchange operator :math:`\hat{K} | \psi \rangle` at a k-point, at a cost of
+        four FFTs on the double grid per (vector, occupied orbital) pair
+
+        Parameters:
+            * params (Parameters): input model for the system
+            * coefficients (ndarray): plane-wave coefficients, (N,) or a block (N, num_vectors)
+            * k_point (float): k-point of the vectors
+
+        Output:
+            * k_coefficients (ndarray): plane-wave coefficients of :math:`\hat{K} | \psi \rangle`
+        """
+
+        M = 2*params.num_planewaves
+        dx = params.cell / params.num_planewaves
+        block = np.atleast_2d(coefficients.T)
+        psi = fft.ifft(pad(block, M), axis=-1)
+
+        exchange = np.zeros_like(psi)
+        for orbital, weight, q in zip(self._orbitals, self._orbital_weights, self._orbital_k_points):
+            pair_densities = fft.fft(orbital.conj() * psi, axis=-1)
+            potentials = fft.ifft(pair_densities * self.kernel(params, k_point - q), axis=-1)
+            exchange -= weight * orbital * potentials
+
+        # Normalisation of the three orbitals (M/sqrt(2a)) on the grid, and of the plane-waves (dx/sqrt(2a))
+        k_coefficients = truncate(fft.fft(exchange, axis=-1), params.num_planewaves) * M / dx
+        return k_coefficients.T.reshape(coefficients.shape)
+
+    def _applied_orbitals(self, params, index):
+        r""" :math:`\hat{K} \Phi_k` for the orbitals at the k-point of the given index of the set """
+        if index not in self._applied:
+            k_point = self._wavefunctions.k_points[index]
+            self._applied[index] = self.apply(params, self._wavefunctions.eigenvectors(index), k_point)
+        return self._applied[index]
+
+    @instrumentation.timed('exchange.compress')
+    def compress(self, params, k_point):
+        r""" Adaptively compressed exchange (ACE) operator at a k-point of the set. With the orbitals
+        :math:`\Phi` at the k-point and :math:`W = \hat{K} \Phi`, the operator
+
+        .. math::
+
+            \hat{K}_{ACE} = -\xi \xi^\dagger, \quad \xi = W U s^{-1/2}, \quad -\Phi^\dagger W = U s U^\dagger,
+
+        agrees with :math:`\hat{K}` on the span of :math:`\Phi`.
+
+        Parameters:
+            * params (Parameters): input model for the system
+            * k_point (float): k-point (of the set) at which to compress the operator
+
+        Output:
+            * ace (CompressedExchange): the low rank exchange operator at k_point
+        """
+
+        index = self._index(k_point)
+        orbitals = self._wavefunctions.eigenvectors(index)
+        applied = self._applied_orbitals(params, index)
+
+        overlap = -(orbitals.conj().T @ applied)
+        eigenvalues, eigenvectors = np.linalg.eigh(0.5*(overlap + overlap.conj().T))
+        keep = eigenvalues > 1e-14 * max(eigenvalues[-1], 1e-300)
+        projectors = applied @ (eigenvectors[:, keep] / np.sqrt(eigenvalues[keep]))
+        return CompressedExchange(projectors)
+
+    def energy(self, params):
+        r""" The exchange energy :math:`E_x = \frac{1}{2} \sum_{k} w_k \sum_i f_{ik} \langle \phi_{ik} | \hat{K} | \phi_{ik} \rangle`
+
+        Parameters:
+            * params (Parameters): input model for the system
+        """
+
+        energy = 0
+        for index in range(self._wavefunctions.shape[0]):
+            orbitals = self._wavefunctions.eigenvectors(index)
+            expectations = np.sum(orbitals.conj() * self._applied_orbitals(params, index), axis=0).real
+            energy += 0.5 * self._band_weights[index, 0] @ expectations
+        return energy
+
+    def _index(self, k_point):
+        indices = np.flatnonzero(np.isclose(self._wavefunctions.k_points, k_point))
+        if len(indices) == 0:
+            raise RuntimeError('No orbitals at k-point {} from which to compress the exchange operator'.format(k_point))
+        return indices[0]
+
+
+class CompressedExchange:
+    r""" The adaptively compressed exchange operator :math:`-\xi \xi^\dagger` at a single k-point """
+
+    def __init__(self, projectors):
+        r"""
+        Parameters:
+            * projectors (ndarray): (N, rank) array :math:`\xi`
+        """
+        self._projectors = projectors
+
+    @property
+    def projectors(self):
+        return self._projectors
+
+    def apply(self, params, coefficients):
+        r""" Action :math:`-\xi (\xi^\dagger \psi)`, at a cost of :math:`O(N \times rank)` per vector
+
+        Parameters:
+            * params (Parameters): input model for the system
+            * coefficients (ndarray): plane-wave coefficients, (N,) or a block (N, num_vectors)
+        """
+        return -self._projectors @ (self._projectors.conj().T @ coefficients)
+
+    def representation(self, params):
+        """ The operator as a dense (N, N) matrix in the plane-wave basis """
+        return -self._projectors @ self._projectors.conj().T
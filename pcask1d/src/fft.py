@@ -0,0 +1,147 @@
+# Distributed under the terms of the MIT License.
+
+"""
+Module through which every FFT of a calculation is computed, such that the FFT library and the number of
+threads are chosen in one place. The backends are numpy, scipy.fft (threaded over a batch of transforms)
+and, if installed, pyFFTW, for which a plan and its aligned buffers are cached per transform (kind, shape,
+dtype, axis). Each transform is counted by the instrumentation.
+
+The threads of the FFTs and of BLAS/LAPACK (with threadpoolctl, if installed) are set together, such that
+a pool of worker processes can run each worker on its share of the cores, rather than oversubscribing them.
+"""
+
+import os
+import numpy as np
+import scipy.fft
+from . import instrumentation
+
+try:
+    import pyfftw
+    import pyfftw.builders
+except ImportError:
+    pyfftw = None
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    threadpool_limits = None
+
+BACKENDS = ('numpy', 'scipy', 'pyfftw')
+
+
+class _State:
+    backend = 'scipy'
+    threads = os.cpu_count()
+    plans = {}
+    blas_limits = None
+
+
+def set_backend(backend):
+    """ Choose the library that computes the FFTs
+
+    Parameters:
+        * backend (str): 'numpy', 'scipy' (default) or 'pyfftw'
+    """
+
+    if backend not in BACKENDS:
+        raise RuntimeError('Chosen FFT backend {} is not implemented'.format(backend))
+    if backend == 'pyfftw' and pyfftw is None:
+        raise RuntimeError('The pyfftw FFT backend requires pyFFTW to be installed.')
+    _State.backend = backend
+    _State.plans.clear()
+
+
+def set_threads(threads=None, blas=True):
+    """ Set the number of threads of each FFT, and of BLAS/LAPACK. Without threadpoolctl, the BLAS threads
+    are set through the environment, which only affects processes started afterwards.
+
+    Parameters:
+        * threads (int): number of threads, default the number of cores
+        * blas (bool): also set the number of threads of BLAS/LAPACK
+    """
+
+    _State.threads = threads or os.cpu_count()
+    _State.plans.clear()
+
+    if blas:
+        if threadpool_limits is not None:
+            _State.blas_limits = threadpool_limits(limits=_State.threads, user_api='blas')
+        else:
+            for variable in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+                os.environ[variable] = str(_State.threads)
+
+
+def configure(backend=None, threads=None, blas=True):
+    """ Set the backend and the number of threads, e.g. as the initializer of a worker process
+
+    Parameters:
+        * backend (str): 'numpy', 'scipy' or 'pyfftw', default unchanged
+        * threads (int): number of threads, default the number of cores
+        * blas (bool): also set the number of threads of BLAS/LAPACK
+    """
+
+    if backend is not None:
+        set_backend(backend)
+    set_threads(threads, blas)
+
+
+def worker_threads(num_workers):
+    """ Number of threads of each of num_workers worker processes, such that together they use each core once """
+    return max(os.cpu_count() // num_workers, 1)
+
+
+def backend():
+    return _State.backend
+
+
+def threads():
+    return _State.threads
+
+
+def fft(a, axis=-1):
+    """ Discrete Fourier transform along an axis, as numpy.fft.fft """
+    return _transform('fft', a, None, axis)
+
+
+def ifft(a, axis=-1):
+    """ Inverse discrete Fourier transform along an axis, as numpy.fft.ifft """
+    return _transform('ifft', a, None, axis)
+
+
+def rfft(a, axis=-1):
+    """ Discrete Fourier transform of real input along an axis (half spectrum), as numpy.fft.rfft """
+    return _transform('rfft', a, None, axis)
+
+
+def irfft(a, n=None, axis=-1):
+    """ Inverse of rfft, a real output of length n along an axis, as numpy.fft.irfft """
+    return _transform('irfft', a, n, axis)
+
+
+def _transform(kind, a, n, axis):
+    """ Compute (and count) a batch of transforms of a given kind with the chosen backend """
+
+    a = np.asarray(a)
+    instrumentation.count('rfft' if kind in ('rfft', 'irfft') else 'fft', a.size // a.shape[axis])
+
+    if _State.backend == 'numpy':
+        return getattr(np.fft, kind)(a, n=n, axis=axis)
+    if _State.backend == 'scipy':
+        return getattr(scipy.fft, kind)(a, n=n, axis=axis, workers=_State.threads)
+
+    # The output array belongs to the cached plan, and is overwritten by its next execution
+    return _plan(kind, a, n, axis)(a).copy()
+
+
+def _plan(kind, a, n, axis):
+    """ The cached pyFFTW plan of a transform, created (with its aligned buffers) on first use """
+
+    if kind in ('fft', 'ifft'):
+        a = a.astype(np.result_type(a.dtype, np.complex64), copy=False)
+    key = (kind, a.shape, a.dtype, n, axis % a.ndim)
+
+    if key not in _State.plans:
+        buffer = pyfftw.empty_aligned(a.shape, dtype=a.dtype)
+        _State.plans[key] = getattr(pyfftw.builders, kind)(buffer, n=n, axis=axis, threads=_State.threads,
+                                                           planner_effort='FFTW_MEASURE')
+    return _State.plans[key]
@@ -0,0 +1,98 @@
+# Distributed under the terms of the MIT License.
+
+"""
+Module that computes the forces on the ions (Parameters.species at Parameters.positions).
+The plane-wave basis does not depend on the ionic positions, so the Hellmann-Feynman theorem gives
+the forces analytically from the converged density and the derivative of the ionic potentials.
+"""
+
+import numpy as np
+from .basis import nonuniform_ifft
+
+
+def ion_ion_energy(params, block_size=1024):
+    r""" Interaction energy of the ions with the softened Coulomb interaction used for the electrons,
+
+    .. math::
+
+        E_{ii} = \sum_{a<b} \frac{Z_a Z_b}{|X_a - X_b| + c},
+
+    with minimum image distances. The interaction is finite and of finite range (the cell), so the sum over
+    pairs is exact, and is evaluated for blocks of ions at a time to bound the memory to block_size per ion.
+
+    Parameters:
+        * params (Parameters): input model for the system
+        * block_size (int): number of ions per block of the sum
+    """
+
+    charges, positions = _ions(params)
+    energy = -np.sum(charges**2) / params.soft
+    for start in range(0, len(positions), block_size):
+        block = slice(start, start + block_size)
+        distances = abs(params.minimum_image(positions[block, None] - positions[None, :]))
+        energy += charges[block] @ (1 / (distances + params.soft)) @ charges
+    return 0.5*energy
+
+
+def ion_ion_forces(params):
+    r""" Forces :math:`-\partial E_{ii} / \partial X_a` from the ion-ion interaction
+
+    Parameters:
+        * params (Parameters): input model for the system
+    """
+
+    charges, positions = _ions(params)
+    displacements = params.minimum_image(positions[:, None] - positions[None, :])
+    pair_forces = charges[:, None] * charges[None, :] * np.sign(displacements) \
+                  / (abs(displacements) + params.soft)**2
+    return np.sum(pair_forces, axis=1)
+
+
+def electron_ion_forces(params, density):
+    r""" Hellmann-Feynman forces on the ions from the electrons,
+
+    .. math::
+
+        F_a = -\int \rho(x) \frac{\partial v_a(x)}{\partial X_a} dx
+            = \frac{1}{2a} \text{Re} \sum_G iG F_a(G) e^{-iG(X_a + a)} \rho(G)^*,
+
+    with the form factor :math:`F_a(G)` of the ion, evaluated over the frequencies of the double grid,
+    on which the density and potential enter the Hamiltonian.
+
+    Parameters:
+        * params (Parameters): input model for the system
+        * density (Density): converged density
+    """
+
+    _, positions = _ions(params)
+    G = params.big_planewave_grid
+
+    forces = np.zeros(len(positions))
+    for species in dict.fromkeys(params.species):
+        atoms = np.asarray(params.species) == species
+        # Sum over G at each ion, with phases G(X + a) = pi n (X + a) / a
+        series = -1j*G*params.form_factor(species)*density.coefficients
+        forces[atoms] = nonuniform_ifft(series, np.pi*(positions[atoms] + params.cell) / params.cell).real
+    return forces / (2*params.cell)
+
+
+def ionic_forces(params, density):
+    """ Total force on each ion: Hellmann-Feynman electronic forces plus the ion-ion forces
+
+    Parameters:
+        * params (Parameters): input model for the system
+        * density (Density): converged density
+
+    Output:
+        * forces (ndarray): force on each ion, in the order of params.species
+    """
+
+    if params.inputs.get('manual_v_ext') is not None:
+        raise RuntimeError('Forces are only defined for external potentials given by the ions.')
+    return electron_ion_forces(params, density) + ion_ion_forces(params)
+
+
+def _ions(params):
+    """ Charges and positions of the ions as arrays """
+    charges = np.array([params.element_charges[species] for species in params.species], dtype=float)
+    return charges, np.asarray(params.positions, dtype=float)
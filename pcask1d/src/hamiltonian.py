@@ -8,14 +8,41 @@ extract various quantities such as total energy, wavefunctions, and so on.
 
 import numpy as np
 import scipy as sp
+import scipy.linalg
 import warnings
-from scipy.sparse.linalg import eigs
-from .wavefunction import Wavefunction
+from scipy.sparse.linalg import LinearOperator
+from .wavefunction import WavefunctionSet
+from .density import Density
+from .eigensolver import lowest_eigenpairs, kinetic_preconditioner, warm_start
+from .basis import pad, truncate, frequency_indices, real_basis, complex_basis, half_spectrum, from_half_spectrum
+from .occupancy import occupy
+from . import instrumentation
+from . import fft
 
 
 class Hamiltonian:
     """ Class that implements the Hamiltonian object """
 
+    # Basis size below which the dense eigensolver is used with params.eigensolver == 'auto'
+    dense_threshold = 500
+
+    # Number of k-points diagonalised in a single stack by default, bounding its memory to stack_size*N*N
+    stack_size = 16
+
+    # A stacked eigh computes every eigenpair, and only beats a partial eigh of each matrix of the stack
+    # when at least this fraction of the eigenpairs is required
+    full_stack_fraction = 0.25
+
+    # Real and complex types of each working precision
+    precisions = {'double': (np.float64, np.complex128), 'single': (np.float32, np.complex64)}
+
+    # Smallest eigenpair residual to which the iterative eigensolver converges reliably in single precision
+    single_precision_tol = 1e-3
+
+    # LOBPCG locks each eigenpair once its residual is below the tolerance, and the final Rayleigh-Ritz step can
+    # raise the residuals of locked pairs a little above it. Larger residuals are treated as non-convergence.
+    residual_slack = 10
+
     def __init__(self, density, **kwargs):
         r"""
         Defines (abstractly) the Hamiltonian operator for a given density and k-point from
@@ -26,6 +53,14 @@ class Hamiltonian:
 
         Keyword arguments:
             * k-point: point on the reciprocal lattice for sampling the first BZ.
+            * local_potential: precomputed local potential on the double grid, e.g. shared
+              between the Hamiltonians at each k-point for the same density.
+            * potential_representation: precomputed (N, N) k-independent block of the representation
+              (see potential_representation), e.g. shared between the Hamiltonians along a band-structure path.
+            * exchange: (non-local) exchange operator at the k-point, e.g. a CompressedExchange
+              for Hartree-Fock. Default no exchange.
+            * precision: 'double' (default) or 'single', the precision in which the Hamiltonian is
+              represented and applied, and in which its eigenvectors are computed.
         """
 
         # For which k-point is H constructed? Default \gamma point.
@@ -34,6 +69,27 @@ class Hamiltonian:
         # Density associated with the Kohn-Sham Hamiltonian
         self._density = density
 
+        # Local potential on the double grid, constructed on first use if not given
+        self._local_potential = kwargs.get('local_potential', None)
+
+        # k-independent block of the representation, constructed on each use if not given
+        self._potential_representation = kwargs.get('potential_representation', None)
+
+        # Non-local exchange operator at this k-point
+        self._exchange = kwargs.get('exchange', None)
+
+        # Working precision of the matrices, vectors and FFTs
+        self._precision = kwargs.get('precision', 'double')
+        if self._precision not in self.precisions:
+            raise RuntimeError('Chosen precision {} is not implemented'.format(self._precision))
+        self._real_type, self._complex_type = self.precisions[self._precision]
+
+    @property
+    def precision(self):
+        """ Working precision of the Hamiltonian, 'double' or 'single' """
+        return self._precision
+
+    @instrumentation.timed('hamiltonian.representation')
     def representation(self, params):
         r""" Construct the representation (coefficients) of the Hamiltonian
         in the plane-wave basis: :math:`\langle G | H[\rho] | G' \rangle`
@@ -45,43 +101,323 @@ class Hamiltonian:
             * hamiltonian_representation (ndarray): the Hamiltonian matrix in plane-wave basis
         """
 
-        hamiltonian_representation = np.diag(self.kinetic(params)) \
-                                     + self.v_ext(params) \
-                                     + self.v_h(params) \
-                                     + self.v_xc(params)
+        hamiltonian_representation = self.potential_representation(params)
+        hamiltonian_representation[np.diag_indices(params.num_planewaves)] += self.kinetic(params)
+        if self._exchange is not None:
+            hamiltonian_representation += self._exchange.representation(params)
+        return hamiltonian_representation
+
+    def potential_representation(self, params):
+        r""" The k-independent block of the Hamiltonian, :math:`v(G-G')`, constructed from
+        the coefficients of the local potential on the double grid
+
+        Parameters:
+            * params (Parameters): input model for the system
+        """
+
+        if self._potential_representation is not None:
+            return self._potential_representation.astype(self._complex_type)
+
+        potential_coefficients = fft.fft(self.local_potential(params)) / (2*params.num_planewaves)
+        potential_coefficients = potential_coefficients.astype(self._complex_type)
+        n = frequency_indices(params.num_planewaves)
+        differences = (n[:, None] - n[None, :]) % (2*params.num_planewaves)
+        return potential_coefficients[differences]
+
+    @instrumentation.timed('hamiltonian.real_representation')
+    def real_representation(self, params):
+        r""" Representation of the Hamiltonian at the Gamma point in the real basis
+        :math:`\{ 1, \sqrt{2} \cos(Gx), \sqrt{2} \sin(Gx) \}` (see basis.real_basis). The potential is real,
+        so the matrix is real symmetric, with elements from the coefficients :math:`v_G` of the potential,
+
+        .. math::
+
+            \langle c_G | v | c_{G'} \rangle = \text{Re}(v_{G-G'} + v_{G+G'}), \quad
+            \langle s_G | v | s_{G'} \rangle = \text{Re}(v_{G-G'} - v_{G+G'}), \quad
+            \langle c_G | v | s_{G'} \rangle = \text{Im}(v_{G-G'} - v_{G+G'}).
+
+        Parameters:
+            * params (Parameters): input model for the system
+
+        Output:
+            * hamiltonian_representation (ndarray): the real (N, N) Hamiltonian matrix in the real basis
+        """
+
+        N = params.num_planewaves
+        M = 2*N
+        half = (N - 1) // 2
+        v = (fft.fft(self.local_potential(params)) / M).astype(self._complex_type)
+        n = np.arange(1, half + 1)
+        v_difference = v[(n[:, None] - n[None, :]) % M]
+        v_sum = v[(n[:, None] + n[None, :]) % M]
+
+        cosines = slice(1, half + 1)
+        sines = slice(half + 1, N)
+        hamiltonian_representation = np.empty((N, N), dtype=self._real_type)
+        hamiltonian_representation[0, 0] = v[0].real
+        hamiltonian_representation[0, cosines] = hamiltonian_representation[cosines, 0] = np.sqrt(2)*v[n].real
+        hamiltonian_representation[0, sines] = hamiltonian_representation[sines, 0] = -np.sqrt(2)*v[n].imag
+        hamiltonian_representation[cosines, cosines] = v_difference.real + v_sum.real
+        hamiltonian_representation[sines, sines] = v_difference.real - v_sum.real
+        hamiltonian_representation[cosines, sines] = v_difference.imag - v_sum.imag
+        hamiltonian_representation[sines, cosines] = hamiltonian_representation[cosines, sines].T
+
+        hamiltonian_representation[np.diag_indices(N)] += self.real_kinetic(params)
+        if self._exchange is not None:
+            exchange = self._exchange.representation(params)
+            hamiltonian_representation += real_basis(real_basis(exchange).conj().T).real
         return hamiltonian_representation
 
-    def eigendecomposition(self, params, num_states='all'):
+    @instrumentation.timed('hamiltonian.representation_stack')
+    def representation_stack(self, params, k_points):
+        r""" Representations of the Hamiltonian at several k-points as a (n_k, N, N) stack.
+        Only the kinetic energy :math:`\frac{1}{2}|G+k|^2` depends on k, so the potential block
+        is built once and broadcast across the stack.
+
+        Parameters:
+            * params (Parameters): input model for the system
+            * k_points (ndarray): k-points at which the Hamiltonian is represented
+
+        Output:
+            * hamiltonian_stack (ndarray): (n_k, N, N) Hamiltonian matrices
+        """
+
+        if self._exchange is not None:
+            raise RuntimeError('The exchange operator is defined at a single k-point, and cannot be stacked.')
+
+        k_points = np.atleast_1d(k_points)
+        N = params.num_planewaves
+        hamiltonian_stack = np.empty((len(k_points), N, N), dtype=self._complex_type)
+        hamiltonian_stack[:] = self.potential_representation(params)
+        diagonal = np.arange(N)
+        hamiltonian_stack[:, diagonal, diagonal] += \
+            0.5*abs(params.planewave_grid[None, :] + k_points[:, None])**2
+        return hamiltonian_stack
+
+    @instrumentation.timed('hamiltonian.apply')
+    def apply(self, params, coefficients):
+        r""" Matrix-free action of the Hamiltonian :math:`H | \psi \rangle`. The kinetic energy is
+        applied in G-space, and the local potential in real space on the double grid, at a cost
+        of :math:`O(N \log N)` per vector. Any (compressed) exchange operator is applied at a cost
+        of :math:`O(N \times rank)` per vector.
+
+        Parameters:
+            * params (Parameters): input model for the system
+            * coefficients (ndarray): plane-wave coefficients, (N,) or a block (N, num_vectors)
+
+        Output:
+            * h_coefficients (ndarray): plane-wave coefficients of :math:`H | \psi \rangle`
+        """
+
+        block = coefficients.T.astype(self._complex_type, copy=False)
+        psi = fft.ifft(pad(block, 2*params.num_planewaves), axis=-1)
+        v_psi = truncate(fft.fft(self._working_potential(params) * psi, axis=-1), params.num_planewaves)
+        h_coefficients = (self.kinetic(params).astype(self._real_type) * block + v_psi).T
+        if self._exchange is not None:
+            h_coefficients += self._exchange.apply(params, coefficients)
+        return h_coefficients
+
+    @instrumentation.timed('hamiltonian.real_apply')
+    def real_apply(self, params, real_coefficients):
+        r""" Matrix-free action of the Hamiltonian at the Gamma point on real vectors in the real basis
+        (see basis.real_basis). The local potential is applied with real FFTs of the half spectrum.
+
+        Parameters:
+            * params (Parameters): input model for the system
+            * real_coefficients (ndarray): real coefficients, (N,) or a block (N, num_vectors)
+
+        Output:
+            * h_coefficients (ndarray): real coefficients of :math:`H | \psi \rangle`
+        """
+
+        M = 2*params.num_planewaves
+        block = real_coefficients.T.astype(self._real_type, copy=False)
+        psi = fft.irfft(half_spectrum(block, M), n=M, axis=-1)
+        v_psi = from_half_spectrum(fft.rfft(self._working_potential(params) * psi, axis=-1), params.num_planewaves)
+        h_coefficients = (self.real_kinetic(params).astype(self._real_type) * block + v_psi).T
+        if self._exchange is not None:
+            exchange = self._exchange.apply(params, complex_basis(block).T)
+            h_coefficients += real_basis(exchange.T).real.T
+        return h_coefficients
+
+    def operator(self, params):
+        """ The Hamiltonian as a scipy LinearOperator, for use in iterative eigensolvers. The operator acts
+        on double precision vectors, and is applied in the working precision, such that the (small) subspace
+        algebra of the eigensolver stays in double precision.
+
+        Parameters:
+            * params (Parameters): input model for the system
+        """
+
+        N = params.num_planewaves
+        apply = lambda x: self.apply(params, x).astype(complex, copy=False)
+        return LinearOperator((N, N), matvec=apply, matmat=apply, dtype=complex)
+
+    def real_operator(self, params):
+        """ The Hamiltonian at the Gamma point in the real basis as a real scipy LinearOperator,
+        applied in the working precision (see operator)
+
+        Parameters:
+            * params (Parameters): input model for the system
+        """
+
+        N = params.num_planewaves
+        apply = lambda x: self.real_apply(params, x).astype(float, copy=False)
+        return LinearOperator((N, N), matvec=apply, matmat=apply, dtype=float)
+
+    @instrumentation.timed('hamiltonian.eigendecomposition')
+    def eigendecomposition(self, params, num_states='all', guess=None, tol=None):
         r""" Calculate the num_states lowest lying eigenvectors and eigenvalues of the Hamiltonian
 
         Parameters:
             * params (Parameters): input model for the system.
             * num_states (int): number of eigenvectors/eigenvalues to calculate.
+            * guess (ndarray): (N, num_states) starting subspace for the iterative eigensolver,
+              e.g. the eigenvectors of a previous SCF iteration. Ignored by the dense eigensolver.
+            * tol (float): residual tolerance of the iterative eigensolver, default params.eigensolver_tol
 
         Output:
-            * wavefunctions (Wavefunction): a container of type Wavefunction with
+            * wavefunctions (WavefunctionSet): a container of type WavefunctionSet with
               the lowest num_states eigenvectors, band indices, etc..
         """
 
-        if num_states > params.num_planewaves:
+        N = params.num_planewaves
+        if num_states != 'all' and num_states > N:
             num_states = 'all'
             warnings.warn('Requested num_states greater than Hamiltonian dimension -- calculating all eigenvectors.')
 
-        if num_states == 'all':
-            num_states = params.num_planewaves
+        if self._use_real_arithmetic(params):
+            eigenvalues, eigenvectors = self._real_eigenpairs(params, num_states, guess, tol)
+        elif num_states == 'all':
             eigenvalues, eigenvectors = np.linalg.eigh(self.representation(params))
+        elif self.use_dense_solver(params, num_states):
+            eigenvalues, eigenvectors = sp.linalg.eigh(self.representation(params),
+                                                       subset_by_index=[0, num_states - 1])
         else:
-            eigenvalues, eigenvectors = eigs(self.representation(params), num_states, which='SM')
+            kinetic = self.kinetic(params)
+            tol = self._eigensolver_tol(params, tol)
+            eigenvalues, eigenvectors, residual_norms = lowest_eigenpairs(
+                self.operator(params), num_states, guess=warm_start(guess, kinetic, num_states).astype(complex),
+                preconditioner=kinetic_preconditioner(kinetic), tol=tol)
+            if not self._converged(residual_norms, tol):
+                eigenvalues, eigenvectors = sp.linalg.eigh(self.representation(params),
+                                                           subset_by_index=[0, num_states - 1])
+
+        eigenvectors = eigenvectors.astype(self._complex_type, copy=False)
+        return self._wavefunctions(params, np.array([self._k_point]), eigenvalues[None], eigenvectors[None])
+
+    @instrumentation.timed('hamiltonian.eigendecomposition_stack')
+    def eigendecomposition_stack(self, params, k_points, num_states='all', chunk_size=None):
+        r""" Calculate the num_states lowest lying eigenvectors and eigenvalues of the Hamiltonian
+        at several k-points with the dense eigensolver. The representations at the k-points are constructed
+        as a stack, from a single potential block, and diagonalised with a single stacked eigh if a large
+        fraction of the eigenpairs is required (see full_stack_fraction), or else one by one for the
+        lowest num_states eigenpairs alone.
 
-        wavefunctions = [Wavefunction for i in range(num_states)]
-        for i, wavefunction in enumerate(wavefunctions):
-            wavefunction.band_index = i
-            wavefunction.pw_coefficients = eigenvectors[:,i]
-            wavefunction.energy = eigenvalues[i]
-            # TODO: Add support for partial occupancies here
-            wavefunction.occupancy = 1 if i <= params.num_electrons else 0
+        Parameters:
+            * params (Parameters): input model for the system.
+            * k_points (ndarray): k-points at which to diagonalise the Hamiltonian.
+            * num_states (int): number of eigenvectors/eigenvalues to calculate at each k-point.
+            * chunk_size (int): maximum number of k-points diagonalised in a single stack,
+              bounding the memory used to chunk_size*N*N complex numbers. Default stack_size.
+
+        Output:
+            * wavefunctions (WavefunctionSet): a container of type WavefunctionSet with
+              the lowest num_states eigenvectors at each k-point, band indices, etc..
+        """
+
+        k_points = np.atleast_1d(k_points)
+        if num_states == 'all' or num_states > params.num_planewaves:
+            num_states = params.num_planewaves
+        if chunk_size is None:
+            chunk_size = self.stack_size
+
+        eigenvalues = np.empty((len(k_points), num_states))
+        eigenvectors = np.empty((len(k_points), params.num_planewaves, num_states), dtype=self._complex_type)
+        for start in range(0, len(k_points), chunk_size):
+            k_chunk = slice(start, start + chunk_size)
+            stack = self.representation_stack(params, k_points[k_chunk])
+            if num_states >= self.full_stack_fraction * params.num_planewaves:
+                energies, vectors = np.linalg.eigh(stack)
+                eigenvalues[k_chunk] = energies[:, :num_states]
+                eigenvectors[k_chunk] = vectors[:, :, :num_states]
+            else:
+                for i, matrix in enumerate(stack, start):
+                    eigenvalues[i], eigenvectors[i] = sp.linalg.eigh(matrix, subset_by_index=[0, num_states - 1])
+
+        return self._wavefunctions(params, k_points, eigenvalues, eigenvectors)
+
+    @staticmethod
+    def _wavefunctions(params, k_points, eigenvalues, eigenvectors):
+        """ Pack the (n_k, num_states) eigenvalues and (n_k, N, num_states) eigenvectors into a WavefunctionSet.
+        The occupancies are those of the given k-points alone (uniformly weighted), see occupancy.occupy. """
+
+        eigenvalues = eigenvalues.astype(float)
+        num_states = eigenvalues.shape[-1]
+        if num_states >= params.num_electrons:
+            occupancies = occupy(params, eigenvalues)[0]
+        else:
+            # Too few bands to hold the electrons, each band is fully occupied
+            occupancies = np.ones_like(eigenvalues)
 
-        return wavefunctions
+        return WavefunctionSet(coefficients=np.ascontiguousarray(np.swapaxes(eigenvectors, 1, 2)[:, None]),
+                               energies=eigenvalues[:, None],
+                               occupancies=occupancies[:, None],
+                               band_indices=np.arange(num_states),
+                               k_points=np.asarray(k_points, dtype=float))
+
+    def _real_eigenpairs(self, params, num_states, guess, tol):
+        """ Lowest eigenpairs at the Gamma point, computed with real arithmetic in the real basis,
+        with the eigenvectors returned as plane-wave coefficients """
+
+        if num_states == 'all':
+            eigenvalues, eigenvectors = np.linalg.eigh(self.real_representation(params))
+        elif self.use_dense_solver(params, num_states):
+            eigenvalues, eigenvectors = sp.linalg.eigh(self.real_representation(params),
+                                                       subset_by_index=[0, num_states - 1])
+        else:
+            kinetic = self.real_kinetic(params)
+            tol = self._eigensolver_tol(params, tol)
+            if guess is not None:
+                guess = real_basis(guess.T).real.T
+            eigenvalues, eigenvectors, residual_norms = lowest_eigenpairs(
+                self.real_operator(params), num_states, guess=warm_start(guess, kinetic, num_states).real.astype(float),
+                preconditioner=kinetic_preconditioner(kinetic, dtype=float), tol=tol)
+            if not self._converged(residual_norms, tol):
+                eigenvalues, eigenvectors = sp.linalg.eigh(self.real_representation(params),
+                                                           subset_by_index=[0, num_states - 1])
+        return eigenvalues, complex_basis(eigenvectors.T).T
+
+    def _converged(self, residual_norms, tol):
+        """ Whether the iterative eigensolver reached the tolerance (up to residual_slack), warning that the
+        dense eigensolver is used in its place if not """
+        if np.max(residual_norms) <= self.residual_slack * tol:
+            return True
+        warnings.warn('LOBPCG did not converge (residual norm {:.2e} > {:.2e}) -- falling back to the dense '
+                      'eigensolver.'.format(np.max(residual_norms), tol))
+        return False
+
+    def _eigensolver_tol(self, params, tol):
+        """ Residual tolerance of the iterative eigensolver, no smaller than single precision allows """
+        tol = tol or params.eigensolver_tol
+        if self._precision == 'single':
+            return max(tol, self.single_precision_tol)
+        return tol
+
+    def _working_potential(self, params):
+        """ The local potential on the double grid in the working precision """
+        return self.local_potential(params).astype(self._real_type, copy=False)
+
+    def _use_real_arithmetic(self, params):
+        """ Whether the Hamiltonian is diagonalised in the real basis (Gamma point only calculations) """
+        return params.gamma_only and self._k_point == 0
+
+    def use_dense_solver(self, params, num_states):
+        """ Whether the dense eigensolver is used for a partial eigendecomposition """
+        if params.eigensolver == 'auto':
+            # LOBPCG needs the basis to be much larger than the block it iterates
+            return params.num_planewaves < max(self.dense_threshold, 5*num_states)
+        return params.eigensolver == 'dense'
 
     def kinetic(self, params):
         r""" Kinetic operator in Fourier space: :math:`\hat{T} = \frac{1}{2} |G+k|^2`
@@ -90,37 +426,133 @@ class Hamiltonian:
             * params (Parameters): input model for the system
          """
 
-        N = params.num_planewaves
-        return (0.5/N**2)*abs(params.planewave_grid + self._k_point)**2
+        return 0.5*abs(params.planewave_grid + self._k_point)**2
+
+    def real_kinetic(self, params):
+        r""" Kinetic operator at the Gamma point in the real basis (see basis.real_basis): :math:`\frac{1}{2} G^2`
+
+        Parameters:
+            * params (Parameters): input model for the system
+        """
+
+        G = params.planewave_grid[:(params.num_planewaves + 1) // 2]
+        return 0.5*np.concatenate((G, G[1:]))**2
+
+    def local_potential(self, params):
+        r""" The total local potential :math:`v_{ext} + v_h + v_{xc}` in real space on the double grid
+
+        Parameters:
+            * params (Parameters): input model for the system
+        """
+
+        if self._local_potential is None:
+            self._local_potential = self.v_ext(params) + self.v_h(params) + self.v_xc(params)
+        return self._local_potential
 
     def v_xc(self, params):
-        """ Exchange-correlation potential
+        """ Exchange-correlation potential in real space on the double grid
+
+        Parameters:
+            * params (Parameters): input model for the system
+        """
+
+        return np.zeros(2*params.num_planewaves)
+
+    def xc_energy(self, params, density):
+        """ Exchange-correlation energy of a density, consistent with v_xc
 
         Parameters:
             * params (Parameters): input model for the system
+            * density (Density): density of which the energy is computed
         """
 
-        return np.zeros((params.num_planewaves, params.num_planewaves))
+        return 0.0
 
+    @instrumentation.timed('hamiltonian.v_h')
     def v_h(self, params):
-        r""" The Hartree potential in 1D
+        r""" The Hartree potential in 1D, :math:`v_h(x) = \int \frac{\rho(x')}{|x-x'| + c} dx'`,
+        in real space on the double grid. The convolution is computed in G-space.
 
         Parameters:
             * params (Parameters): input model for the system
         """
 
-        return self._density * np.fft.fft(1 / (abs(params.realspace_grid) + params.soft))
+        dx = params.cell / params.num_planewaves
+        return fft.ifft(self._density.coefficients * params.hartree_kernel).real / dx
 
     def v_ext(self, params):
-        r""" The non-local external potential operator:
-        :math:`v_{ext}(G-G')` from :math:`\mathcal{F}(v_{ext}(x))`
+        r""" The local external potential :math:`v_{ext}(x)` in real space on the double grid,
+        whose Fourier coefficients :math:`v_{ext}(G-G')` enter the Hamiltonian matrix
 
         Parameters:
             * params (Parameters): input model for the system
         """
 
-        return sp.linalg.toeplitz(params.v_ext)
+        return fft.ifft(params.big_v_ext).real
+
+    @instrumentation.timed('hamiltonian.total_energy')
+    def total_energy(self, params, wavefunctions, weights=None, **kwargs):
+        r""" Total energy of a set of (occupied) bands and their density :math:`\rho`, decomposed into
+
+        .. math::
+
+            E = \sum_{k} w_k \sum_i f_{ik} \sum_G \frac{1}{2} |G+k|^2 |\phi_{ik}(G)|^2
+                + \int v_{ext} \rho dx + \frac{1}{2} \int v_h \rho dx + E_{xc} + E_x + E_{ii} - \sigma S.
+
+        Each term is a sum over the coefficients, without a transform or an N x N matrix. With Parseval's
+        theorem on the double grid, the integrals over the density are sums over its coefficients,
+        :math:`\int v_{ext} \rho dx = \frac{1}{M} \sum_G \text{Re}(\rho(G) v_{ext}(G)^*)` and
+        :math:`\int v_h \rho dx = \frac{1}{M dx} \sum_G |\rho(G)|^2 K(G)` with the Hartree kernel K. The exchange
+        energy of Hartree-Fock is that of the compressed exchange operators,
+        :math:`E_x = -\frac{1}{2} \sum_{k} w_k \sum_i f_{ik} ||\xi_k^\dagger \phi_{ik}||^2`.
+
+        Parameters:
+            * params (Parameters): input model for the system
+            * wavefunctions (WavefunctionSet): bands and occupancies at each k-point
+            * weights (ndarray): weight of each k-point, default uniform weights summing to one
+
+        Keyword arguments:
+            * density (Density): density of the bands, constructed from them if not given
+            * exchange (list): (compressed) exchange operator at each k-point of the bands, default
+              this Hamiltonian's exchange operator for bands at a single k-point, or no exchange
+            * smearing_energy (float): entropy correction :math:`-\sigma S` of the occupancies, default 0
+
+        Output:
+            * energies (dict): each term ('kinetic', 'external', 'hartree', 'xc', 'exchange', 'ion_ion',
+              'smearing') and their sum ('total')
+        """
 
-    def total_energy(self, wavefunctions=None):
-        r""" Total energy of a Hamiltonian: :math:`E = \langle \Psi | H | \Psi \rangle`"""
-        pass
+        num_k_points = wavefunctions.shape[0]
+        if weights is None:
+            weights = np.ones(num_k_points) / num_k_points
+        band_weights = np.asarray(weights)[:, None, None] * wavefunctions.occupancies
+
+        density = kwargs.get('density', None)
+        if density is None:
+            density = Density.from_wavefunctions(params, wavefunctions, weights)
+        exchange = kwargs.get('exchange', None)
+        if exchange is None and self._exchange is not None and num_k_points == 1:
+            exchange = [self._exchange]
+
+        M = 2*params.num_planewaves
+        dx = params.cell / params.num_planewaves
+        kinetic = 0.5*(params.planewave_grid[None, :] + wavefunctions.k_points[:, None])**2
+        coefficients = density.coefficients
+
+        energies = {'kinetic': np.einsum('ksb,ksbn,kn->', band_weights, abs(wavefunctions.coefficients)**2, kinetic),
+                    'external': np.sum(coefficients * params.big_v_ext.conj()).real / M,
+                    'hartree': 0.5*np.sum(abs(coefficients)**2 * params.hartree_kernel.real) / (M*dx),
+                    'xc': self.xc_energy(params, density),
+                    'exchange': 0.0,
+                    'ion_ion': params.ion_ion_energy,
+                    'smearing': kwargs.get('smearing_energy', 0.0)}
+
+        if exchange is not None:
+            for k, operator in enumerate(exchange):
+                orbitals = wavefunctions.coefficients[k].reshape(-1, params.num_planewaves)
+                projections = operator.projectors.conj().T @ orbitals.T
+                energies['exchange'] -= 0.5*np.sum(band_weights[k].ravel() * np.sum(abs(projections)**2, axis=0))
+
+        energies = {term: float(energy) for term, energy in energies.items()}
+        energies['total'] = sum(energies.values())
+        return energies
@@ -0,0 +1,134 @@
+# Distributed under the terms of the MIT License.
+
+"""
+Lightweight instrumentation of the hot parts of a calculation. When enabled, each instrumented
+call records its wall time and call count, FFTs are counted, and optionally the peak traced memory is tracked.
+The statistics are reported once per SCF iteration as a JSON line. When disabled (the default),
+an instrumented call costs a single flag check.
+"""
+
+import json
+import time
+import tracemalloc
+import functools
+from contextlib import contextmanager
+
+
+class _State:
+    enabled = False
+    memory = False
+    stream = None
+    timers = {}
+    counters = {}
+
+
+def enable(stream=None, memory=False):
+    """ Switch on instrumentation
+
+    Parameters:
+        * stream (file): where each report is written as a JSON line, default none (use stats/report)
+        * memory (bool): track the peak memory of allocations (with tracemalloc), which slows the calculation
+          several times
+    """
+
+    _State.enabled = True
+    _State.stream = stream
+    _State.memory = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    reset()
+
+
+def disable():
+    """ Switch off instrumentation """
+    if _State.memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _State.enabled = False
+    _State.memory = False
+    _State.stream = None
+
+
+def is_enabled():
+    return _State.enabled
+
+
+def reset():
+    """ Clear the statistics collected since the last report """
+    _State.timers = {}
+    _State.counters = {}
+    if _State.memory and tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+
+
+def _record(name, elapsed):
+    timer = _State.timers.setdefault(name, [0, 0.0])
+    timer[0] += 1
+    timer[1] += elapsed
+
+
+def timed(name):
+    """ Decorator that records the wall time and call count of a function under a name """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _State.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                _record(name, time.perf_counter() - start)
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def region(name):
+    """ Context manager that records the wall time of a block of code under a name """
+    if not _State.enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(name, time.perf_counter() - start)
+
+
+def count(name, n=1):
+    """ Increment a counter, e.g. the number of FFTs performed """
+    if _State.enabled:
+        _State.counters[name] = _State.counters.get(name, 0) + int(n)
+
+
+def stats():
+    """ The statistics collected since the last report """
+
+    snapshot = {'timers': {name: {'calls': calls, 'time': total}
+                           for name, (calls, total) in _State.timers.items()},
+                'counters': dict(_State.counters)}
+    if _State.memory and tracemalloc.is_tracing():
+        snapshot['peak_memory'] = tracemalloc.get_traced_memory()[1]
+    return snapshot
+
+
+def report(**fields):
+    """ Report the statistics collected since the last report, with any additional fields
+    (e.g. the SCF iteration), as a JSON line to the stream. The statistics are then reset.
+
+    Output:
+        * report (dict): the reported statistics, or None if instrumentation is disabled
+    """
+
+    if not _State.enabled:
+        return None
+
+    record = dict(fields)
+    record.update(stats())
+    if _State.stream is not None:
+        _State.stream.write(json.dumps(record, default=float) + '\n')
+        _State.stream.flush()
+    reset()
+    return record
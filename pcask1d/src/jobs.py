@@ -0,0 +1,246 @@
+# Distributed under the terms of the MIT License.
+
+"""
+Module that runs the calculations described by an input file (TOML or JSON). An input file holds the inputs of
+Parameters shared by its jobs, and a list of jobs, each a task ('scf', 'bands' or 'relax') with the inputs of
+Parameters that it overrides and the options of the task, e.g.
+
+.. code-block:: toml
+
+    [params]
+    method = 'h'
+    species = ['Li', 'H']
+    positions = [0, 10]
+
+    [[jobs]]
+    task = 'scf'
+
+    [[jobs]]
+    name = 'lih-bands'
+    task = 'bands'
+    num_bands = 6
+    output = 'bands.npy'
+    plot = 'bands.png'
+
+    [[jobs]]
+    task = 'relax'
+    params = {positions = [0, 3]}
+    force_tol = 1e-3
+
+An input file without a list of jobs is a single job, with the task and its options at the top level.
+Each job returns a JSON serialisable record of its results.
+"""
+
+import os
+import sys
+import json
+import time
+import numpy as np
+from .params import Parameters
+from .scf import SCF
+from .bands import BandStructure, k_path
+from .relax import Relaxation
+
+try:
+    import tomllib
+except ImportError:
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+TASKS = ('scf', 'bands', 'relax')
+
+
+def load(path):
+    """ Read an input file, TOML (.toml) or JSON (any other extension)
+
+    Parameters:
+        * path (str): input file
+
+    Output:
+        * config (dict): the contents of the input file
+    """
+
+    if os.path.splitext(path)[1] == '.toml':
+        if tomllib is None:
+            raise RuntimeError('Reading TOML input files requires Python 3.11 (tomllib) or tomli to be installed.')
+        with open(path, 'rb') as f:
+            return tomllib.load(f)
+    with open(path) as f:
+        return json.load(f)
+
+
+def jobs(config):
+    """ The jobs of an input file, each a dict of its name, task, (merged) Parameters inputs and options
+
+    Parameters:
+        * config (dict): the contents of an input file (see load)
+    """
+
+    config = dict(config)
+    shared = config.pop('params', {})
+    entries = config.pop('jobs', None)
+    if entries is None:
+        entries = [config]
+
+    expanded = []
+    for i, job in enumerate(entries):
+        job = dict(job)
+        task = job.pop('task', 'scf')
+        if task not in TASKS:
+            raise RuntimeError('Chosen task {} is not implemented'.format(task))
+        expanded.append({'name': job.pop('name', '{0}-{1}'.format(task, i)),
+                         'task': task,
+                         'params': dict(shared, **job.pop('params', {})),
+                         'options': job})
+    return expanded
+
+
+def job_list(path):
+    """ Input files listed in a job list file, one per line (blank lines and lines starting with # are skipped)
+
+    Parameters:
+        * path (str): job list file, or '-' for the standard input
+    """
+
+    if path == '-':
+        lines = sys.stdin.readlines()
+    else:
+        with open(path) as f:
+            lines = f.readlines()
+    return [line.strip() for line in lines if line.strip() and not line.lstrip().startswith('#')]
+
+
+def run(paths, stream, keep_going=False):
+    """ Run the jobs of each input file in turn (in this interpreter), writing the record of each job to a stream
+    as a JSON line as it completes
+
+    Parameters:
+        * paths (list): input files
+        * stream (file): where the records are written
+        * keep_going (bool): record the error of a failed job (or input file) and continue, rather than raise
+
+    Output:
+        * failures (int): number of failed jobs and input files
+    """
+
+    failures = 0
+    for path in paths:
+        try:
+            input_jobs = jobs(load(path))
+        except Exception as error:
+            if not keep_going:
+                raise
+            failures += 1
+            _write(stream, {'input': path, 'error': '{0}: {1}'.format(type(error).__name__, error)})
+            continue
+
+        for job in input_jobs:
+            record = {'input': path}
+            try:
+                record.update(run_job(job))
+            except Exception as error:
+                if not keep_going:
+                    raise
+                failures += 1
+                record.update(name=job['name'], task=job['task'], error='{0}: {1}'.format(type(error).__name__, error))
+            _write(stream, record)
+    return failures
+
+
+def _write(stream, record):
+    stream.write(json.dumps(record, default=float) + '\n')
+    stream.flush()
+
+
+def run_job(job):
+    """ Run a single job (see jobs), returning the record of its results
+
+    Parameters:
+        * job (dict): name, task, Parameters inputs and options of the job
+    """
+
+    params = Parameters(**job['params'])
+    start = time.perf_counter()
+    results = {'scf': _scf, 'bands': _bands, 'relax': _relax}[job['task']](params, job['options'])
+    record = {'name': job['name'], 'task': job['task']}
+    record.update(results)
+    record['time'] = time.perf_counter() - start
+    return record
+
+
+def _scf(params, options):
+    """ Converge the SCF, optionally checkpointing it to options['output'] """
+
+    scf = SCF(params, checkpoint=options.get('output', None))
+    scf.run()
+    return _scf_record(scf)
+
+
+def _scf_record(scf):
+    return {'iterations': scf.iteration,
+            'converged': bool(scf.converged),
+            'residual_norm': float(scf.residual_norm),
+            'energy': scf.energy,
+            'energy_terms': scf.energy_terms,
+            'fermi_level': float(scf.fermi_level)}
+
+
+def _bands(params, options):
+    """ Converge the SCF, then compute the band structure along a k-path, written to options['output'] (.npy)
+    and plotted to options['plot'] if given """
+
+    scf = SCF(params)
+    density = scf.run()
+    k_points = k_path(params, options.get('path', [-0.5, 0, 0.5]), options.get('num_kpoints', 201))
+    bands = BandStructure(params, density, k_points, num_bands=options.get('num_bands', None),
+                          path=options.get('output', None))
+    energies = bands.run()
+
+    if options.get('plot'):
+        plot_bands(params, k_points, energies, options['plot'], fermi_level=scf.fermi_level)
+
+    return {'scf': _scf_record(scf),
+            'num_kpoints': len(k_points),
+            'num_bands': bands.num_bands,
+            'band_minima': np.min(energies, axis=0).tolist(),
+            'band_maxima': np.max(energies, axis=0).tolist()}
+
+
+def _relax(params, options):
+    """ Relax the ionic positions """
+
+    relaxation = Relaxation(params, method=options.get('method', 'bfgs'), force_tol=options.get('force_tol', 1e-3),
+                            max_steps=options.get('max_steps', 100), max_step=options.get('max_step', 0.2))
+    relaxation.run()
+    return {'steps': relaxation.step,
+            'converged': bool(relaxation.converged),
+            'positions': np.asarray(relaxation.positions).tolist(),
+            'forces': np.asarray(relaxation.ionic_forces).tolist(),
+            'scf_iterations': relaxation.scf_iterations}
+
+
+def plot_bands(params, k_points, energies, path, fermi_level=None):
+    """ Plot a band structure to an image file. matplotlib is imported here, only when a plot is requested.
+
+    Parameters:
+        * params (Parameters): input model for the system
+        * k_points (ndarray): k-points of the path
+        * energies (ndarray): (n_k, num_bands) band energies
+        * path (str): image file, e.g. bands.png
+        * fermi_level (float): drawn as a horizontal line, default none
+    """
+
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    figure, axes = plt.subplots()
+    axes.plot(k_points * params.cell / np.pi, energies, color='k')
+    if fermi_level is not None:
+        axes.axhline(fermi_level, linestyle='--', color='r')
+    axes.set_xlabel(r'$k$ ($\pi / a$)')
+    axes.set_ylabel('Energy (Hartree)')
+    figure.savefig(path)
+    plt.close(figure)
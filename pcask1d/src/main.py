@@ -1,21 +1,25 @@
 # Distributed under the terms of the MIT License.
 
-import argparse
-import numpy as np
-import matplotlib.pyplot as plt
-from .params import Parameters
-from .hamiltonian import Hamiltonian
-from .wavefunction import Wavefunction
-from .density import Density
-
 """
-Entry point for the requested action
+Entry point for the requested action. Only the standard library is imported on start-up: the modules of a
+calculation (and numpy) are imported by the task that needs them, and matplotlib only when a plot is requested,
+such that `pcask1d --version`, `pcask1d noop` and short jobs start fast (see benchmarks.startup).
 """
 
+import sys
+import json
+import argparse
+import contextlib
+
+__version__ = 0.1
+
+TASKS = ('scf', 'bands', 'sweep', 'run', 'batch', 'noop')
 
-def main():
+# Inputs of Parameters of the scf, bands and sweep tasks, which --set overrides
+DEFAULT_INPUTS = {'method': 'h', 'species': ['Li', 'H'], 'positions': [0, 10]}
 
-    __version__ = 0.1
+
+def main(argv=None):
 
     # Parser class for density2potential
     parser = argparse.ArgumentParser(
@@ -26,9 +30,60 @@ def main():
 
     # Specify arguments that the package can take
     parser.add_argument('--version', action='version', version='This is version {0} of cask1d.'.format(__version__))
-    parser.add_argument('task', help='what do you want pcask1d to do: dft')
-
-    args = parser.parse_args()
+    parser.add_argument('task', choices=TASKS, metavar='task',
+                        help='what do you want pcask1d to do: scf, bands, sweep, run (the jobs of input '
+                             'files), batch (the input files listed in job lists), or noop')
+    parser.add_argument('inputs', nargs='*', metavar='FILE',
+                        help='run task: input files (TOML or JSON), batch task: job lists of input files, '
+                             'one per line (- for the standard input)')
+    parser.add_argument('--set', nargs=2, action='append', default=[], metavar=('NAME', 'VALUE'),
+                        help='set an input of Parameters, VALUE is parsed as JSON (e.g. --set cell 15)')
+    parser.add_argument('--vary', nargs='+', action='append', default=[], metavar='NAME VALUES',
+                        help='sweep task: an input of Parameters followed by the values it takes, '
+                             'each parsed as JSON (e.g. --vary positions "[0, 1.4]" "[0, 1.5]")')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--output', metavar='FILE', help='sweep, run and batch tasks: write results to FILE as JSON '
+                                                         'lines, bands task: write band energies to FILE (.npy)')
+    parser.add_argument('--path', nargs='+', type=float, default=[-0.5, 0, 0.5], metavar='K',
+                        help='bands task: vertices of the k-path in units of pi/cell (default -0.5 0 0.5)')
+    parser.add_argument('--num-kpoints', type=int, default=201, help='bands task: number of k-points along the path')
+    parser.add_argument('--num-bands', type=int, default=None, help='bands task: number of bands at each k-point')
+    parser.add_argument('--instrument', metavar='FILE',
+                        help='write per-iteration timings, call counts and FFT counts to FILE as JSON lines')
+    parser.add_argument('--instrument-memory', action='store_true',
+                        help='with --instrument, also track the peak memory (slows the calculation several times)')
+
+    args = parser.parse_args(argv)
+
+    # Start-up alone, e.g. to measure its cost
+    if args.task == 'noop':
+        return 0
+
+    # The files opened by the task are closed on return
+    with contextlib.ExitStack() as files:
+        return _run(args, files)
+
+
+def _run(args, files):
+    """ Perform the requested task, returning the exit status """
+
+    if args.instrument:
+        from . import instrumentation
+        stream = files.enter_context(open(args.instrument, 'w'))
+        instrumentation.enable(stream=stream, memory=args.instrument_memory)
+        files.callback(instrumentation.disable)
+
+    # Run the jobs of input files in this interpreter, writing a JSON line per job. A batch records the
+    # error of a failed job and continues with the next, and exits with a non-zero status if any failed
+    if args.task in ('run', 'batch'):
+        from . import jobs
+
+        paths = args.inputs
+        if args.task == 'batch':
+            paths = [path for job_list in args.inputs for path in jobs.job_list(job_list)]
+        output = files.enter_context(open(args.output, 'w')) if args.output else sys.stdout
+        failures = jobs.run(paths, output, keep_going=args.task == 'batch')
+        return 1 if failures else 0
 
     # Code header
     print('    ------------------------')
@@ -38,58 +93,63 @@ def main():
     print('           Nick Woods')
     print(' ')
 
-    # Find the Kohn-Sham potential that generates a given reference density
-    if args.task == 'test':
-
-        def v_ext(x):
-            return 0.5*(0.25**2)*x**2#np.exp(-(1.5*x)**2)
-            #return abs(x)#np.exp(-(1.5*x)**2)#0.5*(0.25**2)*x**2#np.exp(-(1.5*x)**2)
-
-        # Construct parameters object
-        params = Parameters(method='h',
-                            species=['Li', 'H'],
-                            positions=[0, 10],
-                            )
+    # Run a grid of Parameters variants, streaming results as they complete
+    if args.task == 'sweep':
+        import numpy as np
+        from .params import Parameters
+        from .sweep import Sweep
 
+        # The base is the first point of the grid, such that the varied inputs need not be valid at the defaults
+        axes = {vary[0]: [json.loads(value) for value in vary[1:]] for vary in args.vary}
+        base = Parameters(**_inputs(args, **{name: values[0] for name, values in axes.items()}))
 
-        density = Density(params)
-        hamiltonian = Hamiltonian(density)
+        sweep = Sweep(base, num_workers=args.workers, **axes)
+        output = files.enter_context(open(args.output, 'w')) if args.output else sys.stdout
+        for index, point, result in sweep.run():
+            record = dict(point, index=index, iterations=result['iterations'], energy=result['energy'],
+                          residual_norm=result['residual_norm'], seeded_from=result['seeded_from'],
+                          eigenvalues=np.asarray(result['eigenvalues']).tolist())
+            output.write(json.dumps(record) + '\n')
+            output.flush()
 
-        """
-        wavefunctions = [Wavefunction(params) for i in range(params.num_electrons)]
+    # Band structure of the converged test system along a k-path
+    if args.task == 'bands':
+        from .params import Parameters
+        from .scf import SCF
+        from .bands import BandStructure, k_path
 
-        eigenenergies, eigenfunctions = hamiltonian.eigendecomposition(params)
+        params = Parameters(**_inputs(args))
 
-        for i, wavefunction in enumerate(wavefunctions):
-            wavefunction.pw_coefficients = eigenfunctions[:,i]
-            wavefunction.energy = eigenenergies[i]
-            wavefunction.band_index = i
-            wavefunction.k_point = 0
-        """
+        density = SCF(params).run()
+        k_points = k_path(params, args.path, args.num_kpoints)
+        bands = BandStructure(params, density, k_points, num_bands=args.num_bands, path=args.output)
+        for k_point, energies in bands:
+            print('k = {0:+.6f}: '.format(k_point) + ' '.join('{0:.6f}'.format(e) for e in energies))
 
-        #for wvfn in wavefunctions:
-        #    wvfn.pw_coefficients = eigenfunction[:,i]
+    # Iterate the test system to self-consistency
+    if args.task == 'scf':
+        from .params import Parameters
+        from .scf import SCF
 
-        #energies, wavefunctions = H.eigendecomposition(params)#, num_states=1)
+        params = Parameters(**_inputs(args))
 
-        #plt.plot(wavefunctions[:,0])
-        #plt.show()
+        scf = SCF(params)
+        scf.run()
+        print('SCF finished after {0} iterations with residual norm {1:.3e} and total energy {2:.10f}'
+              .format(scf.iteration, scf.residual_norm, scf.energy))
 
-      # Construct density object with a given initial guess (part of the constructor)
-        #density = particle_density(params)
-        # wvfn container: Finds output density given an input density
-        # wavefunction = []
-        #for k in kpoints:
+    return 0
 
-            # Create the Hamiltonian at the given k-point
-            #H = hamiltonian(params, kpoint=k, density=density)
 
-            # Returns a container of type wavefunction. Each with occupation, band index, etc.
-            #wavefunctions = H.get_eigenfunctions(density)
+def _inputs(args, **inputs):
+    """ Inputs of Parameters of the scf, bands and sweep tasks: the defaults, overridden by --set, and then
+    by the given inputs """
 
-            # Get density at k-point
-            #for wavefunction in wavefunctions:
-                #density += wavefunction.get_density()
+    merged = dict(DEFAULT_INPUTS)
+    merged.update({name: json.loads(value) for name, value in args.set})
+    merged.update(inputs)
+    return merged
 
-            #del H
 
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,161 @@
+# Distributed under the terms of the MIT License.
+
+r"""
+Module that assigns (smeared) occupancies to the bands of all k-points. The chemical potential
+(Fermi level) :math:`\mu` is found by bisection on the electron count,
+
+.. math::
+
+    \sum_{k} w_k \sum_{i} f\left(\frac{\mu - \varepsilon_{ik}}{\sigma}\right) = N_e,
+
+with each step evaluated over the full (k-point, spin, band) array of eigenvalues at once. The smearing
+of the occupancies stabilises the SCF iterations of (nearly) metallic systems. Each smearing scheme
+comes with a generalised entropy S, such that :math:`E - \sigma S` is variational in the occupancies.
+"""
+
+import numpy as np
+from scipy.special import erf
+
+# Boltzmann constant in Hartree / Kelvin
+BOLTZMANN = 3.166811563e-6
+
+SMEARING_SCHEMES = ('none', 'fermi-dirac', 'gaussian', 'methfessel-paxton', 'marzari-vanderbilt')
+
+
+def occupation(x, scheme='fermi-dirac'):
+    r""" Occupation :math:`f(x)` of a state as a function of :math:`x = (\mu - \varepsilon) / \sigma`
+
+    Parameters:
+        * x (ndarray): scaled distance of the states below the chemical potential
+        * scheme (str): smearing scheme, one of SMEARING_SCHEMES
+    """
+
+    x = np.asarray(x, dtype=float)
+    if scheme == 'none':
+        return np.heaviside(x, 0.5)
+    if scheme == 'fermi-dirac':
+        return 0.5*(1 + np.tanh(0.5*x))
+    if scheme == 'gaussian':
+        return 0.5*(1 + erf(x))
+    if scheme == 'methfessel-paxton':
+        # First order Hermite correction to the Gaussian
+        return 0.5*(1 + erf(x)) + x*np.exp(-x**2) / (2*np.sqrt(np.pi))
+    if scheme == 'marzari-vanderbilt':
+        y = x - 1/np.sqrt(2)
+        return 0.5*(1 + erf(y)) + np.exp(-y**2) / np.sqrt(2*np.pi)
+    raise RuntimeError('Chosen smearing scheme {} is not implemented'.format(scheme))
+
+
+def entropy(x, scheme='fermi-dirac'):
+    r""" Generalised entropy :math:`s(x) = -\int_{-\infty}^{x} t \tilde{\delta}(t) dt` of a state, where
+    :math:`\tilde{\delta} = f'` is the smeared delta function of the scheme
+
+    Parameters:
+        * x (ndarray): scaled distance of the states below the chemical potential
+        * scheme (str): smearing scheme, one of SMEARING_SCHEMES
+    """
+
+    x = np.asarray(x, dtype=float)
+    if scheme == 'none':
+        return np.zeros_like(x)
+    if scheme == 'fermi-dirac':
+        f = np.clip(occupation(x, scheme), 1e-300, 1)
+        g = np.clip(occupation(-x, scheme), 1e-300, 1)
+        return -(f*np.log(f) + g*np.log(g))
+    if scheme == 'gaussian':
+        return np.exp(-x**2) / (2*np.sqrt(np.pi))
+    if scheme == 'methfessel-paxton':
+        return (1 - 2*x**2)*np.exp(-x**2) / (4*np.sqrt(np.pi))
+    if scheme == 'marzari-vanderbilt':
+        y = x - 1/np.sqrt(2)
+        return -y*np.exp(-y**2) / np.sqrt(2*np.pi)
+    raise RuntimeError('Chosen smearing scheme {} is not implemented'.format(scheme))
+
+
+def fermi_level(energies, weights, num_electrons, width, scheme='fermi-dirac', tol=1e-13):
+    r""" The chemical potential at which the smeared occupancies hold num_electrons electrons, by bisection
+
+    Parameters:
+        * energies (ndarray): (n_k, ...) band energies
+        * weights (ndarray): weight of each k-point, summing to one
+        * num_electrons (float): number of electrons
+        * width (float): smearing width :math:`\sigma`
+        * scheme (str): smearing scheme, one of SMEARING_SCHEMES
+        * tol (float): tolerance on the chemical potential
+
+    Output:
+        * fermi_level (float): the chemical potential :math:`\mu`
+    """
+
+    energies = np.asarray(energies, dtype=float)
+    band_weights = np.broadcast_to(np.reshape(weights, (-1,) + (1,)*(energies.ndim - 1)), energies.shape)
+    assert np.sum(band_weights) >= num_electrons - 1e-10, 'Too few bands to hold the electrons.'
+
+    def count(mu):
+        return np.sum(band_weights * occupation((mu - energies) / width, scheme))
+
+    # The count is (nearly) monotonic between these bounds, beyond which every state is empty / full
+    lower = np.min(energies) - 10*width
+    upper = np.max(energies) + 10*width
+    while upper - lower > tol:
+        middle = 0.5*(lower + upper)
+        if count(middle) < num_electrons:
+            lower = middle
+        else:
+            upper = middle
+    return 0.5*(lower + upper)
+
+
+def aufbau(energies, weights, num_electrons):
+    r""" Occupancies at zero smearing: states are filled in order of energy, with a partial occupancy
+    of the highest occupied state if required by the k-point weights
+
+    Parameters:
+        * energies (ndarray): (n_k, ...) band energies
+        * weights (ndarray): weight of each k-point, summing to one
+        * num_electrons (float): number of electrons
+
+    Output:
+        * occupancies (ndarray): occupancies of the same shape as energies
+        * fermi_level (float): energy of the highest occupied state
+    """
+
+    energies = np.asarray(energies, dtype=float)
+    band_weights = np.broadcast_to(np.reshape(weights, (-1,) + (1,)*(energies.ndim - 1)), energies.shape).ravel()
+    order = np.argsort(energies, axis=None, kind='stable')
+    filled = np.cumsum(band_weights[order]) - band_weights[order]
+
+    occupancies = np.zeros(energies.size)
+    occupancies[order] = np.clip((num_electrons - filled) / band_weights[order], 0, 1)
+    highest = order[np.flatnonzero(occupancies[order] > 0)[-1]]
+    return occupancies.reshape(energies.shape), energies.ravel()[highest]
+
+
+def occupy(params, energies, weights=None):
+    r""" Occupancies of the bands of all k-points, for the smearing scheme and temperature of params
+
+    Parameters:
+        * params (Parameters): input model for the system
+        * energies (ndarray): (n_k, ...) band energies
+        * weights (ndarray): weight of each k-point, default uniform weights summing to one
+
+    Output:
+        * occupancies (ndarray): occupancies of the same shape as energies
+        * fermi_level (float): the chemical potential :math:`\mu`
+        * smearing_energy (float): the entropy correction :math:`-\sigma \sum_{k} w_k \sum_i s_{ik}`
+    """
+
+    energies = np.asarray(energies, dtype=float)
+    if weights is None:
+        weights = np.ones(energies.shape[0]) / energies.shape[0]
+
+    width = params.smearing_width
+    if params.scf_smearing == 'none' or width == 0:
+        occupancies, mu = aufbau(energies, weights, params.num_electrons)
+        return occupancies, mu, 0.0
+
+    mu = fermi_level(energies, weights, params.num_electrons, width, params.scf_smearing)
+    x = (mu - energies) / width
+    band_weights = np.reshape(weights, (-1,) + (1,)*(energies.ndim - 1))
+    smearing_energy = -width*np.sum(band_weights * entropy(x, params.scf_smearing))
+    return occupation(x, params.scf_smearing), mu, smearing_energy
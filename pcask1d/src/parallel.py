@@ -0,0 +1,171 @@
+# Distributed under the terms of the MIT License.
+
+"""
+Module that distributes the k-points of a calculation over a pool of worker processes.
+The local potential and density of the current SCF iteration are published once into
+shared memory, from which each worker constructs the Hamiltonian at its k-points, such that
+only k-points and the (small) blocks of eigenvectors are communicated between processes.
+The occupancies depend on the eigenvalues of every k-point, so the density is reduced in the main process.
+"""
+
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from .density import Density
+from .hamiltonian import Hamiltonian
+from .wavefunction import WavefunctionSet
+from .occupancy import occupy
+from . import fft
+
+# State of a worker process: params and views of the shared arrays
+_worker = {}
+
+
+def _attach(name, shape, dtype):
+    """ Attach to an existing shared memory block, returning the block and an ndarray view of it """
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+
+def _initialise_worker(params, potential_name, density_name, fft_backend, threads):
+    """ Attach a worker process to the shared potential and density, and limit its FFT and BLAS threads """
+
+    fft.configure(fft_backend, threads)
+    M = 2*params.num_planewaves
+    _worker['params'] = params
+    _worker['potential_block'], _worker['potential'] = _attach(potential_name, (M,), np.float64)
+    _worker['density_block'], _worker['density'] = _attach(density_name, (M,), np.complex128)
+
+
+def _solve_k_point(k_point, num_states, guess, tol, precision):
+    """ Diagonalise the Hamiltonian at a single k-point and return its eigenvalues and eigenvectors """
+
+    params = _worker['params']
+    density = Density(params, coeffs=_worker['density'])
+    hamiltonian = Hamiltonian(density, k_point=k_point, local_potential=_worker['potential'], precision=precision)
+    wavefunctions = hamiltonian.eigendecomposition(params, num_states, guess=guess, tol=tol)
+
+    return wavefunctions.energies[0, 0], wavefunctions.eigenvectors()
+
+
+class KPointScheduler:
+    """
+    Schedules the diagonalisation of the Hamiltonian at each k-point over a pool of worker processes.
+    Usage is to publish the current density (and potential) once per SCF iteration, and then request
+    the output density. With a fork start method the params need not be picklable, otherwise any
+    manual_v_ext must be a picklable (module level) function.
+    """
+
+    def __init__(self, params, num_workers=None):
+
+        self._params = params
+        self._num_workers = num_workers or os.cpu_count()
+        M = 2*params.num_planewaves
+
+        # Shared blocks for the local potential and density coefficients on the double grid
+        self._potential_block = shared_memory.SharedMemory(create=True, size=M*np.dtype(np.float64).itemsize)
+        self._density_block = shared_memory.SharedMemory(create=True, size=M*np.dtype(np.complex128).itemsize)
+        self._potential = np.ndarray((M,), dtype=np.float64, buffer=self._potential_block.buf)
+        self._density = np.ndarray((M,), dtype=np.complex128, buffer=self._density_block.buf)
+
+        self._executor = ProcessPoolExecutor(max_workers=self._num_workers,
+                                             initializer=_initialise_worker,
+                                             initargs=(params, self._potential_block.name,
+                                                       self._density_block.name, fft.backend(),
+                                                       fft.worker_threads(self._num_workers)))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def num_workers(self):
+        return self._num_workers
+
+    def publish(self, density, potential=None):
+        """ Publish the density, and local potential, of the current SCF iteration to the workers.
+        Must not be called while a call to density_out is in progress.
+
+        Parameters:
+            * density (Density): input density of the SCF iteration
+            * potential (ndarray): local potential on the double grid, constructed from the density if not given
+        """
+
+        if potential is None:
+            potential = Hamiltonian(density).local_potential(self._params)
+        self._potential[:] = potential
+        self._density[:] = density.coefficients
+
+    def wavefunctions(self, k_points=None, num_states=None, subspaces=None, tol=None, precision='double'):
+        """ Diagonalise the Hamiltonian at each k-point in parallel for the published density.
+
+        Parameters:
+            * k_points (ndarray): k-points to sample, default params.k_points
+            * num_states (int): number of bands to compute at each k-point, default params.num_bands
+            * subspaces (SubspaceCache): eigenvectors used to warm start the eigensolver at each
+              k-point, updated with the new eigenvectors
+            * tol (float): residual tolerance of the iterative eigensolver
+            * precision (str): working precision of the Hamiltonians, 'double' or 'single'
+
+        Output:
+            * wavefunctions (WavefunctionSet): the bands at each k-point, without occupancies
+        """
+
+        if k_points is None:
+            k_points = self._params.k_points
+        k_points = np.atleast_1d(k_points)
+        if num_states is None:
+            num_states = self._params.num_bands
+
+        guesses = [subspaces.get(k_point) if subspaces is not None else None for k_point in k_points]
+
+        # Map preserves the order of k-points, such that the reduction is deterministic
+        results = self._executor.map(_solve_k_point, k_points, [num_states]*len(k_points),
+                                     guesses, [tol]*len(k_points), [precision]*len(k_points))
+
+        wavefunctions = WavefunctionSet(self._params, len(k_points), 1, num_states,
+                                        dtype=Hamiltonian.precisions[precision][1])
+        wavefunctions.k_points[:] = k_points
+        for i, (energies, eigenvectors) in enumerate(results):
+            wavefunctions.energies[i, 0] = energies
+            wavefunctions.coefficients[i, 0] = eigenvectors.T
+            if subspaces is not None:
+                subspaces.update(k_points[i], eigenvectors)
+
+        return wavefunctions
+
+    def density_out(self, k_points=None, weights=None, num_states=None, subspaces=None, tol=None):
+        """ Diagonalise the Hamiltonian at each k-point in parallel for the published density, occupy
+        the bands of all k-points, and construct the output density.
+
+        Parameters:
+            * k_points (ndarray): k-points to sample, default params.k_points
+            * weights (ndarray): weight of each k-point, default the (normalised) params.k_point_weights
+              of params.k_points, or uniform weights summing to one for other k-points
+            * num_states (int): number of bands to compute at each k-point, default params.num_bands
+            * subspaces (SubspaceCache): eigenvectors used to warm start the eigensolver at each
+              k-point, updated with the new eigenvectors
+            * tol (float): residual tolerance of the iterative eigensolver
+
+        Output:
+            * density (Density): the output density
+            * wavefunctions (WavefunctionSet): the occupied bands at each k-point
+        """
+
+        if k_points is None and weights is None:
+            weights = self._params.k_point_weights / np.sum(self._params.k_point_weights)
+
+        wavefunctions = self.wavefunctions(k_points, num_states, subspaces, tol)
+        wavefunctions.occupancies = occupy(self._params, wavefunctions.energies, weights)[0]
+        return Density.from_wavefunctions(self._params, wavefunctions, weights), wavefunctions
+
+    def close(self):
+        """ Shut down the worker pool and release the shared memory """
+        self._executor.shutdown()
+        del self._potential, self._density
+        for block in (self._potential_block, self._density_block):
+            block.close()
+            block.unlink()
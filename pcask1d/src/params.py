@@ -5,7 +5,14 @@ This module implements the parameters class, which carries the input model for t
 An object of type Parameters is designed to be immutable and lead to a unique output.
 """
 
+import json
+import hashlib
 import numpy as np
+from scipy.special import sici
+from .basis import frequency_indices, nonuniform_fft
+from . import fft
+from .occupancy import occupation, BOLTZMANN, SMEARING_SCHEMES
+from . import forces
 
 
 class Parameters:
@@ -17,6 +24,9 @@ class Parameters:
 
     def __init__(self, **kwargs):
 
+        # User inputs from which the model is constructed
+        self._inputs = dict(kwargs)
+
         # Level of approximation used
         self._method = kwargs.get('method', 'dft')
 
@@ -24,6 +34,9 @@ class Parameters:
         self._cell = kwargs.get('cell', 20)
         self._num_planewaves = kwargs.get('num_planewaves', 1001)
         self._k_point_spacing = kwargs.get('kpoint_spacing', 0.2)
+        self._k_point_grid = kwargs.get('kpoint_grid', None)
+        self._k_point_symmetry = kwargs.get('kpoint_symmetry', True)
+        self._gamma_only = kwargs.get('gamma_only', None)
 
         # List of species + position
         self._species = kwargs.get('species', ['Li'])
@@ -38,13 +51,31 @@ class Parameters:
         self._scf_history_length = kwargs.get('scf_history_length', 10)
         self._scf_step_length = kwargs.get('scf_step_length', 1)
         self._scf_temperature = kwargs.get('scf_temperature', 300)
+        self._scf_smearing = kwargs.get('scf_smearing', 'fermi-dirac')
+        self._scf_max_iterations = kwargs.get('scf_max_iterations', 100)
+        self._scf_mixing = kwargs.get('scf_mixing', 'pulay')
+        self._scf_kerker = kwargs.get('scf_kerker', None)
+        self._scf_exchange_tol = kwargs.get('scf_exchange_tol', 1e-8)
+        self._scf_precision = kwargs.get('scf_precision', 'double')
+        self._scf_precision_tol = kwargs.get('scf_precision_tol', 1e-2)
+        self._scf_energy_tol = kwargs.get('scf_energy_tol', None)
+
+        # Eigensolver parameters
+        self._eigensolver = kwargs.get('eigensolver', 'auto')
+        self._eigensolver_tol = kwargs.get('eigensolver_tol', 1e-8)
+
+        # Number of bands computed at each k-point, default enough to hold the smeared occupancies
+        self._num_bands = kwargs.get('num_bands', None)
 
         # Pseudopotential
-        self._soft = 0.1
+        self._soft = kwargs.get('soft', 0.1)
 
         # Have v_ext specified by atoms or given explicitly
         self._manual_v_ext = kwargs.get('manual_v_ext', None)
 
+        # Derived quantities (e.g. the external potential), computed once on first use
+        self._cache = {}
+
         # Sanity checks
         assert len(self._species) == len(self._positions), 'Each element requires a unique position.'
         assert abs(max(self._positions)) <= self._cell, 'All elements must lie within the primitive unit cell.'
@@ -53,10 +84,65 @@ class Parameters:
         if self._method not in ['h', 'hf', 'dft']:
             raise RuntimeError('Chosen method of {} is not implemented'.format(self._method))
 
+        if self._scf_mixing not in ['pulay', 'linear']:
+            raise RuntimeError('Chosen SCF mixing scheme {} is not implemented'.format(self._scf_mixing))
+
+        if self._scf_precision not in ['double', 'mixed']:
+            raise RuntimeError('Chosen SCF precision {} is not implemented'.format(self._scf_precision))
+
+        if self._scf_smearing not in SMEARING_SCHEMES:
+            raise RuntimeError('Chosen smearing scheme {} is not implemented'.format(self._scf_smearing))
+
+        if self._eigensolver not in ['auto', 'dense', 'lobpcg']:
+            raise RuntimeError('Chosen eigensolver {} is not implemented'.format(self._eigensolver))
+
+    def __eq__(self, other):
+        return isinstance(other, Parameters) and self.digest == other.digest
+
+    def __hash__(self):
+        return int(self.digest[:16], 16)
+
+    @property
+    def digest(self):
+        """ Stable (SHA-256) hash over every input of the model, including defaults. A manual_v_ext
+         is hashed by its values on the double grid. Equal digests lead to the same output. Computed once. """
+        return self._cached('digest', self._digest)
+
+    def _digest(self):
+
+        def canonical(value):
+            if isinstance(value, (list, tuple, np.ndarray)):
+                return [canonical(v) for v in value]
+            if isinstance(value, dict):
+                return {str(k): canonical(v) for k, v in sorted(value.items())}
+            if isinstance(value, (bool, str)) or value is None:
+                return value
+            return float(value)
+
+        model = {name: canonical(value) for name, value in sorted(vars(self).items())
+                 if name not in ('_inputs', '_manual_v_ext', '_cache')}
+        digest = hashlib.sha256(json.dumps(model, sort_keys=True).encode())
+        if self._manual_v_ext is not None:
+            digest.update(np.ascontiguousarray(self._manual_v_ext(x=self.big_realspace_grid), dtype=float).tobytes())
+        return digest.hexdigest()
+
     def smearing_scheme(self, energy):
         """ Ansatz for smearing the occupancies to prevent
-        occupancy-induced instability in SCF iterations """
-        return 1 / (np.exp(energy / self._scf_temperature) + 1)
+        occupancy-induced instability in SCF iterations. The energy is relative to the Fermi level. """
+        if self.smearing_width == 0:
+            return occupation(-energy, 'none')
+        return occupation(-energy / self.smearing_width, self._scf_smearing)
+
+    @property
+    def inputs(self):
+        """ The keyword arguments from which the Parameters were constructed, such that
+         Parameters(**params.inputs) reproduces params """
+        return dict(self._inputs)
+
+    @property
+    def method(self):
+        """ Level of theory: 'h' (Hartree), 'hf' (Hartree-Fock) or 'dft' """
+        return self._method
 
     @property
     def element_charges(self):
@@ -101,6 +187,75 @@ class Parameters:
         r""" Damping parameter :math:`\alpha \in [0,1)` applied to SCF steps """
         return self._scf_step_length
 
+    @property
+    def scf_max_iterations(self):
+        """ Maximum number of SCF iterations performed """
+        return self._scf_max_iterations
+
+    @property
+    def scf_mixing(self):
+        """ Density mixing scheme used in the SCF iterations: 'pulay' (DIIS) or 'linear' """
+        return self._scf_mixing
+
+    @property
+    def scf_kerker(self):
+        r""" Wavevector :math:`q_0` of the Kerker preconditioner :math:`\frac{G^2}{G^2 + q_0^2}`
+          applied to the density residual, or None for no preconditioning """
+        return self._scf_kerker
+
+    @property
+    def scf_temperature(self):
+        """ Electronic temperature (Kelvin) that sets the width of the smeared occupancies """
+        return self._scf_temperature
+
+    @property
+    def scf_smearing(self):
+        """ Smearing scheme of the occupancies: 'none', 'fermi-dirac', 'gaussian', 'methfessel-paxton'
+          (first order) or 'marzari-vanderbilt' (cold smearing) """
+        return self._scf_smearing
+
+    @property
+    def smearing_width(self):
+        r""" Width :math:`\sigma = k_B T` (Hartree) of the smeared occupancies """
+        return BOLTZMANN * self._scf_temperature
+
+    @property
+    def scf_exchange_tol(self):
+        """ Convergence tolerance for the change in the exchange energy between updates of the
+          (compressed) exchange operator, in the outer loop of a Hartree-Fock SCF """
+        return self._scf_exchange_tol
+
+    @property
+    def scf_precision(self):
+        """ Precision of the Kohn-Sham map: 'double', or 'mixed' for single precision FFTs, Hamiltonians
+          and eigenvectors while the residual norm is above scf_precision_tol, and double precision after """
+        return self._scf_precision
+
+    @property
+    def scf_precision_tol(self):
+        """ Residual norm below which a mixed precision SCF continues in double precision. The eigenpairs
+          are converged to a fraction of the residual norm, which beyond ~1e-2 is below the accuracy
+          of single precision. """
+        return self._scf_precision_tol
+
+    @property
+    def scf_energy_tol(self):
+        """ Convergence tolerance for the change in the total energy between SCF iterations, a criterion
+          in addition to scf_tol, or None (default) to converge on the residual norm alone """
+        return self._scf_energy_tol
+
+    @property
+    def eigensolver(self):
+        """ Method used to diagonalise the Hamiltonian: 'dense' (full eigh), 'lobpcg' (matrix-free
+         block iterative solver for the occupied bands only) or 'auto' (lobpcg for large bases) """
+        return self._eigensolver
+
+    @property
+    def eigensolver_tol(self):
+        r""" Convergence tolerance on the eigenpair residual :math:`||H\psi - \varepsilon \psi||`
+         used by the iterative eigensolver """
+        return self._eigensolver_tol
+
     @property
     def num_electrons(self):
         """ Number of electrons such that charge neutrality is enforced """
@@ -109,68 +264,202 @@ class Parameters:
             num_electrons += self._element_charges[self._species[i]]
         return num_electrons
 
+    @property
+    def num_bands(self):
+        """ Number of bands computed at each k-point. With smearing, states above the Fermi level are
+         (partially) occupied, so extra bands are included by default. """
+        if self._num_bands is not None:
+            return self._num_bands
+        if self._scf_smearing == 'none' or self._scf_temperature == 0:
+            return self.num_electrons
+        return max(int(np.ceil(1.2*self.num_electrons)), self.num_electrons + 4)
+
     @property
     def realspace_grid(self):
-        """ Grid points in the delta function (real-space) basis set """
-        return np.linspace(-self._cell, self._cell, self._num_planewaves)
+        """ Grid points in the delta function (real-space) basis set. The grid is periodic,
+         such that the point at x=a is the image of x=-a and is not included. """
+        return np.linspace(-self._cell, self._cell, self._num_planewaves, endpoint=False)
 
     @property
     def big_realspace_grid(self):
         """ Real space grid with double the sampling """
-        return np.linspace(-self._cell, self._cell, 2*self._num_planewaves)
+        return np.linspace(-self._cell, self._cell, 2*self._num_planewaves, endpoint=False)
 
     @property
     def planewave_grid(self):
         r""" Plane-wave frequences for plane-waves that fit in
          the unit cell: :math:`G = \frac{2 \pi n}{R}` """
-        N = int((self._num_planewaves - 1) / 2)
-
-        pw_frequencies_positive = [np.pi*n / self._cell
-                          for n in
-                          range(0, N+1)]
-
-        pw_frequencies_negative = [np.pi*n / self._cell
-                          for n in
-                          range(-N, 0)]
-        # Return frequencies ordered using same ordering as numpy's FFT
-        return np.asarray(pw_frequencies_positive + pw_frequencies_negative)
+        # Frequencies ordered using same ordering as numpy's FFT
+        return np.pi * frequency_indices(self._num_planewaves) / self._cell
 
     @property
     def big_planewave_grid(self):
         r""" Plane-wave frequences up to 2*G_max """
+        return np.pi * frequency_indices(2*self._num_planewaves) / self._cell
+
+    @property
+    def v_ext(self):
+        """ External potential: either an atomic potential (Coulomb) or a given functional form,
+         as the FFT of its values on the realspace_grid. The atomic potential is band-limited (see
+         big_v_ext), and its coefficients are the low frequencies of big_v_ext. """
+        if self._manual_v_ext is not None:
+            return self._cached('v_ext', lambda: fft.fft(self._manual_v_ext(x=self.realspace_grid)))
+        # The atomic potential is band-limited, so the coarse grid holds its low frequencies
         N = self._num_planewaves
+        return self._cached('v_ext', lambda: 0.5*np.concatenate((self.big_v_ext[:(N + 1) // 2],
+                                                                 self.big_v_ext[-(N // 2):])))
 
-        pw_frequencies_positive = [np.pi*n / self._cell
-                          for n in
-                          range(0, N+1)]
+    @property
+    def big_v_ext(self):
+        r""" External potential on the double grid (as the FFT of its values on the big_realspace_grid),
+         as used when applying the Hamiltonian. The atomic potential is the sum over species of the form
+         factor of each species and its structure factor,
+
+         .. math::
 
-        pw_frequencies_negative = [np.pi*n / self._cell
-                          for n in
-                          range(-N, 0)]
+            v_{ext}(G) = \frac{1}{2a} \sum_s F_s(G) S_s(G),
 
-        return np.asarray(pw_frequencies_positive + pw_frequencies_negative)
+         i.e. the exact Fourier coefficients of the periodic potential of the ions up to 2*G_max. """
+        return self._cached('big_v_ext', self._big_v_ext)
+
+    def _big_v_ext(self):
+        M = 2*self._num_planewaves
+        if self._manual_v_ext is not None:
+            return fft.fft(self._manual_v_ext(x=self.big_realspace_grid))
+        structure_factors = self.structure_factors
+        v_ext = sum(self.form_factor(species) * structure_factors[species] for species in structure_factors)
+        return (M / (2*self._cell)) * v_ext
 
     @property
-    def v_ext(self):
-        """ External potential: either an atomic potential (Coulomb) or a given functional form """
+    def structure_factors(self):
+        r""" Structure factor of each species, :math:`S_s(G) = \sum_{a \in s} e^{-iG(X_a + a)}`, on the
+         big_planewave_grid (dict of ndarray). Phases are relative to the first point x=-a of the grid, as
+         in the FFT of a function sampled on the grid. The Nyquist frequency holds the real part,
+         the average of :math:`\pm G`. """
+        return self._cached('structure_factors', self._structure_factors)
+
+    def _structure_factors(self):
+        M = 2*self._num_planewaves
+        species = np.asarray(self._species)
+        positions = np.asarray(self._positions, dtype=float)
+
+        structure_factors = {}
+        for element in dict.fromkeys(self._species):
+            # Phases G(X + a) = pi n (X + a) / a, with period 2 pi in the angle pi (X + a) / a
+            structure_factor = nonuniform_fft(np.pi*(positions[species == element] + self._cell) / self._cell, M)
+            structure_factor[M // 2] = structure_factor[M // 2].real
+            structure_factors[element] = structure_factor
+        return structure_factors
+
+    def form_factor(self, species):
+        r""" Fourier transform of the softened Coulomb potential of an ion of a given species, centred at
+         the origin and periodic (minimum image), on the big_planewave_grid,
+
+         .. math::
+
+            F_s(G) = -Z_s \int_{-a}^{a} \frac{e^{-iGx}}{|x| + c} dx = -2Z_s [\cos(Gc) (\text{Ci}(G(a+c))
+            - \text{Ci}(Gc)) + \sin(Gc) (\text{Si}(G(a+c)) - \text{Si}(Gc))],
+
+         with :math:`F_s(0) = -2Z_s \ln(1 + a/c)`. """
+        return self._element_charges[species] * self._cached('coulomb_form_factor', self._coulomb_form_factor)
+
+    def _coulomb_form_factor(self):
+        G = abs(self.big_planewave_grid[1:])
+        c, a = self._soft, self._cell
+        si_inner, ci_inner = sici(G*c)
+        si_outer, ci_outer = sici(G*(a + c))
+        form_factor = -2*(np.cos(G*c)*(ci_outer - ci_inner) + np.sin(G*c)*(si_outer - si_inner))
+        return np.concatenate(([-2*np.log(1 + a/c)], form_factor))
+
+    @property
+    def hartree_kernel(self):
+        r""" Coefficients of the softened Coulomb interaction :math:`\frac{1}{|x-x'| + c}` as a function of the
+         (minimum image) displacement on the double grid, such that the Hartree potential is a product in G-space """
+        return self._cached('hartree_kernel', self._hartree_kernel)
+
+    def _hartree_kernel(self):
+        dx = self._cell / self._num_planewaves
+        displacements = dx * frequency_indices(2*self._num_planewaves)
+        return dx * fft.fft(1 / (abs(displacements) + self._soft))
+
+    @property
+    def ion_ion_energy(self):
+        """ Interaction energy of the ions (see forces.ion_ion_energy), computed once. Zero for a manual_v_ext. """
         if self._manual_v_ext is not None:
-            return np.fft.fft(self._manual_v_ext(x=self.realspace_grid))
-        else:
-            v_ext = np.zeros(self._num_planewaves)
-            num_atoms = len(self._species)
-            # Add a Coulomb potential at each atomic position scaled with Z
-            for i in range(num_atoms):
-                charge = self._element_charges[self._species[i]]
-                v_ext += self.coulomb(charge, self._positions[i])
-            return np.fft.fft(v_ext)
+            return 0.0
+        return self._cached('ion_ion_energy', lambda: forces.ion_ion_energy(self))
+
+    def _cached(self, name, compute):
+        """ A derived quantity, computed on first use and stored (read-only), the Parameters being immutable """
+        if name not in self._cache:
+            value = compute()
+            if isinstance(value, np.ndarray):
+                value.flags.writeable = False
+            self._cache[name] = value
+        return self._cache[name]
+
+    @property
+    def kpoint_grid(self):
+        r""" Number of points n of the Monkhorst-Pack grid, such that the spacing of the k-points
+         is at most kpoint_spacing, unless given explicitly """
+        if self._k_point_grid is not None:
+            return self._k_point_grid
+        return max(int(np.ceil(np.pi / (self._cell * self._k_point_spacing))), 1)
+
+    @property
+    def gamma_only(self):
+        """ Whether the Gamma point alone is sampled, in which case the wavefunctions are real and the
+         bands are computed with real arithmetic. Default when the k-point grid is a single point. """
+        if self._gamma_only is None:
+            return self.kpoint_grid == 1
+        return self._gamma_only
+
+    @property
+    def monkhorst_pack_grid(self):
+        r""" The full Monkhorst-Pack grid within the first BZ, :math:`k_j = \frac{2j - n - 1}{2n} b` for
+         :math:`j = 1, ..., n`, with reciprocal lattice vector :math:`b = \frac{\pi}{a}` """
+        n = self.kpoint_grid
+        return (2*np.arange(1, n + 1) - n - 1) * np.pi / (2*n*self._cell)
 
     @property
     def k_points(self):
-        r""" MP k-point grid within the first BZ: :math:`k \in [\frac{-\pi}{a}, \frac{\pi}{a}]` """
-        return np.linspace(-np.pi / self._cell, np.pi / self._cell, 1 / self._k_point_spacing)
+        r""" k-points at which the Hamiltonian is diagonalised. The potential is real (time-reversal
+         symmetry), such that :math:`\varepsilon_{-k} = \varepsilon_k` and :math:`\phi_{-k} = \phi_k^*`,
+         so only the irreducible points :math:`k \geq 0` of the Monkhorst-Pack grid are kept, unless
+         kpoint_symmetry is False. """
+        k_points, _ = self._irreducible_k_points()
+        return k_points
+
+    @property
+    def k_point_weights(self):
+        """ Integer weight (multiplicity in the full Monkhorst-Pack grid) of each of the k_points.
+         Normalised weights are k_point_weights / sum(k_point_weights). """
+        _, weights = self._irreducible_k_points()
+        return weights
+
+    def _irreducible_k_points(self):
+        """ The irreducible k-points and their integer weights """
+        if self._gamma_only:
+            return np.zeros(1), np.ones(1, dtype=int)
+        n = self.kpoint_grid
+        # Integer labels m = 2j - n - 1 of the grid points, k = m b / 2n
+        labels = 2*np.arange(1, n + 1) - n - 1
+        if self._k_point_symmetry:
+            labels, weights = np.unique(abs(labels), return_counts=True)
+        else:
+            weights = np.ones(n, dtype=int)
+        return labels * np.pi / (2*n*self._cell), weights
 
-    def coulomb(self, charge: int, position: float) -> np.ndarray:
+    def coulomb(self, charge: int, position: float, grid: np.ndarray = None) -> np.ndarray:
         """ The external potential of an ion with a given charge (int) and position (float)
-         regularised about the core with a softening parameter """
-        return -charge / (abs(self.realspace_grid - position) + self._soft)
+         regularised about the core with a softening parameter. Evaluated on the
+         realspace_grid unless another grid is given. Distances are minimum image distances,
+         such that the potential is periodic, as is the Hartree interaction. """
+        if grid is None:
+            grid = self.realspace_grid
+        return -charge / (abs(self.minimum_image(grid - position)) + self._soft)
+
+    def minimum_image(self, displacement):
+        """ Displacement(s) between points in the periodic cell mapped into :math:`[-a, a)` """
+        return (np.asarray(displacement) + self._cell) % (2*self._cell) - self._cell
 
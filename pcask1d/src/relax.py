@@ -0,0 +1,190 @@
+# Distributed under the terms of the MIT License.
+
+"""
+Module that relaxes the ionic positions to a minimum of the total energy using the analytic
+Hellmann-Feynman forces. Each geometry step performs a single SCF calculation, started from the
+density (moved with the atoms) and wavefunctions of the previous geometry step.
+"""
+
+import numpy as np
+from .params import Parameters
+from .sweep import interpolate_density
+from .scf import SCF
+from .forces import ionic_forces
+
+
+class Relaxation:
+    """
+    An instance of this class is initialised with a params, and creates an iterable object whose
+    iterations are geometry steps toward the relaxed ionic positions. The positions are updated
+    with a (force based) BFGS quasi-Newton method, or with the FIRE damped dynamics method.
+    """
+
+    def __init__(self, params, method='bfgs', force_tol=1e-3, max_steps=100, max_step=0.2, **kwargs):
+        r"""
+        Parameters:
+            * params (Parameters): input model for the system at the initial positions
+            * method (str): 'bfgs' or 'fire'
+            * force_tol (float): converged once the largest force on an ion is below force_tol
+            * max_steps (int): maximum number of geometry steps
+            * max_step (float): largest displacement of an ion in a single step
+
+        Keyword arguments:
+            * any keyword arguments of the SCF, e.g. scheduler
+        """
+
+        if method not in ['bfgs', 'fire']:
+            raise RuntimeError('Chosen relaxation method {} is not implemented'.format(method))
+
+        self._params = params
+        self._method = method
+        self._force_tol = force_tol
+        self._max_steps = max_steps
+        self._max_step = max_step
+        self._scf_kwargs = kwargs
+
+        self._positions = np.asarray(params.positions, dtype=float)
+        self._forces = None
+        self._density = None
+        self._density_params = None
+        self._scf_converged = False
+        self._subspaces = None
+        self._step = 0
+        self._scf_iterations = []
+
+        # BFGS state: approximate Hessian and the previous positions and forces
+        self._hessian = np.eye(len(self._positions))
+        self._previous = None
+
+        # FIRE state
+        self._velocity = np.zeros(len(self._positions))
+        self._dt = 0.1
+        self._alpha = 0.1
+        self._steps_downhill = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        """ Converge the SCF at the current positions, compute the forces, and move the ions """
+
+        if self.converged or self._step >= self._max_steps:
+            raise StopIteration
+
+        self._forces = self.forces(self._positions)
+        self._step += 1
+
+        if not self.converged:
+            if self._method == 'bfgs':
+                displacement = self._bfgs_step(self._positions, self._forces)
+            else:
+                displacement = self._fire_step(self._forces)
+            self._positions = self._params.minimum_image(self._positions + displacement)
+
+        return self._positions
+
+    def run(self):
+        """ Relax until the forces are below force_tol (or max_steps), returning the relaxed Parameters """
+        for _ in self:
+            pass
+        return self.params
+
+    def forces(self, positions):
+        """ Forces on the ions at the given positions, from an SCF calculation seeded with the
+        density (moved with the atoms) and eigenvectors of the previous geometry step (if that SCF converged) """
+
+        params = self._params_at(positions)
+        density = None
+        if self._density is not None and self._scf_converged:
+            density = interpolate_density(self._density, self._density_params, params)
+
+        scf = SCF(params, density, subspaces=self._subspaces, **self._scf_kwargs)
+        self._density = scf.run()
+        self._density_params = params
+        self._scf_converged = scf.converged
+        self._subspaces = scf.subspaces
+        self._scf_iterations.append(scf.iteration)
+        return ionic_forces(params, self._density)
+
+    def _params_at(self, positions):
+        return Parameters(**dict(self._params.inputs, positions=[float(x) for x in positions]))
+
+    def _limit(self, displacement):
+        """ Scale a displacement such that no ion moves further than max_step """
+        largest = np.max(abs(displacement))
+        if largest > self._max_step:
+            displacement = displacement * self._max_step / largest
+        return displacement
+
+    def _bfgs_step(self, positions, forces):
+        """ Quasi-Newton step, with a BFGS update of the Hessian from the change in forces """
+
+        if self._previous is not None:
+            change_positions = positions - self._previous[0]
+            change_forces = forces - self._previous[1]
+            a = change_positions @ change_forces
+            hessian_change = self._hessian @ change_positions
+            b = change_positions @ hessian_change
+            if abs(a) > 1e-12 and abs(b) > 1e-12:
+                self._hessian -= np.outer(change_forces, change_forces) / a \
+                                 + np.outer(hessian_change, hessian_change) / b
+        self._previous = (positions.copy(), forces.copy())
+
+        # Step along the Newton direction, using |eigenvalues| to always move downhill
+        eigenvalues, eigenvectors = np.linalg.eigh(self._hessian)
+        displacement = eigenvectors @ ((eigenvectors.T @ forces) / abs(eigenvalues))
+        return self._limit(displacement)
+
+    def _fire_step(self, forces, dt_max=1.0, n_min=5, f_inc=1.1, f_dec=0.5, alpha_start=0.1, f_alpha=0.99):
+        """ Fast inertial relaxation engine (FIRE) step with unit masses """
+
+        power = forces @ self._velocity
+        if power > 0:
+            norm = np.linalg.norm(forces)
+            self._velocity = (1 - self._alpha) * self._velocity \
+                             + self._alpha * forces * np.linalg.norm(self._velocity) / norm
+            self._steps_downhill += 1
+            if self._steps_downhill > n_min:
+                self._dt = min(self._dt * f_inc, dt_max)
+                self._alpha *= f_alpha
+        else:
+            self._velocity[:] = 0
+            self._steps_downhill = 0
+            self._dt *= f_dec
+            self._alpha = alpha_start
+
+        self._velocity += self._dt * forces
+        return self._limit(self._dt * self._velocity)
+
+    @property
+    def params(self):
+        """ The Parameters at the current positions """
+        return self._params_at(self._positions)
+
+    @property
+    def positions(self):
+        return self._positions
+
+    @property
+    def density(self):
+        """ The converged density of the latest geometry step """
+        return self._density
+
+    @property
+    def ionic_forces(self):
+        """ The forces on the ions at the latest geometry step """
+        return self._forces
+
+    @property
+    def step(self):
+        """ Number of geometry steps (SCF calculations) performed """
+        return self._step
+
+    @property
+    def scf_iterations(self):
+        """ Number of SCF iterations of each geometry step """
+        return self._scf_iterations
+
+    @property
+    def converged(self):
+        return self._forces is not None and np.max(abs(self._forces)) < self._force_tol
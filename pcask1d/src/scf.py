@@ -6,28 +6,509 @@ en route toward self-consistency
 """
 
 import numpy as np
+from . import checkpoint
+from . import instrumentation
+from .density import Density
+from .hamiltonian import Hamiltonian
+from .eigensolver import SubspaceCache
+from .exchange import ExchangeOperator, CompressedExchange
+from .occupancy import occupy
+from .wavefunction import WavefunctionSet
 
 
 class SCF:
     """
     An instance of this class is initialised with a params, and an initial guess density,
     and creates an iterable object that can be iterated toward self-consistency.
+
+    Each iteration applies the Kohn-Sham map to the input density, and mixes the input and output
+    densities to give the input density of the next iteration. The mixing is Pulay (DIIS) extrapolation
+    over a bounded history of (input density, residual) pairs, or linear mixing, optionally
+    preconditioned with a Kerker preconditioner.
+
+    With params.scf_precision == 'mixed', the Kohn-Sham map is computed in single precision until the
+    residual norm falls below params.scf_precision_tol (or stagnates at the noise of single precision),
+    and in double precision thereafter, such that convergence is only reached in double precision.
+
+    For Hartree-Fock, the exchange operator depends on the orbitals rather than the density. The
+    (compressed) exchange operator is held fixed in the inner density iterations, and is updated
+    from the latest orbitals in an outer loop each time the density converges, until the exchange
+    energy changes by less than params.scf_exchange_tol.
+
+    The total energy of the bands of each iteration is evaluated alongside the residual. With params.scf_energy_tol,
+    convergence also requires the change in the total energy between iterations to be below scf_energy_tol.
     """
 
-    def __init__(self, params):
+    # Number of single precision iterations without a new minimum of the residual norm, after which the
+    # residual is taken to be at the noise of single precision, and the SCF continues in double precision
+    precision_patience = 3
+
+    def __init__(self, params, density=None, **kwargs):
+        r"""
+        Parameters:
+            * params (Parameters): input model for the system
+            * density (Density): initial guess for the density, default Density.initial_guess
+
+        Keyword arguments:
+            * scheduler (KPointScheduler): distribute the k-points of each iteration over worker processes
+            * checkpoint (str): file to which the state is saved periodically, and on convergence
+            * checkpoint_interval (int): number of iterations between checkpoints, default 10
+            * subspaces (SubspaceCache): eigenvectors used to warm start the eigensolver, e.g. from a
+              previous calculation on a similar system
+        """
+
+        self._params = params
+        self._density = density if density is not None else Density(params)
+        self._scheduler = kwargs.get('scheduler', None)
+        self._checkpoint = kwargs.get('checkpoint', None)
+        self._checkpoint_interval = kwargs.get('checkpoint_interval', 10)
+
         self._history_length = params.scf_history_length
+        self._step_length = params.scf_step_length
+        self._mixing = params.scf_mixing
 
-    def __next__(self, params):
-        return None
-        #self._density_out = kohn_sham_map(params, self._density)
-        # Add to list of in/out densities
-        # return self.density = pulay()
+        # Ring buffer of input densities and residuals, oldest entry overwritten first
+        M = 2*params.num_planewaves
+        self._density_history = np.zeros((self._history_length, M), dtype=complex)
+        self._residual_history = np.zeros((self._history_length, M), dtype=complex)
+        self._history_size = 0
+        self._history_index = 0
 
-    @staticmethod
-    def kohn_sham_map(params, density_in):
-        # return density_out
-        return None
+        self._preconditioner = self.kerker_preconditioner(params)
+
+        self._precision = 'single' if params.scf_precision == 'mixed' else 'double'
+        self._residual_precision = self._precision
+
+        self._iteration = 0
+        self._residual_norm = np.inf
+        self._residual_norms = []
+        self._eigenvalues = None
+        self._wavefunctions = None
+        self._fermi_level = None
+        self._smearing_energy = None
+        self._energy_terms = None
+        self._energies = []
+
+        # Eigenvectors of the previous iteration at each k-point, to warm start the eigensolver
+        self._subspaces = kwargs.get('subspaces', None)
+        if self._subspaces is None:
+            self._subspaces = SubspaceCache()
+
+        # Compressed exchange operator at each k-point (Hartree-Fock only), updated in the outer loop
+        self._exchange = None
+        self._exchange_energy = None
+        self._exchange_change = None
+        self._exchange_converged = params.method != 'hf'
+        self._weights = None
+
+        if params.method == 'hf' and self._scheduler is not None:
+            raise RuntimeError('Hartree-Fock is not supported with a KPointScheduler.')
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        """ Perform a single SCF iteration, stopping once the residual norm is below scf_tol """
+
+        if self.converged or self._iteration >= self._params.scf_max_iterations:
+            raise StopIteration
+
+        with instrumentation.region('scf.iteration'):
+            self._iterate()
+        instrumentation.report(iteration=self._iteration, residual_norm=self._residual_norm, energy=self.energy)
+
+        if self._checkpoint is not None and (self.converged or self._iteration % self._checkpoint_interval == 0):
+            self.save(self._checkpoint)
+
+        return self._density
+
+    def _iterate(self):
+        """ Apply the Kohn-Sham map to the current density, and mix to give the next input density """
+
+        density_in = self._density.coefficients
+        with instrumentation.region('scf.kohn_sham_map'):
+            density_out = self.kohn_sham_map(self._params, self._density)
+        residual = density_out.coefficients - density_in
+
+        self._residual_norm = self.norm(self._params, residual)
+        self._residual_norms.append(self._residual_norm)
+        self._iteration += 1
+
+        self._residual_precision = self._precision
+        if self._precision == 'single' and self.promote_precision(self._params):
+            self._precision = 'double'
+            if self._residual_norm >= self._params.scf_precision_tol:
+                # Stagnated, the history holds residuals at the noise of single precision
+                self._history_size = 0
+                self._history_index = 0
+
+        # The input density is kept on an update of the exchange operator, its residual is out of date
+        if self._params.method == 'hf' and (self._exchange is None or self._residual_norm < self.exchange_update_tol(self._params)):
+            with instrumentation.region('scf.exchange'):
+                self.update_exchange(self._params)
+
+        elif not self.converged:
+            with instrumentation.region('scf.mixing'):
+                self._store(density_in, residual)
+                if self._mixing == 'pulay' and self._history_size > 1:
+                    self._density.coefficients = self.pulay_update()
+                else:
+                    self._density.coefficients = self.linear_update(density_in, residual)
+
+    def run(self):
+        """ Iterate until convergence (or scf_max_iterations), returning the final density """
+        for _ in self:
+            pass
+        return self._density
+
+    def save(self, path):
+        """ Checkpoint the params, density, mixing history, wavefunctions and (Hartree-Fock) compressed exchange
+        operator to a file (atomically)
+
+        Parameters:
+            * path (str): checkpoint file
+        """
+
+        # The history is stored oldest first
+        if self._history_size == self._history_length:
+            order = np.roll(np.arange(self._history_length), -self._history_index)
+        else:
+            order = np.arange(self._history_size)
+        arrays = {'density': self._density.coefficients,
+                  'density_history': self._density_history[order],
+                  'residual_history': self._residual_history[order]}
+        if self._wavefunctions is not None:
+            for field in WavefunctionSet.fields:
+                arrays['wavefunctions.' + field] = getattr(self._wavefunctions, field)
+        if self._exchange is not None:
+            for i, exchange in enumerate(self._exchange):
+                arrays['exchange.{}'.format(i)] = exchange.projectors
+
+        state = {'iteration': self._iteration,
+                 'residual_norm': self._residual_norm,
+                 'residual_norms': self._residual_norms,
+                 'energies': self._energies,
+                 'precision': self._residual_precision,
+                 'exchange_energy': self._exchange_energy,
+                 'exchange_change': self._exchange_change,
+                 'exchange_converged': self._exchange_converged}
+        checkpoint.save(path, self._params, arrays, state)
+
+    @classmethod
+    def restart(cls, path, **kwargs):
+        """ Restart an SCF calculation from a checkpoint file. The arrays are memory-mapped, and only the
+        density and mixing history are read into memory. If the checkpointed calculation had converged,
+        the SCF performs no further iterations, and the wavefunctions are available for post-processing.
+
+        Parameters:
+            * path (str): checkpoint file
+            * kwargs: keyword arguments of the SCF, e.g. checkpoint to continue checkpointing
+        """
+
+        saved = checkpoint.Checkpoint(path)
+        params = saved.params
+        scf = cls(params, Density(params, coeffs=np.array(saved['density'])), **kwargs)
+
+        state = saved.state
+        scf._iteration = state['iteration']
+        scf._residual_norm = state['residual_norm']
+        scf._residual_norms = list(state['residual_norms'])
+        scf._energies = list(state.get('energies', []))
+        scf._residual_precision = state.get('precision', 'double')
+        if scf._residual_norm < max(params.scf_precision_tol, params.scf_tol):
+            scf._precision = 'double'
+
+        # Restore the most recent history, as far as the (possibly different) history length allows
+        history_size = min(saved['density_history'].shape[0], scf._history_length)
+        scf._density_history[:history_size] = saved['density_history'][-history_size:]
+        scf._residual_history[:history_size] = saved['residual_history'][-history_size:]
+        scf._history_size = history_size
+        scf._history_index = history_size % scf._history_length
+
+        if 'wavefunctions.coefficients' in saved:
+            scf._wavefunctions = WavefunctionSet(**{field: saved['wavefunctions.' + field]
+                                                    for field in WavefunctionSet.fields})
+            scf._eigenvalues = scf._wavefunctions.energies[:, 0]
+            scf._weights = params.k_point_weights / np.sum(params.k_point_weights)
+            for i, k_point in enumerate(scf._wavefunctions.k_points):
+                scf._subspaces.update(k_point, scf._wavefunctions.eigenvectors(i))
+
+        # The compressed exchange operator (Hartree-Fock only) and the state of the outer loop
+        if 'exchange.0' in saved:
+            num_k_points = len(np.atleast_1d(params.k_points))
+            scf._exchange = [CompressedExchange(np.array(saved['exchange.{}'.format(i)]))
+                             for i in range(num_k_points)]
+            scf._exchange_energy = state.get('exchange_energy')
+            scf._exchange_change = state.get('exchange_change')
+            scf._exchange_converged = state.get('exchange_converged', scf._exchange_converged)
+
+        return scf
+
+    def kohn_sham_map(self, params, density_in):
+        r""" The Kohn-Sham map :math:`\rho_{out} = F[\rho_{in}]`: diagonalise the Hamiltonian constructed
+        from the input density at each k-point, occupy the bands of all k-points with a common Fermi level,
+        and construct the output density from the occupied bands.
+
+        Parameters:
+            * params (Parameters): input model for the system
+            * density_in (Density): input density
+
+        Output:
+            * density_out (Density): output density
+        """
+
+        k_points = np.atleast_1d(params.k_points)
+        weights = params.k_point_weights / np.sum(params.k_point_weights)
+        num_states = params.num_bands
+
+        tol = self.eigensolver_tol(params)
+
+        if self._scheduler is not None:
+            self._scheduler.publish(density_in)
+            wavefunctions = self._scheduler.wavefunctions(k_points, num_states, subspaces=self._subspaces, tol=tol,
+                                                          precision=self._precision)
+        elif (len(k_points) > 1 and self._exchange is None
+              and Hamiltonian(density_in).use_dense_solver(params, num_states)):
+            # The dense eigensolver diagonalises the k-points together, from a single potential block
+            hamiltonian = Hamiltonian(density_in, precision=self._precision)
+            wavefunctions = hamiltonian.eigendecomposition_stack(params, k_points, num_states)
+            for i, k_point in enumerate(k_points):
+                self._subspaces.update(k_point, wavefunctions.eigenvectors(i))
+        else:
+            potential = Hamiltonian(density_in).local_potential(params)
+            wavefunctions = WavefunctionSet(params, len(k_points), 1, num_states,
+                                            dtype=Hamiltonian.precisions[self._precision][1])
+            for i, k_point in enumerate(k_points):
+                exchange = self._exchange[i] if self._exchange is not None else None
+                hamiltonian = Hamiltonian(density_in, k_point=k_point, local_potential=potential, exchange=exchange,
+                                          precision=self._precision)
+                wavefunctions_k = hamiltonian.eigendecomposition(params, num_states,
+                                                                 guess=self._subspaces.get(k_point), tol=tol)
+                for field in ('coefficients', 'energies', 'k_points'):
+                    getattr(wavefunctions, field)[i] = getattr(wavefunctions_k, field)[0]
+                self._subspaces.update(k_point, wavefunctions.eigenvectors(i))
+
+        # Occupy the bands of all k-points with a common Fermi level
+        wavefunctions.occupancies, self._fermi_level, self._smearing_energy = \
+            occupy(params, wavefunctions.energies, weights)
+
+        self._wavefunctions = wavefunctions
+        self._weights = weights
+        self._eigenvalues = wavefunctions.energies[:, 0]
+        density_out = Density.from_wavefunctions(params, wavefunctions, weights)
+
+        with instrumentation.region('scf.energy'):
+            hamiltonian = Hamiltonian(density_out)
+            self._energy_terms = hamiltonian.total_energy(params, wavefunctions, weights, density=density_out,
+                                                          exchange=self._exchange, smearing_energy=self._smearing_energy)
+        self._energies.append(self._energy_terms['total'])
+        return density_out
+
+    def update_exchange(self, params):
+        """ Outer loop update of the exchange operator: compress the exact exchange operator of the latest
+        orbitals at each k-point. The density history is cleared, as it was generated with the previous
+        exchange operator.
+
+        Parameters:
+            * params (Parameters): input model for the system
+        """
+
+        operator = ExchangeOperator(params, self._wavefunctions, self._weights)
+        self._exchange = [operator.compress(params, k_point) for k_point in self._wavefunctions.k_points]
+
+        exchange_energy = operator.energy(params)
+        if self._exchange_energy is not None:
+            self._exchange_change = abs(exchange_energy - self._exchange_energy)
+            self._exchange_converged = self._exchange_change < params.scf_exchange_tol \
+                                       and self._residual_norm < params.scf_tol
+        self._exchange_energy = exchange_energy
+
+        if not self._exchange_converged:
+            self._history_size = 0
+            self._history_index = 0
+
+    def exchange_update_tol(self, params):
+        """ Residual norm below which the exchange operator is updated. Far from convergence of the outer loop,
+        the inner density iterations need only converge to a fraction of the last change in the exchange energy.
+
+        Parameters:
+            * params (Parameters): input model for the system
+        """
+
+        if self._exchange_change is None:
+            return params.scf_tol
+        return max(0.1*self._exchange_change, params.scf_tol)
+
+    def promote_precision(self, params):
+        """ Whether a mixed precision SCF continues in double precision: once the residual norm approaches
+        convergence, or has not decreased for precision_patience iterations in single precision
+
+        Parameters:
+            * params (Parameters): input model for the system
+        """
+
+        if self._residual_norm < max(params.scf_precision_tol, params.scf_tol):
+            return True
+        recent = self._residual_norms[-self.precision_patience:]
+        earlier = self._residual_norms[:-self.precision_patience]
+        return len(earlier) > 0 and min(recent) >= min(earlier)
+
+    def eigensolver_tol(self, params):
+        r""" Tolerance of the iterative eigensolver for the next iteration. Early iterations are far from
+        self-consistency, so the eigenpairs need only be accurate to a fraction of the density residual.
+        The tolerance tightens with the residual down to params.eigensolver_tol.
+
+        Parameters:
+            * params (Parameters): input model for the system
+        """
+
+        return min(max(0.1*self._residual_norm, params.eigensolver_tol), 1e-2)
 
     def pulay_update(self):
-        # Compute rho_out
-        return None
\ No newline at end of file
+        r""" Pulay (DIIS) update of the density. The residual is minimised in the span of the history,
+
+        .. math::
+
+            \min_{c} || \sum_i c_i R_i ||, \quad \sum_i c_i = 1,
+
+        and the optimal input density is stepped along its (preconditioned) optimal residual,
+        :math:`\rho = \sum_i c_i (\rho_i + \alpha P R_i)`. Falls back to linear mixing when the
+        regularised linear system cannot be solved.
+        """
+
+        densities = self._density_history[:self._history_size]
+        residuals = self._residual_history[:self._history_size]
+        n = self._history_size
+
+        # Regularised overlap of the residuals (bordered by the constraint on the coefficients)
+        overlap = (residuals.conj() @ residuals.T).real
+        overlap += 1e-12 * np.trace(overlap) / n * np.eye(n)
+        system = np.zeros((n + 1, n + 1))
+        system[:n, :n] = overlap
+        system[:n, n] = system[n, :n] = 1
+        rhs = np.zeros(n + 1)
+        rhs[n] = 1
+
+        try:
+            coefficients = np.linalg.solve(system, rhs)[:n]
+        except np.linalg.LinAlgError:
+            latest = (self._history_index - 1) % self._history_length
+            return self.linear_update(self._density_history[latest], self._residual_history[latest])
+
+        density_optimal = coefficients @ densities
+        residual_optimal = coefficients @ residuals
+        return self.linear_update(density_optimal, residual_optimal)
+
+    def linear_update(self, density_in, residual):
+        r""" Linear mixing of the density, :math:`\rho = \rho_{in} + \alpha P R` """
+        return density_in + self._step_length * self._preconditioner * residual
+
+    @staticmethod
+    def kerker_preconditioner(params):
+        r""" The Kerker preconditioner in G-space, :math:`P(G) = \frac{G^2}{G^2 + q_0^2}`, which damps
+        the long wavelength components of the residual responsible for charge sloshing.
+        The identity if params.scf_kerker is None.
+
+        Parameters:
+            * params (Parameters): input model for the system
+        """
+
+        if params.scf_kerker is None:
+            return np.ones(2*params.num_planewaves)
+        G = params.big_planewave_grid
+        return G**2 / (G**2 + params.scf_kerker**2)
+
+    @staticmethod
+    def norm(params, residual):
+        r""" The norm of a density residual, :math:`||R|| = \sqrt{\int |R(x)|^2 dx}`, from its coefficients """
+        return np.sqrt(np.sum(abs(residual)**2) / (2*params.cell))
+
+    def _store(self, density_in, residual):
+        """ Add an (input density, residual) pair to the ring buffer """
+        self._density_history[self._history_index] = density_in
+        self._residual_history[self._history_index] = residual
+        self._history_index = (self._history_index + 1) % self._history_length
+        self._history_size = min(self._history_size + 1, self._history_length)
+
+    @property
+    def density(self):
+        """ The current (input) density """
+        return self._density
+
+    @property
+    def eigenvalues(self):
+        """ (n_k, num_states) band energies from the latest iteration """
+        return self._eigenvalues
+
+    @property
+    def subspaces(self):
+        """ The eigenvectors at each k-point (SubspaceCache) used to warm start the eigensolver """
+        return self._subspaces
+
+    @property
+    def wavefunctions(self):
+        """ The bands (WavefunctionSet) of the latest iteration, or None if distributed over workers """
+        return self._wavefunctions
+
+    @property
+    def iteration(self):
+        """ Number of SCF iterations performed """
+        return self._iteration
+
+    @property
+    def residual_norm(self):
+        r""" Residual norm :math:`||\rho_{out} - \rho_{in}||` of the latest iteration """
+        return self._residual_norm
+
+    @property
+    def residual_norms(self):
+        """ Residual norm of every iteration performed """
+        return self._residual_norms
+
+    @property
+    def fermi_level(self):
+        """ Chemical potential of the occupancies of the latest iteration """
+        return self._fermi_level
+
+    @property
+    def smearing_energy(self):
+        r""" Entropy correction :math:`-\sigma S` to the energy from the smeared occupancies of the latest iteration """
+        return self._smearing_energy
+
+    @property
+    def exchange_energy(self):
+        """ Exchange energy of the orbitals of the latest exchange operator update (Hartree-Fock only) """
+        return self._exchange_energy
+
+    @property
+    def precision(self):
+        """ Precision ('single' or 'double') of the Kohn-Sham map of the next iteration """
+        return self._precision
+
+    @property
+    def energy(self):
+        """ Total energy of the bands of the latest iteration, or None before the first iteration """
+        return self._energies[-1] if self._energies else None
+
+    @property
+    def energies(self):
+        """ Total energy of every iteration performed """
+        return self._energies
+
+    @property
+    def energy_terms(self):
+        """ Terms of the total energy of the latest iteration (see Hamiltonian.total_energy) """
+        return self._energy_terms
+
+    @property
+    def energy_change(self):
+        """ Change in the total energy over the latest iteration """
+        if len(self._energies) < 2:
+            return np.inf
+        return abs(self._energies[-1] - self._energies[-2])
+
+    @property
+    def converged(self):
+        energy_converged = self._params.scf_energy_tol is None or self.energy_change < self._params.scf_energy_tol
+        return self._residual_norm < self._params.scf_tol and self._exchange_converged and energy_converged \
+               and self._residual_precision == 'double'
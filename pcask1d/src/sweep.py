@@ -0,0 +1,196 @@
+# Distributed under the terms of the MIT License.
+
+"""
+Module that runs a grid of Parameters variants (a parameter sweep) over a pool of worker processes.
+Each point is seeded with the converged density of its nearest finished neighbour on the grid, moved
+with the atoms and interpolated onto the new real-space grid when the cell or basis differ, such that
+most points converge in fewer SCF iterations. Results are streamed as each point completes.
+"""
+
+import os
+import itertools
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from .params import Parameters
+from .density import Density
+from .cache import scf_result
+from . import fft
+
+
+def interpolate_density(density, params_from, params_to):
+    """ Transfer a density onto another Parameters. When the species are the same, the density is partitioned
+    between the atoms (see atomic_weights) and the part of each atom is translated with it, such that the
+    density moves with the atoms when their positions differ. The density is then interpolated (periodically)
+    in real space when the cell or basis differ, and renormalised to the number of electrons of params_to.
+
+    Parameters:
+        * density (Density): density on the grid of params_from
+        * params_from (Parameters): input model on which the density was computed
+        * params_to (Parameters): input model onto which the density is transferred
+
+    Output:
+        * density (Density): density on the grid of params_to
+    """
+
+    dx = params_from.cell / params_from.num_planewaves
+    if list(params_from.species) == list(params_to.species):
+        displacements = np.asarray(params_to.positions, dtype=float) - np.asarray(params_from.positions, dtype=float)
+        phases = np.exp(-1j*params_from.big_planewave_grid[None, :] * displacements[:, None])
+        parts = atomic_weights(params_from) * density.realspace(params_from)
+        values = np.sum(fft.ifft(phases * fft.fft(parts, axis=-1), axis=-1).real, axis=0)
+    else:
+        values = density.realspace(params_from)
+
+    if params_from.cell != params_to.cell or params_from.num_planewaves != params_to.num_planewaves:
+        values = np.interp(params_to.big_realspace_grid, params_from.big_realspace_grid, values,
+                           period=2*params_from.cell)
+        dx = params_to.cell / params_to.num_planewaves
+    coefficients = dx*fft.fft(np.maximum(values, 0))
+
+    coefficients *= params_to.num_electrons / coefficients[0].real
+    return Density(params_to, coeffs=coefficients)
+
+
+def atomic_weights(params):
+    r""" Hirshfeld weights :math:`w_a(x) = g_a(x) / \sum_b g_b(x)` of each atom on the double grid, with
+    :math:`g_a` the Gaussian charge of the atom in the initial guess (see Density.initial_guess), which
+    partition a density into the parts :math:`w_a \rho` of each atom
+
+    Parameters:
+        * params (Parameters): input model for the system
+
+    Output:
+        * weights (ndarray): (num_atoms, 2N) weights, summing to one at each point
+    """
+
+    charges = np.array([params.element_charges[species] for species in params.species], dtype=float)
+    distances = params.minimum_image(params.big_realspace_grid[None, :] - np.asarray(params.positions)[:, None])
+    exponents = np.log(charges)[:, None] - distances**2
+    weights = np.exp(exponents - np.max(exponents, axis=0))
+    return weights / np.sum(weights, axis=0)
+
+
+def _run_point(params, seed_density, seed_params):
+    """ Converge the SCF at one point of the sweep, from a seed density if available """
+
+    density = None
+    if seed_density is not None:
+        density = interpolate_density(Density(seed_params, coeffs=seed_density), seed_params, params)
+    return scf_result(params, density)
+
+
+class Sweep:
+    """
+    A sweep over the cartesian product of values of one or more inputs of a base Parameters,
+    e.g. Sweep(params, cell=[18, 20, 22], scf_temperature=[100, 300]).
+    Parameters are sent to the worker processes, so any manual_v_ext must be a picklable (module level) function.
+    """
+
+    def __init__(self, params, num_workers=None, cache=None, **axes):
+        r"""
+        Parameters:
+            * params (Parameters): base input model, whose inputs are varied
+            * num_workers (int): number of worker processes, default the number of cores
+            * cache (ResultCache): cache of results, points already in the cache are not recomputed
+            * axes: name of an input of Parameters and the list of values it takes
+        """
+
+        self._base = params
+        self._num_workers = num_workers or os.cpu_count()
+        self._cache = cache
+        self._names = list(axes)
+        self._values = [list(values) for values in axes.values()]
+        self._shape = tuple(len(values) for values in self._values)
+
+    def __len__(self):
+        return int(np.prod(self._shape))
+
+    @property
+    def shape(self):
+        return self._shape
+
+    def point(self, index):
+        """ The Parameters at a (multi-dimensional) grid index """
+        inputs = self._base.inputs
+        inputs.update({name: values[i] for name, values, i in zip(self._names, self._values, index)})
+        return Parameters(**inputs)
+
+    def inputs(self, index):
+        """ The varied inputs at a grid index """
+        return {name: values[i] for name, values, i in zip(self._names, self._values, index)}
+
+    def _initial_points(self, pending):
+        """ Points started without a seed: spread evenly over the grid, one per worker """
+        points = sorted(pending)
+        stride = max(len(points) // self._num_workers, 1)
+        return points[::stride][:self._num_workers]
+
+    def run(self):
+        """ Run the sweep, yielding (index, inputs, result) as each point completes. Each result
+        also records the index of the point from which its initial density was seeded (or None). """
+
+        pending = set(itertools.product(*[range(n) for n in self._shape]))
+        finished = {}
+        running = {}
+
+        # Each worker runs its FFTs and BLAS on its share of the cores
+        with ProcessPoolExecutor(max_workers=self._num_workers, initializer=fft.configure,
+                                 initargs=(fft.backend(), fft.worker_threads(self._num_workers))) as executor:
+            cold_starts = self._initial_points(pending)
+
+            while pending or running:
+                # Fill the free workers, preferring points next to finished points
+                while pending and len(running) < self._num_workers:
+                    index, seed = self._next_point(pending, finished, cold_starts)
+                    if index is None:
+                        break
+                    pending.discard(index)
+                    params = self.point(index)
+
+                    cached = self._cache.get(params) if self._cache is not None else None
+                    if cached is not None:
+                        result = dict(cached, seeded_from=None)
+                        finished[index] = (params, result)
+                        yield index, self.inputs(index), result
+                        continue
+
+                    seed_density, seed_params = None, None
+                    if seed is not None:
+                        seed_params, seed_result = finished[seed]
+                        seed_density = seed_result['density']
+                    future = executor.submit(_run_point, params, seed_density, seed_params)
+                    running[future] = (index, params, seed)
+
+                if not running:
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, params, seed = running.pop(future)
+                    result = future.result()
+                    if self._cache is not None:
+                        self._cache.put(params, result)
+                    result = dict(result, seeded_from=seed)
+                    finished[index] = (params, result)
+                    yield index, self.inputs(index), result
+
+    @staticmethod
+    def _next_point(pending, finished, cold_starts):
+        """ The pending point nearest (in grid distance) to a finished point, and that finished point.
+        Before any point has finished, the next unseeded (cold) start. """
+
+        if finished:
+            finished_indices = np.array(list(finished))
+            best = None
+            for index in sorted(pending):
+                distances = abs(finished_indices - np.array(index)).sum(axis=1)
+                nearest = int(np.argmin(distances))
+                if best is None or distances[nearest] < best[0]:
+                    best = (distances[nearest], index, tuple(int(i) for i in finished_indices[nearest]))
+            return best[1], best[2]
+
+        while cold_starts:
+            index = cold_starts.pop(0)
+            if index in pending:
+                return index, None
+        return None, None
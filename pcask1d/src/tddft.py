@@ -0,0 +1,336 @@
+# Distributed under the terms of the MIT License.
+
+"""
+Module that propagates the occupied bands in real time (time-dependent Hartree theory), e.g. for the
+optical response after a delta kick, or the dynamics driven by an external electric field. The
+occupancies are fixed at those of the ground state, and the Hartree potential is updated every time step.
+
+The default propagator is a Strang split-operator scheme, whose time step costs two FFTs per band (and
+two for the Hartree potential): the kinetic phase is applied in G-space, and the local potential phase
+in real space. Crank-Nicolson and Krylov (Lanczos) propagators of the full Hamiltonian are included for comparison.
+"""
+
+import numpy as np
+from scipy.linalg import eigh_tridiagonal
+from scipy.sparse.linalg import LinearOperator, gmres
+from .hamiltonian import Hamiltonian
+from .wavefunction import WavefunctionSet
+from .density import Density
+from .basis import pad, truncate
+from . import instrumentation
+from . import fft
+
+
+class TimePropagation:
+    r"""
+    An instance of this class is initialised with a params and the ground state bands, and creates an iterable
+    object whose iterations each advance the bands by output_every time steps of the time-dependent Kohn-Sham
+    equation :math:`i \partial_t \phi_{ik} = \hat{H}[\rho(t)] \phi_{ik}`, returning the time and the dipole
+    moment :math:`d(t) = \int x \rho(x, t) dx` of the electrons (with x the minimum image position in the cell).
+
+    The bands are propagated at every k-point of the full Monkhorst-Pack grid, as a perturbation breaks the
+    symmetry between k and -k on which the irreducible k-points rely.
+    """
+
+    propagators = ('split', 'crank-nicolson', 'krylov')
+
+    def __init__(self, params, wavefunctions, weights=None, propagator='split', dt=0.05, **kwargs):
+        r"""
+        Parameters:
+            * params (Parameters): input model for the system
+            * wavefunctions (WavefunctionSet): ground state bands and occupancies, e.g. SCF.wavefunctions
+            * weights (ndarray): weight of each k-point, default uniform weights summing to one
+            * propagator (str): 'split' (Strang split-operator), 'crank-nicolson' or 'krylov'
+            * dt (float): time step
+
+        Keyword arguments:
+            * kick (float): strength :math:`\kappa` of a delta kick :math:`e^{i \kappa x}` applied to the
+              bands at t = 0, default no kick
+            * field (function): time-dependent electric field E(t), coupled to the electrons in the length gauge
+              as the potential E(t) x, default no field
+            * output_every (int): number of time steps per iteration, i.e. between outputs of the dipole
+            * path (str): text file to which the time and dipole are written at each output, default none
+            * krylov_dim (int): dimension of the Krylov subspace of the krylov propagator, default 20
+            * tol (float): relative tolerance of the linear solver of the crank-nicolson propagator, default 1e-10
+        """
+
+        if params.method == 'hf':
+            # The exchange operator would have to be rebuilt from the orbitals at every time step
+            raise RuntimeError('Chosen method {} is not implemented for time propagation'.format(params.method))
+        if propagator not in self.propagators:
+            raise RuntimeError('Chosen propagator {} is not implemented'.format(propagator))
+
+        self._params = params
+        self._propagator = propagator
+        self._dt = dt
+        self._field = kwargs.get('field', None)
+        self._output_every = kwargs.get('output_every', 1)
+        self._krylov_dim = kwargs.get('krylov_dim', 20)
+        self._tol = kwargs.get('tol', 1e-10)
+
+        num_k_points = wavefunctions.shape[0]
+        if weights is None:
+            weights = np.ones(num_k_points) / num_k_points
+        self._k_points, self._weights, self._coefficients, self._occupancies = \
+            self._full_grid(params, wavefunctions, weights)
+        self._band_weights = self._weights[:, None] * self._occupancies
+
+        # Positions (minimum image) of the points of the grid and of the double grid
+        self._x = params.minimum_image(params.realspace_grid)
+        self._big_x = params.minimum_image(params.big_realspace_grid)
+        self._v_ext = fft.ifft(params.big_v_ext).real
+
+        self._time = 0.0
+        self._step = 0
+        self._times = []
+        self._dipoles = []
+        self._previous_density = None
+        self._output = open(kwargs['path'], 'w') if kwargs.get('path') else None
+
+        if kwargs.get('kick', 0):
+            self.kick(kwargs['kick'])
+
+    @classmethod
+    def from_scf(cls, params, scf, **kwargs):
+        """ Propagate the bands of a converged SCF, with the weights of its k-points
+
+        Parameters:
+            * params (Parameters): input model for the system
+            * scf (SCF): converged SCF, with its wavefunctions (i.e. run without a scheduler)
+
+        Keyword arguments:
+            * any arguments of TimePropagation, e.g. propagator, dt, kick
+        """
+
+        weights = params.k_point_weights / np.sum(params.k_point_weights)
+        return cls(params, scf.wavefunctions, weights, **kwargs)
+
+    @staticmethod
+    def _full_grid(params, wavefunctions, weights):
+        r""" The k-points and their weights, and the (n_k, n_bands, N) coefficients and (n_k, n_bands) occupancies
+        of the occupied bands (of both spins) on the full grid. A k-point whose partner -k is absent (symmetry
+        reduced sampling) represents both, with the bands :math:`\phi_{-k}(G) = \phi_k(-G)^*` at -k, and half
+        of the weight at each. """
+
+        occupied = (np.asarray(weights)[:, None, None] * wavefunctions.occupancies).any(axis=(0, 1))
+        num_bands = np.flatnonzero(occupied)[-1] + 1
+        k_points = np.asarray(wavefunctions.k_points, dtype=float)
+        coefficients = wavefunctions.coefficients[:, :, :num_bands].reshape(len(k_points), -1, params.num_planewaves)
+        occupancies = wavefunctions.occupancies[:, :, :num_bands].reshape(len(k_points), -1)
+
+        unpaired = np.array([not np.any(np.isclose(k_points, -k)) for k in k_points], dtype=bool)
+        weights = np.where(unpaired, 0.5, 1) * weights
+        reversed_coefficients = np.roll(coefficients[unpaired, :, ::-1], 1, axis=-1).conj()
+
+        return (np.concatenate((k_points, -k_points[unpaired])),
+                np.concatenate((weights, weights[unpaired])),
+                np.concatenate((coefficients, reversed_coefficients)).astype(complex),
+                np.concatenate((occupancies, occupancies[unpaired])))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        """ Advance the bands by output_every time steps, returning the time and the dipole moment """
+
+        for _ in range(self._output_every):
+            self.step()
+
+        dipole = self.dipole()
+        self._times.append(self._time)
+        self._dipoles.append(dipole)
+        if self._output is not None:
+            self._output.write('{0:.10f} {1:.16e}\n'.format(self._time, dipole))
+            self._output.flush()
+        return self._time, dipole
+
+    def run(self, num_steps):
+        """ Propagate for num_steps time steps, returning the (times, dipoles) of every output """
+        while self._step < num_steps:
+            next(self)
+        return np.array(self._times), np.array(self._dipoles)
+
+    def kick(self, strength):
+        r""" Apply a delta kick :math:`\phi(x) \rightarrow e^{i \kappa x} \phi(x)` to every band, as by a
+        field :math:`E(t) = -\kappa \delta(t)`, which excites all dipole allowed transitions at once """
+        phase = np.exp(1j*strength*self._x)
+        self._coefficients = fft.fft(phase * fft.ifft(self._coefficients, axis=-1), axis=-1)
+
+    @instrumentation.timed('tddft.step')
+    def step(self):
+        """ Advance the bands by a single time step of the chosen propagator """
+
+        if self._propagator == 'split':
+            self._split_step()
+        else:
+            density = self._density_coefficients(self._orbitals())
+            midpoint = density if self._previous_density is None else 1.5*density - 0.5*self._previous_density
+            self._previous_density = density
+            potential = self._local_potential(midpoint, self._time + 0.5*self._dt)
+
+            for i, k_point in enumerate(self._k_points):
+                hamiltonian = Hamiltonian(None, k_point=k_point, local_potential=potential)
+                if self._propagator == 'crank-nicolson':
+                    self._coefficients[i] = self._crank_nicolson(hamiltonian, self._coefficients[i].T).T
+                else:
+                    self._coefficients[i] = self._krylov(hamiltonian, self._coefficients[i].T).T
+
+        self._time += self._dt
+        self._step += 1
+
+    def _split_step(self):
+        r""" Strang split-operator step :math:`e^{-i T \Delta t/2} e^{-i v \Delta t} e^{-i T \Delta t/2}`. The
+        local potential is that of the density after the first kinetic half step, which the potential phase
+        leaves unchanged, such that the step is time-reversible. """
+
+        params = self._params
+        kinetic_phase = np.exp(-0.25j*self._dt*(params.planewave_grid[None, :] + self._k_points[:, None])**2)
+
+        self._coefficients *= kinetic_phase[:, None, :]
+        orbitals = self._orbitals()
+        potential = self._local_potential(self._density_coefficients(orbitals), self._time + 0.5*self._dt)
+        self._coefficients = self._potential_phase(potential, orbitals)
+        self._coefficients *= kinetic_phase[:, None, :]
+
+    def _potential_phase(self, potential, orbitals):
+        r""" The phase :math:`e^{-i v \Delta t}` of the local potential applied to the bands pointwise at the points of
+        the double grid, with one FFT per band to return to the basis. The truncation to the basis drops the part of
+        the product outside it, of order :math:`\Delta t^2` each step, so the bands are then orthonormalised.
+
+        Parameters:
+            * potential (ndarray): local potential on the double grid
+            * orbitals (ndarray): the bands on the double grid, see _orbitals
+        """
+
+        N = self._params.num_planewaves
+        coefficients = truncate(fft.fft(np.exp(-1j*self._dt*potential) * orbitals, axis=-1), N)
+        return self._orthonormalise(coefficients)
+
+    @staticmethod
+    def _orthonormalise(coefficients):
+        r""" Symmetric (Lowdin) orthonormalisation :math:`S^{-1/2} \Phi` of the (n_k, n_bands, N) bands at each
+        k-point, the orthonormal set closest to the bands """
+
+        overlap = np.einsum('kbn,kcn->kbc', coefficients, coefficients.conj())
+        eigenvalues, eigenvectors = np.linalg.eigh(overlap)
+        inverse_sqrt = (eigenvectors / np.sqrt(eigenvalues)[:, None, :]) @ eigenvectors.conj().transpose(0, 2, 1)
+        return inverse_sqrt @ coefficients
+
+    def _crank_nicolson(self, hamiltonian, block):
+        r""" Crank-Nicolson step :math:`(1 + i H \Delta t/2) \phi(t + \Delta t) = (1 - i H \Delta t/2) \phi(t)`,
+        solved for the (N, n_bands) block at once with GMRES, preconditioned with the kinetic energy """
+
+        params = self._params
+        shape = block.shape
+        kinetic = np.repeat(hamiltonian.kinetic(params), shape[1])
+
+        def apply(x):
+            x = x.reshape(shape)
+            return (x + 0.5j*self._dt*hamiltonian.apply(params, x)).ravel()
+
+        operator = LinearOperator((block.size, block.size), matvec=apply, dtype=complex)
+        preconditioner = LinearOperator((block.size, block.size), matvec=lambda x: x / (1 + 0.5j*self._dt*kinetic),
+                                        dtype=complex)
+        right_hand_side = (block - 0.5j*self._dt*hamiltonian.apply(params, block)).ravel()
+        solution, _ = gmres(operator, right_hand_side, x0=block.ravel(), rtol=self._tol, atol=0, M=preconditioner)
+        return solution.reshape(shape)
+
+    def _krylov(self, hamiltonian, block):
+        r""" Krylov step :math:`e^{-i H \Delta t} \phi`, with the exponential of the Lanczos tridiagonal matrix of each
+        band. The Lanczos iterations of the (N, n_bands) block run in lockstep, with one (batched) application of H
+        each. Accurate while :math:`||H|| \Delta t` is small compared with krylov_dim. """
+
+        params = self._params
+        dim = self._krylov_dim
+        norms = np.linalg.norm(block, axis=0)
+        basis = np.zeros((dim,) + block.shape, dtype=complex)
+        alpha = np.zeros((dim, block.shape[1]))
+        beta = np.zeros((dim, block.shape[1]))
+
+        basis[0] = block / norms
+        for j in range(dim):
+            w = hamiltonian.apply(params, basis[j])
+            alpha[j] = np.sum(basis[j].conj() * w, axis=0).real
+            # Full reorthogonalisation against the Lanczos vectors so far
+            w -= np.einsum('jnb,jb->nb', basis[:j + 1], np.einsum('jnb,nb->jb', basis[:j + 1].conj(), w))
+            beta[j] = np.linalg.norm(w, axis=0)
+            if j + 1 < dim:
+                # An invariant subspace (beta = 0) is exact, and ends the iterations of that band
+                invariant = beta[j] < 1e-12
+                beta[j, invariant] = 0
+                basis[j + 1] = np.where(invariant, 0, w / np.where(invariant, 1, beta[j]))
+
+        propagated = np.empty_like(block)
+        for b in range(block.shape[1]):
+            energies, vectors = eigh_tridiagonal(alpha[:, b], beta[:-1, b])
+            propagated[:, b] = norms[b] * basis[:, :, b].T @ (vectors @ (np.exp(-1j*self._dt*energies) * vectors[0]))
+        return propagated
+
+    def _orbitals(self):
+        """ The bands in real space on the double grid, scaled as the inverse FFT of the padded coefficients """
+        return fft.ifft(pad(self._coefficients, 2*self._params.num_planewaves), axis=-1)
+
+    def _density_coefficients(self, orbitals):
+        """ Coefficients of the density of the bands (see Density) from their orbitals on the double grid """
+        params = self._params
+        M = 2*params.num_planewaves
+        dx = params.cell / params.num_planewaves
+        density = (M**2 / (2*params.cell)) * np.einsum('kb,kbx->x', self._band_weights, abs(orbitals)**2)
+        return dx*fft.fft(density)
+
+    def _local_potential(self, density_coefficients, time):
+        """ The local potential on the double grid: external, Hartree and (if any) the applied field at a given time """
+        dx = self._params.cell / self._params.num_planewaves
+        potential = self._v_ext + fft.ifft(density_coefficients * self._params.hartree_kernel).real / dx
+        if self._field is not None:
+            potential = potential + self._field(time) * self._big_x
+        return potential
+
+    def dipole(self):
+        r""" The dipole moment :math:`\int x \rho(x) dx` of the electrons at the current time """
+        dx = self._params.cell / self._params.num_planewaves
+        density = fft.ifft(self._density_coefficients(self._orbitals())).real / dx
+        return dx * np.sum(self._big_x * density)
+
+    def close(self):
+        """ Close the output file (if any) """
+        if self._output is not None:
+            self._output.close()
+            self._output = None
+
+    @property
+    def density(self):
+        """ The density (Density) of the bands at the current time """
+        return Density(self._params, coeffs=self._density_coefficients(self._orbitals()))
+
+    @property
+    def wavefunctions(self):
+        """ The bands at the current time, as a WavefunctionSet on the full grid of k-points (see weights) """
+        shape = self._occupancies.shape
+        return WavefunctionSet(coefficients=self._coefficients[:, None], energies=np.zeros((shape[0], 1, shape[1])),
+                               occupancies=self._occupancies[:, None], band_indices=np.arange(shape[1]),
+                               k_points=self._k_points)
+
+    @property
+    def weights(self):
+        """ Weight of each k-point of the full grid """
+        return self._weights
+
+    @property
+    def norms(self):
+        """ The (n_k, n_bands) norms of the bands, which a unitary propagator conserves """
+        return np.linalg.norm(self._coefficients, axis=-1)
+
+    @property
+    def time(self):
+        return self._time
+
+    @property
+    def times(self):
+        """ Times of every output """
+        return np.array(self._times)
+
+    @property
+    def dipoles(self):
+        """ Dipole moment at every output """
+        return np.array(self._dipoles)
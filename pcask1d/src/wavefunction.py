@@ -1,77 +1,226 @@
 # Distributed under the terms of the MIT License.
 
 """
-Module that defines a single-particle wavefunction and its various properties
+Module that defines a single-particle wavefunction and its various properties,
+and the set of wavefunctions (bands) produced by diagonalising the Hamiltonian
 """
 
+import os
 import numpy as np
 from .density import Density
 
 
+class WavefunctionSet:
+    r""" This class represents a set of single-particle wavefunctions :math:`\phi_{ik}^\sigma (G)`, stored
+    in contiguous arrays. The plane-wave coefficients have shape (n_k, n_spin, n_bands, N), and the
+    energies and occupancies have shape (n_k, n_spin, n_bands). Individual bands are accessed as
+    Wavefunction objects, which are views of (not copies from) these arrays. """
+
+    # Arrays that make up a set, as written to disk
+    fields = ('coefficients', 'energies', 'occupancies', 'band_indices', 'k_points')
+
+    def __init__(self, params=None, num_k_points=1, num_spins=1, num_bands=1, **kwargs):
+        r"""
+        Parameters:
+            * params (Parameters): input model for the system, sets the number of plane-waves
+            * num_k_points (int): number of k-points
+            * num_spins (int): number of spin channels
+            * num_bands (int): number of bands at each k-point and spin
+
+        Keyword arguments:
+            * coefficients, energies, occupancies, band_indices, k_points (ndarray): existing arrays
+              from which the set is constructed (without copying), in place of zero initialised arrays.
+            * dtype (type): type of zero initialised coefficients, e.g. np.complex64 for bands computed
+              in single precision. Default complex.
+        """
+
+        if 'coefficients' in kwargs:
+            self._coefficients = kwargs['coefficients']
+            num_k_points, num_spins, num_bands = self._coefficients.shape[:3]
+        else:
+            N = len(params.planewave_grid)
+            self._coefficients = np.zeros((num_k_points, num_spins, num_bands, N), dtype=kwargs.get('dtype', complex))
+
+        shape = (num_k_points, num_spins, num_bands)
+        self._energies = kwargs.get('energies', np.zeros(shape))
+        self._occupancies = kwargs.get('occupancies', np.zeros(shape))
+        self._band_indices = kwargs.get('band_indices', np.arange(num_bands))
+        self._k_points = kwargs.get('k_points', np.zeros(num_k_points))
+
+    def __len__(self):
+        return self._energies.size
+
+    def __iter__(self):
+        """ Iterate over every band as a Wavefunction view, with the band index changing fastest """
+        for index in np.ndindex(*self.shape):
+            yield Wavefunction(None, wavefunction_set=self, index=index)
+
+    def __getitem__(self, index):
+        """ Slice the set along its (k-point, spin, band) axes. The result is a WavefunctionSet
+        that shares memory with this set. Integer indices keep their axis, e.g. set[0] is the set
+        of wavefunctions at the first k-point. """
+
+        if not isinstance(index, tuple):
+            index = (index,)
+        index = tuple(self._axis_slice(i, size) for i, size in zip(index, self.shape))
+        index += (slice(None),) * (3 - len(index))
+
+        return WavefunctionSet(coefficients=self._coefficients[index],
+                               energies=self._energies[index],
+                               occupancies=self._occupancies[index],
+                               band_indices=self._band_indices[index[2]],
+                               k_points=self._k_points[index[0]])
+
+    @staticmethod
+    def _axis_slice(i, size):
+        """ An integer index i of an axis of length size as the slice of length one that keeps the axis """
+        if not isinstance(i, (int, np.integer)):
+            return i
+        if not -size <= i < size:
+            raise IndexError('index {} is out of bounds for an axis of size {}'.format(i, size))
+        i = i % size
+        return slice(i, i + 1)
+
+    def __str__(self):
+        return 'Set of {2} bands at {0} k-point(s) and {1} spin(s)'.format(*self.shape)
+
+    def band(self, k=0, spin=0, band=0):
+        """ A single band as a Wavefunction view of the set """
+        return Wavefunction(None, wavefunction_set=self, index=(k, spin, band))
+
+    def eigenvectors(self, k=0, spin=0):
+        """ The (N, n_bands) eigenvectors at a given k-point and spin, as a view """
+        return self._coefficients[k, spin].T
+
+    @property
+    def shape(self):
+        """ (n_k, n_spin, n_bands) """
+        return self._energies.shape
+
+    @property
+    def num_planewaves(self):
+        return self._coefficients.shape[-1]
+
+    @property
+    def coefficients(self):
+        """ The (n_k, n_spin, n_bands, N) plane-wave coefficients """
+        return self._coefficients
+
+    @property
+    def energies(self):
+        """ The (n_k, n_spin, n_bands) single-particle energies """
+        return self._energies
+
+    @property
+    def occupancies(self):
+        """ The (n_k, n_spin, n_bands) occupancies """
+        return self._occupancies
+
+    @occupancies.setter
+    def occupancies(self, occupancies: np.ndarray):
+        self._occupancies[...] = occupancies
+
+    @property
+    def band_indices(self):
+        return self._band_indices
+
+    @property
+    def k_points(self):
+        return self._k_points
+
+    def save(self, directory):
+        """ Write the set to a directory, one .npy file per array """
+        os.makedirs(directory, exist_ok=True)
+        for field in self.fields:
+            np.save(os.path.join(directory, field + '.npy'), getattr(self, field))
+
+    @classmethod
+    def load(cls, directory, mmap_mode=None):
+        """ Read a set written by save. With mmap_mode='r' the arrays are memory-mapped,
+        such that only the bands that are accessed are read from disk. """
+        return cls(**{field: np.load(os.path.join(directory, field + '.npy'), mmap_mode=mmap_mode)
+                      for field in cls.fields})
+
+
 class Wavefunction:
-    """ This class represents a single-particle wavefunction :math:`\phi_{ik}^\sigma (G)`
+    r""" This class represents a single-particle wavefunction :math:`\phi_{ik}^\sigma (G)`
     with associated single-particle energy :math:`\varepsilon` and occupancy :math:`f_i`.
-    Each wavefunction has a spin :math:`\sigma`, k-point :math:`k`, and band index :math:`i`"""
+    Each wavefunction has a spin :math:`\sigma`, k-point :math:`k`, and band index :math:`i`.
+
+    A Wavefunction is a view of a single band of a WavefunctionSet. If constructed on its own,
+    it is backed by a set containing one band."""
 
     def __init__(self, params, **kwargs):
 
-        # Number of plane-waves
-        N = len(params.planewave_grid)
+        self._set = kwargs.get('wavefunction_set', None)
+        self._index = kwargs.get('index', (0, 0, 0))
 
-        self._pw_coefficients = kwargs.get('pw_coefficients', np.zeros(N, dtype=complex))
-        self._energy = kwargs.get('energy', 0)
-        self._k_point = kwargs.get('k_point', 0)
-        self._spin = kwargs.get('spin', 0)
-        self._band_index = kwargs.get('band_index', 0)
-        self._occupancy = kwargs.get('occupancy', 1)
+        if self._set is None:
+            self._set = WavefunctionSet(params, num_spins=kwargs.get('spin', 0) + 1)
+            self._index = (0, kwargs.get('spin', 0), 0)
+            if 'pw_coefficients' in kwargs:
+                self.pw_coefficients = kwargs['pw_coefficients']
+            self.energy = kwargs.get('energy', 0)
+            self.k_point = kwargs.get('k_point', 0)
+            self.band_index = kwargs.get('band_index', 0)
+            self.occupancy = kwargs.get('occupancy', 1)
 
     def __str__(self):
-        return 'Band {0} of system Hamiltonian with k-point {1}'.format(self._band_index, self._k_point)
+        return 'Band {0} of system Hamiltonian with k-point {1}'.format(self.band_index, self.k_point)
 
     @property
     def pw_coefficients(self):
         """ The plane-wave coefficients of the wavefunction """
-        return self._pw_coefficients
+        return self._set.coefficients[self._index]
 
     @pw_coefficients.setter
     def pw_coefficients(self, coeffs: np.ndarray) -> np.ndarray:
-        self._pw_coefficients = coeffs
+        self._set.coefficients[self._index] = coeffs
 
     @property
     def energy(self):
-        return self._energy
+        return self._set.energies[self._index]
 
     @energy.setter
     def energy(self, energy: float):
-        self._energy = energy
+        self._set.energies[self._index] = energy
 
     @property
     def k_point(self):
-        return self._k_point
+        return self._set.k_points[self._index[0]]
 
     @k_point.setter
     def k_point(self, k_point: float):
-        self._k_point = k_point
+        self._set.k_points[self._index[0]] = k_point
+
+    @property
+    def spin(self):
+        return self._index[1]
 
     @property
     def band_index(self):
-        return self._band_index
+        return self._set.band_indices[self._index[2]]
 
     @band_index.setter
     def band_index(self, band_index: int):
-        self._band_index = band_index
+        self._set.band_indices[self._index[2]] = band_index
 
     @property
     def occupancy(self):
-        return self._occupancy
+        return self._set.occupancies[self._index]
 
     @occupancy.setter
     def occupancy(self, occ: float):
-        self._occupancy = occ
+        self._set.occupancies[self._index] = occ
 
-    def get_density(self):
+    def get_density(self, params, weight=1):
         """ Obtain the (occupancy weighted) single-particle density
-         corresponding to a single-particle wavefunction """
-        #TODO: put wavefunction on big grid, pad with zeros, then FFT.
-        wavefunction = np.fft.ifft(self._pw_coefficients)
-        return Density(coeffs=self._occupancy * wavefunction.conj() * wavefunction)
+         corresponding to a single-particle wavefunction. The coefficients are zero-padded
+         onto the double grid, on which the density is exactly represented.
+
+        Parameters:
+            * params (Parameters): input model for the system
+            * weight (float): weight of the wavefunction's k-point in the BZ sum
+        """
+
+        return Density.from_wavefunctions(params, self._set[self._index], weights=[weight])
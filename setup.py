@@ -12,6 +12,6 @@ setup(
     author = 'Nick Woods',
     author_email = 'nw361@cam.ac.uk',
     url = "http://www.tcm.phy.cam.ac.uk/profiles/nw361/",
-    packages = find_packages(),
+    packages = find_packages(exclude=['benchmarks', 'benchmarks.*']),
     entry_points={'console_scripts': 'pcask1d = pcask1d.src.main:main'},
 )
\ No newline at end of file
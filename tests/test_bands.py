@@ -0,0 +1,49 @@
+""" Tests of the non-self-consistent band structure """
+
+import numpy as np
+import pytest
+from pcask1d.src.params import Parameters
+from pcask1d.src.scf import SCF
+from pcask1d.src.hamiltonian import Hamiltonian
+from pcask1d.src.bands import BandStructure, k_path
+
+
+@pytest.fixture(scope='module')
+def ground_state():
+    params = Parameters(method='h', cell=8, num_planewaves=101, species=['Li', 'H'], positions=[-1.9, 1.9],
+                        kpoint_grid=4, kpoint_symmetry=False, scf_tol=1e-11)
+    scf = SCF(params)
+    scf.run()
+    return params, scf
+
+
+@pytest.mark.parametrize('eigensolver', ['dense', 'lobpcg'])
+def test_bands_match_scf_eigenvalues(ground_state, eigensolver):
+    """ At the k-points of the SCF, the bands of the converged density are the eigenvalues of the SCF """
+
+    params, scf = ground_state
+    params = Parameters(**dict(params.inputs, eigensolver=eigensolver, eigensolver_tol=1e-8))
+    num_bands = scf.wavefunctions.shape[2]
+    energies = BandStructure(params, scf.density, params.k_points, num_bands=num_bands).run()
+    assert np.max(abs(energies - scf.wavefunctions.energies[:, 0])) < 1e-8
+
+
+def test_bands_are_written_to_file(ground_state, tmp_path):
+    """ The bands written to the .npy file are those returned """
+
+    params, scf = ground_state
+    path = str(tmp_path / 'bands.npy')
+    energies = BandStructure(params, scf.density, k_path(params, num_points=11), path=path).run()
+    assert np.array_equal(np.load(path), energies)
+
+
+def test_dense_stacks_match_lobpcg_along_path(ground_state):
+    """ The dense eigensolver, which diagonalises the path in stacks, agrees with LOBPCG along several stacks """
+
+    params, scf = ground_state
+    k_points = k_path(params, num_points=2*Hamiltonian.stack_size + 5)
+    energies = {}
+    for eigensolver in ('dense', 'lobpcg'):
+        params = Parameters(**dict(params.inputs, eigensolver=eigensolver, eigensolver_tol=1e-8))
+        energies[eigensolver] = BandStructure(params, scf.density, k_points).run()
+    assert np.max(abs(energies['dense'] - energies['lobpcg'])) < 1e-8
@@ -0,0 +1,29 @@
+""" Tests of the transfer of plane-wave coefficients between grids """
+
+import numpy as np
+import pytest
+from pcask1d.src.basis import pad, truncate, real_basis, complex_basis
+
+
+@pytest.mark.parametrize('n', [7, 8])
+def test_pad_interpolates_real_functions(n):
+    """ Zero-padding (by a factor two) keeps the values at the points of the grid, and keeps real functions real,
+    for grids of odd and even length (whose Nyquist frequency is split) """
+
+    values = np.random.default_rng(0).standard_normal(n)
+    padded = np.fft.ifft(pad(np.fft.fft(values), 2*n)) * 2
+
+    assert np.max(abs(padded.imag)) < 1e-14
+    assert np.allclose(padded.real[::2], values, rtol=0, atol=1e-14)
+
+
+def test_truncate_inverts_pad():
+    coefficients = np.random.default_rng(1).standard_normal((3, 9)) + 0j
+    assert np.array_equal(truncate(pad(coefficients, 21), 9), coefficients)
+
+
+def test_real_basis_round_trip():
+    coefficients = np.fft.fft(np.random.default_rng(2).standard_normal(9))
+    real_coefficients = real_basis(coefficients)
+    assert np.max(abs(real_coefficients.imag)) < 1e-14
+    assert np.allclose(complex_basis(real_coefficients), coefficients)
@@ -0,0 +1,49 @@
+""" Tests of the cache of converged results """
+
+import numpy as np
+from pcask1d.src.params import Parameters
+from pcask1d.src.cache import ResultCache, cached_scf, scf_result
+
+INPUTS = dict(method='h', cell=8, num_planewaves=201, species=['H', 'H'], positions=[-0.7, 0.7])
+
+
+def test_equal_parameters_share_a_result(tmp_path):
+    """ A result is found by Parameters equal to those it was stored for, in memory and on disk """
+
+    cache = ResultCache(directory=str(tmp_path))
+    result = cached_scf(Parameters(**INPUTS), cache)
+    assert cache.misses == 1
+
+    assert np.array_equal(cached_scf(Parameters(**INPUTS), cache)['density'], result['density'])
+    assert ResultCache(directory=str(tmp_path)).get(Parameters(**INPUTS))['iterations'] == result['iterations']
+    assert cache.hits == 1
+
+
+def test_result_holds_the_energy(tmp_path):
+    """ The total energy and its terms are cached with the density """
+
+    cache = ResultCache(directory=str(tmp_path))
+    result = cached_scf(Parameters(**INPUTS), cache)
+    stored = ResultCache(directory=str(tmp_path)).get(Parameters(**INPUTS))
+
+    terms = [name for name in result if name.startswith('energy.')]
+    assert 'energy.total' in terms and 'energy.hartree' in terms
+    assert stored['energy'] == result['energy'] == result['energy.total']
+    assert np.isclose(sum(stored[name] for name in terms if name != 'energy.total'), stored['energy'])
+
+
+def test_unconverged_results_are_not_cached(tmp_path):
+    params = Parameters(scf_max_iterations=2, **INPUTS)
+    result = scf_result(params)
+    assert not result['converged']
+
+    cache = ResultCache(directory=str(tmp_path))
+    cache.put(params, result)
+    assert params not in cache
+    assert cache.get(params) is None
+
+
+def test_digest_is_computed_once():
+    params = Parameters(**INPUTS)
+    assert params.digest is params.digest
+    assert len({params, Parameters(**INPUTS)}) == 1
@@ -0,0 +1,62 @@
+""" Tests of checkpointing and restarting an SCF calculation """
+
+import numpy as np
+import pytest
+from pcask1d.src.params import Parameters
+from pcask1d.src.scf import SCF
+from pcask1d.src.checkpoint import Checkpoint
+
+
+@pytest.mark.parametrize('inputs', [dict(method='h', species=['Li', 'H'], positions=[0, 10]),
+                                    dict(method='hf', cell=8, num_planewaves=201, species=['H', 'H'],
+                                         positions=[-0.7, 0.7], kpoint_grid=3, scf_tol=1e-10)],
+                         ids=['hartree', 'hartree-fock'])
+def test_converged_restart_performs_no_iterations(tmp_path, inputs):
+    """ An SCF restarted from the checkpoint of a converged SCF is converged, with the same energy """
+
+    path = str(tmp_path / 'scf.chk')
+    scf = SCF(Parameters(**inputs), checkpoint=path)
+    scf.run()
+    assert scf.converged
+
+    restarted = SCF.restart(path)
+    restarted.run()
+    assert restarted.converged
+    assert restarted.iteration == scf.iteration
+    assert restarted.energy == scf.energy
+    assert restarted.exchange_energy == scf.exchange_energy
+
+
+def test_restart_continues_to_the_same_density(tmp_path):
+    """ An SCF restarted from an intermediate checkpoint converges to the density of an uninterrupted SCF """
+
+    params = Parameters(method='h', species=['Li', 'H'], positions=[0, 10])
+    path = str(tmp_path / 'scf.chk')
+    scf = SCF(params, checkpoint=path, checkpoint_interval=5)
+    for _ in range(10):
+        next(scf)
+
+    restarted = SCF.restart(path)
+    restarted.run()
+    reference = SCF(params)
+    reference.run()
+
+    assert restarted.converged
+    assert np.max(abs(restarted.density.coefficients - reference.density.coefficients)) < 1e-8
+
+
+def harmonic(x):
+    return 0.5*(0.25**2)*x**2
+
+
+def test_manual_potential_restores_equal_parameters(tmp_path):
+    """ A manual_v_ext is restored from its values on the double grid, to Parameters equal to the original """
+
+    params = Parameters(method='h', manual_v_ext=harmonic, species=['H', 'H'], positions=[0, 1], num_planewaves=201)
+    path = str(tmp_path / 'scf.chk')
+    SCF(params, checkpoint=path).run()
+
+    restored = Checkpoint(path).params
+    assert np.array_equal(restored.big_v_ext, params.big_v_ext)
+    assert restored == params
+    assert SCF.restart(path).converged
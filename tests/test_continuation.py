@@ -0,0 +1,43 @@
+""" Tests of the basis-set continuation """
+
+import numpy as np
+import pytest
+from pcask1d.src.params import Parameters
+from pcask1d.src.scf import SCF
+from pcask1d.src.continuation import BasisContinuation
+
+INPUTS = dict(method='h', cell=8, species=['Li', 'H'], positions=[-1.9, 1.9], scf_tol=1e-10)
+
+
+@pytest.mark.parametrize('energy_tol, final_planewaves', [(3e-2, 279), (1e-8, 401)])
+def test_continuation_matches_direct_scf(monkeypatch, energy_tol, final_planewaves):
+    """ The ladder, whether it stops early or reaches the largest basis, converges to the SCF on its final basis """
+
+    monkeypatch.setattr(BasisContinuation, 'ladder_threshold', 0)
+    continuation = BasisContinuation(Parameters(num_planewaves=401, **INPUTS), energy_tol=energy_tol,
+                                     initial_planewaves=51)
+    params = continuation.run()
+    assert len(continuation.num_planewaves) > 1
+    assert params.num_planewaves == final_planewaves
+
+    scf = SCF(params)
+    scf.run()
+    assert abs(continuation.energies[-1] - scf.energy) < 1e-9
+    assert np.max(abs(continuation.scf.density.coefficients - scf.density.coefficients)) < 1e-8
+
+
+def test_number_of_bases_is_bounded(monkeypatch):
+    monkeypatch.setattr(BasisContinuation, 'ladder_threshold', 0)
+    continuation = BasisContinuation(Parameters(num_planewaves=401, **INPUTS), energy_tol=1e-12,
+                                     initial_planewaves=11, max_rungs=3)
+    continuation.run()
+    assert len(continuation.num_planewaves) == 3
+    assert continuation.num_planewaves[-1] == 401
+
+
+def test_small_basis_skips_the_ladder():
+    """ Below the ladder threshold, the SCF is converged on the largest basis directly """
+
+    continuation = BasisContinuation(Parameters(num_planewaves=201, **INPUTS))
+    params = continuation.run()
+    assert continuation.num_planewaves == [201] and params.num_planewaves == 201
@@ -0,0 +1,43 @@
+""" Tests of the exact exchange operator and its adaptive compression """
+
+import numpy as np
+import pytest
+from pcask1d.src.params import Parameters
+from pcask1d.src.scf import SCF
+from pcask1d.src.exchange import ExchangeOperator
+
+
+@pytest.fixture(scope='module')
+def ground_state():
+    params = Parameters(method='hf', cell=8, num_planewaves=101, species=['H', 'H'], positions=[-0.7, 0.7],
+                        kpoint_grid=3, scf_tol=1e-10)
+    scf = SCF(params)
+    scf.run()
+    return params, scf
+
+
+def exchange_operator(params, scf):
+    weights = params.k_point_weights / np.sum(params.k_point_weights)
+    return ExchangeOperator(params, scf.wavefunctions, weights)
+
+
+def test_operator_is_hermitian(ground_state):
+    """ The exact exchange operator at a k-point is Hermitian """
+
+    params, scf = ground_state
+    exchange = exchange_operator(params, scf)
+    rng = np.random.default_rng(0)
+    k_point = params.k_points[1]
+    x, y = rng.standard_normal((2, params.num_planewaves)) + 1j*rng.standard_normal((2, params.num_planewaves))
+    assert abs(np.vdot(x, exchange.apply(params, y, k_point)) - np.vdot(exchange.apply(params, x, k_point), y)) < 1e-10
+
+
+def test_compressed_operator_agrees_on_the_orbitals(ground_state):
+    """ The compressed operator agrees with the exact operator on the orbitals from which it is constructed """
+
+    params, scf = ground_state
+    exchange = exchange_operator(params, scf)
+    for index, k_point in enumerate(scf.wavefunctions.k_points):
+        orbitals = scf.wavefunctions.eigenvectors(index)
+        ace = exchange.compress(params, k_point)
+        assert np.max(abs(ace.apply(params, orbitals) - exchange.apply(params, orbitals, k_point))) < 1e-10
@@ -0,0 +1,76 @@
+""" Tests of the pluggable FFT backends """
+
+import numpy as np
+import pytest
+from pcask1d.src import fft
+from pcask1d.src.params import Parameters
+from pcask1d.src.scf import SCF
+
+BACKENDS = [pytest.param(backend, marks=pytest.mark.skipif(backend == 'pyfftw' and fft.pyfftw is None,
+                                                           reason='pyFFTW is not installed'))
+            for backend in fft.BACKENDS]
+
+
+@pytest.fixture
+def backend(request):
+    """ Select a backend for the duration of a test, restoring the previous backend afterwards """
+    previous = fft.backend()
+    fft.set_backend(request.param)
+    yield request.param
+    fft.set_backend(previous)
+
+
+@pytest.mark.parametrize('backend', BACKENDS, indirect=True)
+@pytest.mark.parametrize('dtype', [np.complex128, np.complex64])
+@pytest.mark.parametrize('axis', [0, -1])
+def test_complex_transforms_match_numpy(backend, dtype, axis):
+    rng = np.random.default_rng(0)
+    a = (rng.standard_normal((6, 10)) + 1j*rng.standard_normal((6, 10))).astype(dtype)
+    tol = 1e-4 if dtype == np.complex64 else 1e-12
+    for _ in range(2):
+        # The second call reuses any cached plan
+        assert np.max(abs(fft.fft(a, axis=axis) - np.fft.fft(a, axis=axis))) < tol
+        assert np.max(abs(fft.ifft(a, axis=axis) - np.fft.ifft(a, axis=axis))) < tol
+
+
+@pytest.mark.parametrize('backend', BACKENDS, indirect=True)
+@pytest.mark.parametrize('n', [10, 11])
+def test_real_transforms_match_numpy(backend, n):
+    a = np.random.default_rng(1).standard_normal((3, n))
+    half = fft.rfft(a)
+    assert np.max(abs(half - np.fft.rfft(a))) < 1e-12
+    assert np.max(abs(fft.irfft(half, n=n) - a)) < 1e-12
+
+
+@pytest.mark.parametrize('backend', BACKENDS, indirect=True)
+def test_results_are_not_overwritten(backend):
+    """ The result of a transform is not overwritten by the next transform of the same shape """
+    first = fft.fft(np.ones(8))
+    fft.fft(np.arange(8.0))
+    assert np.allclose(first, np.fft.fft(np.ones(8)))
+
+
+@pytest.mark.parametrize('backend', BACKENDS, indirect=True)
+def test_scf_energy_is_independent_of_backend(backend):
+    params = Parameters(method='h', cell=8, num_planewaves=101, species=['Li', 'H'], positions=[-1.9, 1.9],
+                        scf_tol=1e-11)
+    scf = SCF(params)
+    scf.run()
+    fft.set_backend('numpy')
+    reference = SCF(params)
+    reference.run()
+    assert abs(scf.energy - reference.energy) < 1e-10
+
+
+def test_unknown_backend_fails():
+    with pytest.raises(RuntimeError, match='not implemented'):
+        fft.set_backend('fftpack')
+
+
+def test_unavailable_backend_fails(monkeypatch):
+    """ Selecting pyFFTW without it installed fails, and leaves the backend unchanged """
+    monkeypatch.setattr(fft, 'pyfftw', None)
+    previous = fft.backend()
+    with pytest.raises(RuntimeError, match='requires pyFFTW'):
+        fft.set_backend('pyfftw')
+    assert fft.backend() == previous
@@ -0,0 +1,45 @@
+""" Tests of the forces on the ions and the geometry relaxation """
+
+import numpy as np
+import pytest
+from pcask1d.src.params import Parameters
+from pcask1d.src.scf import SCF
+from pcask1d.src.forces import ionic_forces
+from pcask1d.src.relax import Relaxation
+
+INPUTS = dict(method='h', cell=8, num_planewaves=201, species=['Li', 'H'], scf_temperature=3000, kpoint_grid=4,
+              scf_tol=1e-12)
+
+
+def energy(positions):
+    scf = SCF(Parameters(positions=list(positions), **INPUTS))
+    scf.run()
+    return scf.energy
+
+
+def test_forces_match_finite_differences():
+    """ The Hellmann-Feynman forces are minus the derivative of the total (free) energy """
+
+    positions = np.array([-1.9, 1.9])
+    params = Parameters(positions=list(positions), **INPUTS)
+    forces = ionic_forces(params, SCF(params).run())
+
+    h = 1e-3
+    for a in range(len(positions)):
+        displacement = h*np.eye(len(positions))[a]
+        finite_difference = -(energy(positions + displacement) - energy(positions - displacement)) / (2*h)
+        assert abs(forces[a] - finite_difference) < 1e-6
+
+
+def test_forces_sum_to_zero():
+    params = Parameters(positions=[-1.9, 1.9], **INPUTS)
+    assert abs(np.sum(ionic_forces(params, SCF(params).run()))) < 1e-8
+
+
+@pytest.mark.parametrize('method', ['bfgs', 'fire'])
+def test_relaxation_converges(method):
+    params = Parameters(method='h', cell=8, num_planewaves=201, species=['H', 'H'], positions=[0, 1.6])
+    relaxation = Relaxation(params, method=method, force_tol=1e-3)
+    relaxation.run()
+    assert relaxation.converged
+    assert np.max(abs(relaxation.ionic_forces)) < 1e-3
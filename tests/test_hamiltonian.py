@@ -0,0 +1,102 @@
+""" Tests of the Hamiltonian and its eigensolvers """
+
+import numpy as np
+import pytest
+from pcask1d.src.params import Parameters
+from pcask1d.src.density import Density
+from pcask1d.src import hamiltonian as hamiltonian_module
+from pcask1d.src.hamiltonian import Hamiltonian
+from pcask1d.src.eigensolver import lowest_eigenpairs
+from pcask1d.src.basis import real_basis
+
+INPUTS = dict(method='h', cell=8, num_planewaves=101, species=['Li', 'H'], positions=[-1.9, 1.9], kpoint_grid=4)
+
+
+@pytest.fixture(scope='module')
+def params():
+    return Parameters(**INPUTS)
+
+
+@pytest.fixture(scope='module')
+def density(params):
+    return Density(params)
+
+
+def test_apply_matches_representation(params, density):
+    """ The matrix-free action of the Hamiltonian agrees with its dense representation """
+
+    hamiltonian = Hamiltonian(density, k_point=params.k_points[1])
+    rng = np.random.default_rng(0)
+    block = rng.standard_normal((params.num_planewaves, 3)) + 1j*rng.standard_normal((params.num_planewaves, 3))
+    assert np.max(abs(hamiltonian.apply(params, block) - hamiltonian.representation(params) @ block)) < 1e-10
+
+
+def test_real_apply_matches_representation(params, density):
+    """ The action of the Gamma point Hamiltonian in the real basis agrees with its real representation """
+
+    hamiltonian = Hamiltonian(density)
+    block = np.random.default_rng(1).standard_normal((params.num_planewaves, 3))
+    assert np.max(abs(hamiltonian.real_apply(params, block) - hamiltonian.real_representation(params) @ block)) < 1e-10
+
+
+@pytest.mark.parametrize('k_index', [0, 1])
+def test_lobpcg_matches_dense(density, k_index):
+    """ The lowest eigenvalues from LOBPCG agree with those of the dense eigensolver """
+
+    energies = {}
+    for eigensolver in ('dense', 'lobpcg'):
+        params = Parameters(eigensolver=eigensolver, eigensolver_tol=1e-8, **INPUTS)
+        hamiltonian = Hamiltonian(density, k_point=params.k_points[k_index])
+        energies[eigensolver] = hamiltonian.eigendecomposition(params, 4).energies[0, 0]
+    assert np.max(abs(energies['lobpcg'] - energies['dense'])) < 1e-12
+
+
+def test_real_arithmetic_matches_complex(density):
+    """ The Gamma point bands computed with real arithmetic agree with those computed with complex arithmetic """
+
+    wavefunctions = {}
+    for gamma_only in (True, False):
+        params = Parameters(gamma_only=gamma_only, **dict(INPUTS, kpoint_grid=1))
+        wavefunctions[gamma_only] = Hamiltonian(density).eigendecomposition(params, 4)
+
+    assert np.max(abs(wavefunctions[True].energies - wavefunctions[False].energies)) < 1e-10
+    # The real bands are those of real functions, and agree with the complex bands up to a phase
+    assert np.max(abs(real_basis(wavefunctions[True].coefficients).imag)) < 1e-10
+    overlaps = np.sum(wavefunctions[True].coefficients.conj() * wavefunctions[False].coefficients, axis=-1)
+    assert np.allclose(abs(overlaps), 1)
+
+
+@pytest.mark.parametrize('num_states', [4, 'all'])
+def test_stack_matches_single_k_points(params, density, num_states):
+    """ Stacked (batched) diagonalisation agrees with a diagonalisation at each k-point, both when a few and when
+    all of the eigenpairs are computed, and with the k-points split over several stacks """
+
+    stack = Hamiltonian(density).eigendecomposition_stack(params, params.k_points, num_states, chunk_size=1)
+    for i, k_point in enumerate(params.k_points):
+        single = Hamiltonian(density, k_point=k_point).eigendecomposition(params, num_states)
+        assert np.max(abs(stack.energies[i] - single.energies[0])) < 1e-10
+
+
+def test_single_precision_matches_double(params, density):
+    """ The bands in single precision agree with those in double precision to the single precision tolerance """
+
+    wavefunctions = {precision: Hamiltonian(density, k_point=params.k_points[1], precision=precision)
+                     .eigendecomposition(params, 4) for precision in ('single', 'double')}
+    assert wavefunctions['single'].coefficients.dtype == np.complex64
+    assert np.max(abs(wavefunctions['single'].energies - wavefunctions['double'].energies)) < 1e-4
+
+
+def test_unconverged_lobpcg_falls_back_to_dense(density, monkeypatch):
+    """ Eigenpairs that LOBPCG does not converge are replaced by those of the dense eigensolver, with a warning """
+
+    def truncated(*args, **kwargs):
+        return lowest_eigenpairs(*args, **dict(kwargs, maxiter=1))
+
+    params = Parameters(eigensolver='dense', **INPUTS)
+    dense = Hamiltonian(density, k_point=params.k_points[1]).eigendecomposition(params, 4)
+
+    monkeypatch.setattr(hamiltonian_module, 'lowest_eigenpairs', truncated)
+    params = Parameters(eigensolver='lobpcg', eigensolver_tol=1e-10, **INPUTS)
+    with pytest.warns(UserWarning, match='LOBPCG did not converge'):
+        lobpcg = Hamiltonian(density, k_point=params.k_points[1]).eigendecomposition(params, 4)
+    assert np.max(abs(lobpcg.energies - dense.energies)) < 1e-12
@@ -0,0 +1,86 @@
+""" Tests of the timing and counter instrumentation """
+
+import io
+import json
+import pytest
+from pcask1d.src import instrumentation
+from pcask1d.src.params import Parameters
+from pcask1d.src.scf import SCF
+from pcask1d.src.main import main
+
+INPUTS = dict(method='h', cell=8, num_planewaves=101, species=['Li', 'H'], positions=[-1.9, 1.9], kpoint_grid=4,
+              eigensolver='lobpcg')
+
+
+@pytest.fixture
+def stream():
+    stream = io.StringIO()
+    instrumentation.enable(stream=stream)
+    yield stream
+    instrumentation.disable()
+
+
+@instrumentation.timed('test.function')
+def function():
+    instrumentation.count('test.counter', 2)
+
+
+def test_timers_and_counters_aggregate(stream):
+    """ Calls are counted and timed under their name until the next report, which writes a JSON line and resets """
+
+    for _ in range(3):
+        function()
+    with instrumentation.region('test.region'):
+        function()
+
+    record = instrumentation.report(iteration=1)
+    assert record['iteration'] == 1
+    assert record['timers']['test.function']['calls'] == 4
+    assert record['timers']['test.region']['calls'] == 1
+    assert record['timers']['test.region']['time'] >= 0
+    assert record['counters'] == {'test.counter': 8}
+    assert 'peak_memory' not in record
+    assert json.loads(stream.getvalue()) == json.loads(json.dumps(record))
+
+    assert instrumentation.stats() == {'timers': {}, 'counters': {}}
+
+
+def test_disabled_instrumentation_records_nothing():
+    function()
+    assert not instrumentation.is_enabled()
+    assert instrumentation.report(iteration=1) is None
+    assert instrumentation.stats() == {'timers': {}, 'counters': {}}
+
+
+def test_memory_tracking_is_optional():
+    instrumentation.enable(memory=True)
+    try:
+        function()
+        assert instrumentation.report()['peak_memory'] > 0
+    finally:
+        instrumentation.disable()
+
+
+def test_scf_reports_each_iteration(stream):
+    """ The SCF writes a record per iteration, with the calls of that iteration alone """
+
+    params = Parameters(**INPUTS)
+    scf = SCF(params)
+    scf.run()
+
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [record['iteration'] for record in records] == list(range(1, scf.iteration + 1))
+    assert records[-1]['residual_norm'] == scf.residual_norm
+    for record in records:
+        assert record['timers']['scf.iteration']['calls'] == 1
+        assert record['timers']['scf.kohn_sham_map']['calls'] == 1
+        assert record['timers']['hamiltonian.eigendecomposition']['calls'] == len(params.k_points)
+        assert record['counters']['fft'] > 0
+
+
+def test_cli_writes_instrumentation(tmp_path):
+    path = tmp_path / 'instrument.jsonl'
+    assert main(['scf', '--set', 'num_planewaves', '51', '--instrument', str(path)]) == 0
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert len(records) > 0 and all('timers' in record for record in records)
+    assert not instrumentation.is_enabled()
@@ -0,0 +1,80 @@
+""" Tests of the input files, job lists and batches of jobs """
+
+import io
+import json
+import pytest
+from pcask1d.src import jobs
+
+PARAMS = {'method': 'h', 'species': ['H', 'H'], 'positions': [-0.7, 0.7], 'cell': 8, 'num_planewaves': 51}
+
+TOML = """
+[params]
+method = 'h'
+species = ['H', 'H']
+positions = [-0.7, 0.7]
+cell = 8
+num_planewaves = 51
+
+[[jobs]]
+task = 'scf'
+
+[[jobs]]
+name = 'stretched'
+params = {positions = [-1, 1]}
+task = 'scf'
+"""
+
+
+def test_toml_and_json_inputs_agree(tmp_path):
+    """ An input file holds the shared inputs and a list of jobs, each overriding inputs of Parameters """
+
+    (tmp_path / 'input.toml').write_text(TOML)
+    (tmp_path / 'input.json').write_text(json.dumps({'params': PARAMS, 'jobs': [
+        {'task': 'scf'}, {'name': 'stretched', 'params': {'positions': [-1, 1]}, 'task': 'scf'}]}))
+
+    expanded = jobs.jobs(jobs.load(str(tmp_path / 'input.toml')))
+    assert expanded == jobs.jobs(jobs.load(str(tmp_path / 'input.json')))
+    assert [job['name'] for job in expanded] == ['scf-0', 'stretched']
+    assert expanded[0]['params'] == PARAMS
+    assert expanded[1]['params'] == dict(PARAMS, positions=[-1, 1])
+
+
+def test_single_job_input():
+    """ An input file without a list of jobs is a single job, with its options at the top level """
+
+    expanded = jobs.jobs({'params': PARAMS, 'task': 'bands', 'num_bands': 4})
+    assert expanded == [{'name': 'bands-0', 'task': 'bands', 'params': PARAMS, 'options': {'num_bands': 4}}]
+
+
+def test_unknown_task():
+    with pytest.raises(RuntimeError, match='not implemented'):
+        jobs.jobs({'params': PARAMS, 'task': 'md'})
+
+
+def test_job_list(tmp_path, monkeypatch):
+    """ A job list names an input file per line, skipping blank lines and comments """
+
+    (tmp_path / 'jobs.txt').write_text('# comment\na.toml\n\n  b.json  \n')
+    assert jobs.job_list(str(tmp_path / 'jobs.txt')) == ['a.toml', 'b.json']
+    monkeypatch.setattr('sys.stdin', io.StringIO('c.toml\n'))
+    assert jobs.job_list('-') == ['c.toml']
+
+
+def test_batch_records_failures_and_continues(tmp_path):
+    """ A batch records the error of an unreadable input file and of a failed job, and runs the other jobs """
+
+    (tmp_path / 'broken.json').write_text('{')
+    (tmp_path / 'input.json').write_text(json.dumps({'params': PARAMS, 'jobs': [
+        {'task': 'scf', 'params': {'num_planewaves': 50}}, {'task': 'scf'}]}))
+    paths = [str(tmp_path / 'broken.json'), str(tmp_path / 'missing.json'), str(tmp_path / 'input.json')]
+
+    stream = io.StringIO()
+    assert jobs.run(paths, stream, keep_going=True) == 3
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [record['input'] for record in records] == paths[:2] + paths[2:]*2
+    assert [('error' in record) for record in records] == [True, True, True, False]
+    assert records[1]['error'].startswith('FileNotFoundError')
+    assert records[3]['converged'] and records[3]['name'] == 'scf-1'
+
+    with pytest.raises(json.JSONDecodeError):
+        jobs.run(paths, io.StringIO())
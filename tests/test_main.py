@@ -0,0 +1,40 @@
+""" Tests of the command line interface """
+
+import json
+import pytest
+from pcask1d.src.main import main
+from pcask1d.src.params import Parameters
+from pcask1d.src.scf import SCF
+
+SETTINGS = ['--set', 'species', '["H", "H"]', '--set', 'positions', '[-0.7, 0.7]', '--set', 'cell', '8',
+            '--set', 'num_planewaves', '51']
+
+
+def test_unknown_task_fails_with_usage(capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        main(['scff'])
+    assert exit_info.value.code != 0
+    assert 'usage: pcask1d' in capsys.readouterr().err
+
+
+def test_scf_task_honours_set(capsys):
+    assert main(['scf'] + SETTINGS) == 0
+    scf = SCF(Parameters(method='h', species=['H', 'H'], positions=[-0.7, 0.7], cell=8, num_planewaves=51))
+    scf.run()
+    assert '{0:.10f}'.format(scf.energy) in capsys.readouterr().out
+
+
+def test_run_and_batch_tasks(tmp_path):
+    """ The run task writes a record per job, and the batch task exits with a non-zero status if a job failed """
+
+    (tmp_path / 'input.json').write_text(json.dumps({'params': {'method': 'h', 'species': ['H', 'H'],
+                                                                'positions': [-0.7, 0.7], 'num_planewaves': 51},
+                                                     'task': 'scf'}))
+    (tmp_path / 'jobs.txt').write_text('{0}\n{1}\n'.format(tmp_path / 'input.json', tmp_path / 'missing.json'))
+
+    output = tmp_path / 'results.jsonl'
+    assert main(['run', str(tmp_path / 'input.json'), '--output', str(output)]) == 0
+    assert json.loads(output.read_text())['converged']
+
+    assert main(['batch', str(tmp_path / 'jobs.txt'), '--output', str(output)]) == 1
+    assert ['error' in json.loads(line) for line in output.read_text().splitlines()] == [False, True]
@@ -0,0 +1,89 @@
+""" Tests of the Fermi level and the smeared occupancies """
+
+import numpy as np
+import pytest
+from pcask1d.src.params import Parameters
+from pcask1d.src.scf import SCF
+from pcask1d.src.occupancy import SMEARING_SCHEMES, occupation, entropy, fermi_level, aufbau
+
+SMEARED_SCHEMES = [scheme for scheme in SMEARING_SCHEMES if scheme != 'none']
+
+
+@pytest.fixture
+def bands():
+    """ (n_k, n_spin, n_bands) band energies and the weights of the k-points """
+    rng = np.random.default_rng(0)
+    energies = np.sort(rng.uniform(-1, 1, (4, 1, 6)), axis=-1)
+    return energies, np.array([1, 2, 2, 1]) / 6
+
+
+@pytest.mark.parametrize('scheme', SMEARED_SCHEMES)
+@pytest.mark.parametrize('num_electrons', [1, 3.5, 5])
+def test_fermi_level_conserves_electrons(bands, scheme, num_electrons):
+    energies, weights = bands
+    width = 0.05
+    mu = fermi_level(energies, weights, num_electrons, width, scheme)
+    occupancies = occupation((mu - energies) / width, scheme)
+    assert abs(np.sum(weights[:, None, None] * occupancies) - num_electrons) < 1e-10
+
+
+def test_aufbau_fills_lowest_states(bands):
+    """ At zero smearing, the lowest states are filled, with a partially occupied highest state """
+
+    energies, weights = bands
+    occupancies, highest = aufbau(energies, weights, 3.5)
+    assert abs(np.sum(weights[:, None, None] * occupancies) - 3.5) < 1e-12
+    assert np.all(occupancies[energies < highest] == 1) and np.all(occupancies[energies > highest] == 0)
+
+
+@pytest.mark.parametrize('scheme', SMEARED_SCHEMES)
+def test_entropy_is_consistent_with_occupation(scheme):
+    r""" The generalised entropy satisfies :math:`s'(x) = -x f'(x)`, and vanishes far from the Fermi level """
+
+    x = np.linspace(-6, 6, 1201)
+    h = 1e-5
+    derivative = (entropy(x + h, scheme) - entropy(x - h, scheme)) / (2*h)
+    occupation_derivative = (occupation(x + h, scheme) - occupation(x - h, scheme)) / (2*h)
+    assert np.max(abs(derivative + x*occupation_derivative)) < 1e-8
+    assert np.max(abs(entropy(np.array([-40.0, 40.0]), scheme))) < 1e-12
+
+
+@pytest.mark.parametrize('scheme', SMEARED_SCHEMES)
+def test_grand_potential_derivative_is_electron_count(bands, scheme):
+    r""" With the entropy term, the grand potential :math:`\Omega(\mu) = \sum_k w_k \sum_i [(\varepsilon_{ik} - \mu)
+    f_{ik} - \sigma s_{ik}]` satisfies :math:`d\Omega / d\mu = -N(\mu)`, i.e. the free energy is variational in the
+    occupancies """
+
+    energies, weights = bands
+    width = 0.05
+
+    def sums(mu):
+        x = (mu - energies) / width
+        band_weights = weights[:, None, None]
+        grand_potential = np.sum(band_weights * ((energies - mu)*occupation(x, scheme) - width*entropy(x, scheme)))
+        return grand_potential, np.sum(band_weights * occupation(x, scheme))
+
+    h = 1e-6
+    for mu in np.linspace(-0.5, 0.5, 11):
+        derivative = (sums(mu + h)[0] - sums(mu - h)[0]) / (2*h)
+        assert abs(derivative + sums(mu)[1]) < 1e-7
+
+
+@pytest.mark.parametrize('scheme', SMEARING_SCHEMES)
+def test_scf_conserves_electrons(scheme):
+    r""" The SCF occupancies of every scheme hold the electrons, and the smearing term of the energy is
+    :math:`-\sigma S` of the occupancies """
+
+    params = Parameters(method='h', cell=8, num_planewaves=101, species=['Li', 'H'], positions=[-1.9, 1.9],
+                        kpoint_grid=4, scf_smearing=scheme, scf_temperature=3000)
+    scf = SCF(params)
+    scf.run()
+    weights = params.k_point_weights / np.sum(params.k_point_weights)
+    assert scf.converged
+    assert abs(np.sum(weights[:, None, None] * scf.wavefunctions.occupancies) - params.num_electrons) < 1e-10
+    assert abs(scf.density.norm() - params.num_electrons) < 1e-8
+
+    x = (scf.fermi_level - scf.wavefunctions.energies) / params.smearing_width
+    smearing_energy = 0 if scheme == 'none' else \
+        -params.smearing_width * np.sum(weights[:, None, None] * entropy(x, scheme))
+    assert abs(dict(scf.energy_terms)['smearing'] - smearing_energy) < 1e-12
@@ -0,0 +1,23 @@
+""" Tests of the quantities derived from the input model """
+
+import numpy as np
+from pcask1d.src.params import Parameters
+
+
+def test_v_ext_matches_real_space_sum():
+    """ The structure factor potential agrees with the FFT of the sum of the potentials of the ions,
+    sampled on a grid fine enough that the aliasing of the low frequencies is negligible """
+
+    params = Parameters(method='h', cell=8, num_planewaves=101, species=['Li', 'H', 'H'], positions=[-3.1, 0.4, 7.9])
+    N, M = params.num_planewaves, 2*params.num_planewaves
+    L = 64*M
+    grid = np.linspace(-params.cell, params.cell, L, endpoint=False)
+    potential = sum(params.coulomb(params.element_charges[species], position, grid=grid)
+                    for species, position in zip(params.species, params.positions))
+    coefficients = np.fft.fft(potential) / L
+
+    # All but the Nyquist frequency of each grid, which holds the average of +-G
+    big = np.arange(-(M // 2 - 1), M // 2)
+    assert np.max(abs(M*coefficients[big] - params.big_v_ext[big])) < 1e-6 * np.max(abs(params.big_v_ext))
+    coarse = np.arange(-(N // 2), N // 2 + 1)
+    assert np.max(abs(N*coefficients[coarse] - params.v_ext[coarse])) < 1e-6 * np.max(abs(params.v_ext))
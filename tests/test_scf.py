@@ -0,0 +1,86 @@
+""" Tests of the SCF iterations and their variants """
+
+import numpy as np
+import pytest
+from pcask1d.src.params import Parameters
+from pcask1d.src.scf import SCF
+from pcask1d.src.parallel import KPointScheduler
+
+INPUTS = dict(method='h', cell=8, num_planewaves=201, species=['Li', 'H'], positions=[-1.9, 1.9],
+              scf_temperature=3000, kpoint_grid=4)
+
+
+@pytest.fixture(scope='module')
+def reference():
+    scf = SCF(Parameters(**INPUTS))
+    scf.run()
+    return scf
+
+
+def test_converges(reference):
+    """ The SCF converges, with occupancies summing to the number of electrons and the energy terms to the total """
+
+    params = Parameters(**INPUTS)
+    assert reference.converged
+    weights = params.k_point_weights / np.sum(params.k_point_weights)
+    assert np.isclose(np.sum(weights[:, None, None] * reference.wavefunctions.occupancies), params.num_electrons)
+    assert np.isclose(reference.density.norm(), params.num_electrons)
+
+    terms = dict(reference.energy_terms)
+    assert np.isclose(terms.pop('total'), sum(terms.values()))
+
+
+def test_pulay_is_faster_than_linear_mixing(reference):
+    linear = SCF(Parameters(scf_mixing='linear', scf_step_length=0.3, scf_kerker=0.5, **INPUTS))
+    linear.run()
+    assert linear.converged
+    assert reference.iteration < linear.iteration
+    assert abs(linear.energy - reference.energy) < 1e-8
+
+
+def test_scheduler_matches_serial(reference):
+    """ Distributing the k-points over worker processes leaves the SCF unchanged """
+
+    params = Parameters(**INPUTS)
+    with KPointScheduler(params, num_workers=2) as scheduler:
+        scf = SCF(params, scheduler=scheduler)
+        scf.run()
+    assert scf.converged
+    assert np.max(abs(scf.density.coefficients - reference.density.coefficients)) < 1e-8
+
+
+def test_scheduler_density_out_weights_irreducible_k_points():
+    """ The output density of the scheduler weights the irreducible k-points as the SCF does """
+
+    params = Parameters(**dict(INPUTS, kpoint_grid=3))
+    scf = SCF(params)
+    scf.run()
+    with KPointScheduler(params, num_workers=2) as scheduler:
+        scheduler.publish(scf.density)
+        density, _ = scheduler.density_out()
+    assert np.max(abs(density.coefficients - scf.density.coefficients)) < 1e-7
+
+
+def test_mixed_precision_matches_double(reference):
+    """ A mixed precision SCF converges (in double precision) to the density of a double precision SCF """
+
+    scf = SCF(Parameters(scf_precision='mixed', **INPUTS))
+    scf.run()
+    assert scf.converged and scf.precision == 'double'
+    assert np.max(abs(scf.density.coefficients - reference.density.coefficients)) < 1e-8
+    assert abs(scf.energy - reference.energy) < 1e-8
+
+
+def test_symmetry_reduced_k_points_match_full_grid(reference):
+    """ The irreducible k-points, with their weights, give the energy of the full Monkhorst-Pack grid """
+
+    scf = SCF(Parameters(kpoint_symmetry=False, **INPUTS))
+    scf.run()
+    assert len(Parameters(**INPUTS).k_points) < len(Parameters(kpoint_symmetry=False, **INPUTS).k_points)
+    assert abs(scf.energy - reference.energy) < 1e-10
+
+
+def test_energy_tolerance(reference):
+    scf = SCF(Parameters(scf_energy_tol=1e-12, **INPUTS))
+    scf.run()
+    assert scf.converged and scf.energy_change < 1e-12
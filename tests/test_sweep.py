@@ -0,0 +1,52 @@
+""" Tests of the seeding of parameter sweeps and relaxations with the densities of nearby points """
+
+import numpy as np
+import pytest
+from pcask1d.src.params import Parameters
+from pcask1d.src.density import Density
+from pcask1d.src.scf import SCF
+from pcask1d.src.sweep import interpolate_density, atomic_weights
+
+INPUTS = dict(method='h', cell=8, num_planewaves=201, species=['Li', 'H'], scf_temperature=3000)
+
+
+@pytest.fixture(scope='module')
+def converged():
+    params = Parameters(positions=[-1.9, 1.9], **INPUTS)
+    return params, SCF(params).run()
+
+
+def test_atomic_weights_partition_the_density():
+    weights = atomic_weights(Parameters(positions=[-1.9, 1.9], **INPUTS))
+    assert weights.shape == (2, 402)
+    assert np.allclose(np.sum(weights, axis=0), 1)
+
+
+def test_rigid_translation_moves_the_density(converged):
+    """ Translating every atom translates the density """
+
+    params, density = converged
+    translated = Parameters(positions=[-1.4, 2.4], **INPUTS)
+    seed = interpolate_density(density, params, translated)
+    reference = SCF(translated).run()
+    assert SCF.norm(translated, seed.coefficients - reference.coefficients) < 1e-6
+
+
+def test_seed_follows_the_atoms(converged):
+    """ A seed moved with the atoms is closer to the converged density, and converges in fewer iterations,
+    than the unmoved density or the initial guess """
+
+    params, density = converged
+    stretched = Parameters(positions=[-1.95, 1.95], **INPUTS)
+    seed = interpolate_density(density, params, stretched)
+    unmoved = Density(stretched, coeffs=np.array(density.coefficients))
+
+    reference = SCF(stretched)
+    reference.run()
+    distance = SCF.norm(stretched, seed.coefficients - reference.density.coefficients)
+    assert distance < 0.5*SCF.norm(stretched, unmoved.coefficients - reference.density.coefficients)
+
+    seeded = SCF(stretched, seed)
+    seeded.run()
+    assert seeded.converged
+    assert seeded.iteration < reference.iteration
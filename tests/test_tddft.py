@@ -0,0 +1,42 @@
+""" Tests of the real-time propagation of the bands """
+
+import numpy as np
+import pytest
+from pcask1d.src.params import Parameters
+from pcask1d.src.scf import SCF
+from pcask1d.src.tddft import TimePropagation
+
+
+@pytest.fixture(scope='module')
+def ground_state():
+    params = Parameters(method='h', cell=8, num_planewaves=101, species=['H', 'H'], positions=[-0.7, 0.7],
+                        kpoint_grid=1, scf_tol=1e-11)
+    scf = SCF(params)
+    scf.run()
+    return params, scf
+
+
+@pytest.mark.parametrize('propagator', TimePropagation.propagators)
+def test_ground_state_is_stationary(ground_state, propagator):
+    """ Without a perturbation, the dipole of the ground state is constant and the bands stay orthonormal """
+
+    params, scf = ground_state
+    propagation = TimePropagation.from_scf(params, scf, propagator=propagator, dt=0.005)
+    _, dipoles = propagation.run(100)
+
+    assert np.max(abs(dipoles - dipoles[0])) < 1e-6
+    assert np.max(abs(propagation.norms - 1)) < 1e-9
+    bands = propagation.wavefunctions.coefficients[:, 0]
+    overlaps = np.einsum('kbn,kcn->kbc', bands.conj(), bands)
+    assert np.max(abs(overlaps - np.eye(bands.shape[1]))) < 1e-9
+
+
+def test_split_operator_agrees_with_krylov(ground_state):
+    """ The response to a delta kick of the split-operator propagator converges to that of the Krylov propagator """
+
+    params, scf = ground_state
+    _, split = TimePropagation.from_scf(params, scf, propagator='split', dt=0.005, kick=1e-3).run(100)
+    _, krylov = TimePropagation.from_scf(params, scf, propagator='krylov', dt=0.005, kick=1e-3).run(100)
+
+    assert np.ptp(krylov) > 1e-4
+    assert np.max(abs(split - krylov)) < 1e-3 * np.ptp(krylov)
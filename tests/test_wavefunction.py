@@ -0,0 +1,53 @@
+""" Tests of the array-backed set of wavefunctions """
+
+import numpy as np
+import pytest
+from pcask1d.src.wavefunction import WavefunctionSet
+
+
+@pytest.fixture
+def wavefunctions():
+    rng = np.random.default_rng(0)
+    shape = (2, 1, 3)
+    return WavefunctionSet(coefficients=rng.standard_normal(shape + (5,)) + 1j*rng.standard_normal(shape + (5,)),
+                           energies=rng.standard_normal(shape), occupancies=rng.random(shape),
+                           band_indices=np.arange(3), k_points=np.array([0.0, 0.5]))
+
+
+@pytest.mark.parametrize('index, shape', [(0, (1, 1, 3)), (-1, (1, 1, 3)), (slice(None, 1), (1, 1, 3)),
+                                          ((slice(None), 0, -1), (2, 1, 1)), ((1, 0, slice(1, None)), (1, 1, 2)),
+                                          ((np.int64(-2), slice(None), 0), (1, 1, 1))])
+def test_slice_keeps_axes(wavefunctions, index, shape):
+    """ Integer indices, including negative ones, keep their axis as numpy slices of length one do """
+
+    subset = wavefunctions[index]
+    assert subset.shape == shape
+    if not isinstance(index, tuple):
+        index = (index,)
+    index = tuple(slice(i, i + 1 or None) if isinstance(i, (int, np.integer)) else i for i in index)
+    index += (slice(None),) * (3 - len(index))
+    assert np.array_equal(subset.coefficients, wavefunctions.coefficients[index])
+    assert np.array_equal(subset.k_points, wavefunctions.k_points[index[0]])
+    assert np.array_equal(subset.band_indices, wavefunctions.band_indices[index[2]])
+
+
+def test_slice_shares_memory(wavefunctions):
+    wavefunctions[-1, 0, -1].occupancies = 2
+    assert wavefunctions.occupancies[1, 0, 2] == 2
+    assert wavefunctions.band(k=1, band=2).occupancy == 2
+
+
+def test_out_of_bounds_index(wavefunctions):
+    with pytest.raises(IndexError):
+        wavefunctions[2]
+    with pytest.raises(IndexError):
+        wavefunctions[:, :, -4]
+
+
+@pytest.mark.parametrize('mmap_mode', [None, 'r'])
+def test_save_load_round_trip(wavefunctions, tmp_path, mmap_mode):
+    wavefunctions.save(str(tmp_path))
+    loaded = WavefunctionSet.load(str(tmp_path), mmap_mode=mmap_mode)
+    assert loaded.shape == wavefunctions.shape
+    for field in WavefunctionSet.fields:
+        assert np.array_equal(getattr(loaded, field), getattr(wavefunctions, field))